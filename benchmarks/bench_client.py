@@ -0,0 +1,191 @@
+"""End-to-end benchmark of the blocking client against a local FakeCortex.
+
+Starts a :class:`~gosynapse.testing.FakeCortex` serving synthetic Storm
+streams and measures the client hot paths over real HTTP: ``storm``,
+``storm_iter``, ``feed_bulk``, ``axon_put`` and ``axon_get``, plus
+``parse_json_stream`` over the same stream without the network. For every
+case it reports messages and megabytes per second, p50/p99 latency of a
+single run and the peak RSS of the client.
+
+Each case runs in a fresh process so that its peak RSS is its own, and the
+server runs in this process so that it does not compete with the client
+for the GIL.
+
+Usage::
+
+    python benchmarks/bench_client.py [--nodes 100000] [--repeat 5] [--latency 0.005]
+        [--chunk-size 16384] [--cases storm storm_iter] [--json results.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import multiprocessing
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SRC_PATH = PROJECT_ROOT / "src"
+if SRC_PATH.exists() and str(SRC_PATH) not in sys.path:
+    sys.path.insert(0, str(SRC_PATH))
+
+from gosynapse.client import SynapseClient  # noqa: E402
+from gosynapse.parse import parse_json_stream  # noqa: E402
+from gosynapse.testing import FakeCortex, synthetic_storm  # noqa: E402
+
+try:
+    import resource
+except ImportError:  # pragma: no cover - not available on Windows
+    resource = None  # type: ignore[assignment]
+
+MB = 1024 * 1024
+
+
+def feed_records(count: int) -> List[Any]:
+    return [[["inet:fqdn", f"host{i}.example.com"], {"tags": {"rep.bad": [None, None]}}] for i in range(count)]
+
+
+def make_blob(size: int) -> bytes:
+    return hashlib.sha256(b"bench").digest() * (size // 32)
+
+
+def peak_rss() -> Optional[int]:
+    """Return the peak resident set size of this process in bytes.
+
+    On Linux ``ru_maxrss`` survives ``exec`` and so includes the parent's
+    peak; ``VmHWM`` is reset and is used instead where available.
+    """
+    try:
+        with open("/proc/self/status") as fileobj:
+            for line in fileobj:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def case_parse(client: SynapseClient, args: argparse.Namespace, raw: bytes) -> Tuple[int, int]:
+    init, nodes, fini, prints = parse_json_stream(raw)
+    return len(init) + len(nodes) + len(fini) + len(prints), len(raw)
+
+
+def case_storm(client: SynapseClient, args: argparse.Namespace, raw: bytes) -> Tuple[int, int]:
+    init, nodes, fini, prints = client.storm("bench")
+    return len(init) + len(nodes) + len(fini) + len(prints), len(raw)
+
+
+def case_storm_iter(client: SynapseClient, args: argparse.Namespace, raw: bytes) -> Tuple[int, int]:
+    return sum(1 for _ in client.storm_iter("bench")), len(raw)
+
+
+def case_feed(client: SynapseClient, args: argparse.Namespace, raw: bytes) -> Tuple[int, int]:
+    report = client.feed_bulk(feed_records(args.nodes))
+    return report.records, report.bytes
+
+
+def case_axon_put(client: SynapseClient, args: argparse.Namespace, raw: bytes) -> Tuple[int, int]:
+    blob = make_blob(args.blob_mb * MB)
+    client.axon_put(blob)
+    return 1, len(blob)
+
+
+def case_axon_get(client: SynapseClient, args: argparse.Namespace, raw: bytes) -> Tuple[int, int]:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = client.axon_get(args.blob_sha256, Path(tmp) / "blob")
+        return 1, path.stat().st_size
+
+
+CASES: Dict[str, Callable[[SynapseClient, argparse.Namespace, bytes], Tuple[int, int]]] = {
+    "parse": case_parse,
+    "storm": case_storm,
+    "storm_iter": case_storm_iter,
+    "feed": case_feed,
+    "axon_put": case_axon_put,
+    "axon_get": case_axon_get,
+}
+
+
+def percentile(values: List[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))]
+
+
+def run_case(name: str, port: int, args: argparse.Namespace) -> Dict[str, Any]:
+    """Run one case ``args.repeat`` times; executed in a child process."""
+    raw = b"".join(synthetic_storm(args.nodes, "bench")) if name in ("parse", "storm", "storm_iter") else b""
+    client = SynapseClient(host="127.0.0.1", port=str(port), scheme="http", pool_maxsize=8)
+    func = CASES[name]
+    func(client, args, raw)
+    times = []
+    messages = size = 0
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        messages, size = func(client, args, raw)
+        times.append(time.perf_counter() - start)
+    client.close()
+    total = sum(times)
+    return {
+        "case": name,
+        "runs": args.repeat,
+        "messages": messages,
+        "bytes": size,
+        "msgs_per_sec": messages * args.repeat / total,
+        "mb_per_sec": size * args.repeat / total / MB,
+        "p50": percentile(times, 0.5),
+        "p99": percentile(times, 0.99),
+        "peak_rss": peak_rss(),
+    }
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--nodes", type=int, default=100_000, help="nodes per Storm response and feed run")
+    parser.add_argument("--repeat", type=int, default=5, help="timed runs per case")
+    parser.add_argument("--latency", type=float, default=0.0, help="server delay per request, in seconds")
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024, help="HTTP chunk size of Storm responses")
+    parser.add_argument("--blob-mb", type=int, default=64, help="Axon blob size in MiB")
+    parser.add_argument("--cases", nargs="+", choices=sorted(CASES), default=list(CASES))
+    parser.add_argument("--json", metavar="PATH", help="also write the results to PATH")
+    args = parser.parse_args(argv)
+
+    with FakeCortex() as cortex:
+        cortex.storm_handler = lambda query, opts: synthetic_storm(args.nodes, query)
+        cortex.latency = args.latency
+        cortex.chunk_size = args.chunk_size
+        blob = make_blob(args.blob_mb * MB)
+        args.blob_sha256 = hashlib.sha256(blob).hexdigest()
+        cortex.files[args.blob_sha256] = blob
+        del blob
+
+        ctx = multiprocessing.get_context("spawn")
+        results = []
+        print(f"{'case':>10} {'msgs/sec':>12} {'MB/sec':>9} {'p50 ms':>9} {'p99 ms':>9} {'peak RSS MB':>12}")
+        for name in args.cases:
+            with ctx.Pool(1) as pool:
+                row = pool.apply(run_case, (name, cortex.port, args))
+            cortex.feeds.clear()
+            results.append(row)
+            rss = f"{row['peak_rss'] / MB:>12,.1f}" if row["peak_rss"] is not None else f"{'-':>12}"
+            print(
+                f"{name:>10} {row['msgs_per_sec']:>12,.0f} {row['mb_per_sec']:>9,.1f}"
+                f" {row['p50'] * 1e3:>9.1f} {row['p99'] * 1e3:>9.1f} {rss}"
+            )
+
+    if args.json:
+        with open(args.json, "w") as fileobj:
+            json.dump({"args": {k: v for k, v in vars(args).items() if k != "blob_sha256"}, "results": results},
+                      fileobj, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
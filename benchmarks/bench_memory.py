@@ -0,0 +1,90 @@
+"""Measure the memory used per parsed node.
+
+Parses a synthetic Storm response with every available JSON backend and
+reports the bytes allocated per ``Node`` as measured by ``tracemalloc``. The
+``legacy`` row rebuilds the plain ``@dataclass`` representation used before
+nodes were slotted and lazily decoded, for comparison.
+
+Usage::
+
+    python benchmarks/bench_memory.py [--count 100000]
+"""
+
+from __future__ import annotations
+
+import argparse
+import gc
+import sys
+import tracemalloc
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SRC_PATH = PROJECT_ROOT / "src"
+if SRC_PATH.exists() and str(SRC_PATH) not in sys.path:
+    sys.path.insert(0, str(SRC_PATH))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_parse import make_stream  # noqa: E402
+from gosynapse import jsonbackend  # noqa: E402
+from gosynapse.parse import parse_json_stream  # noqa: E402
+
+
+@dataclass
+class LegacyNodeData:
+    iden: str
+    tags: Dict[str, Any]
+    props: Dict[str, Any]
+    tagprops: Dict[str, Any]
+    nodedata: Dict[str, Any]
+    path: Dict[str, Any]
+
+
+@dataclass
+class LegacyNode:
+    key: str
+    data: List[List[str]]
+    info: LegacyNodeData
+
+
+def parse_legacy(raw: bytes) -> List[LegacyNode]:
+    nodes = []
+    for line in raw.splitlines():
+        mesg = jsonbackend.JsonBackend().loads(line)
+        if mesg[0] != "node":
+            continue
+        pairs = [[str(x) for x in pair] for pair in mesg[1][0]]
+        nodes.append(LegacyNode(key="node", data=pairs, info=LegacyNodeData(**mesg[1][1])))
+    return nodes
+
+
+def measure(parse: Callable[[bytes], Any], raw: bytes, count: int) -> float:
+    gc.collect()
+    tracemalloc.start()
+    result = parse(raw)
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return current / count
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=100_000)
+    args = parser.parse_args(argv)
+
+    raw = make_stream(args.count)
+    rows = [("legacy", measure(parse_legacy, raw, args.count))]
+    for name in jsonbackend.available_backends():
+        backend = jsonbackend.load_backend(name)
+        rows.append((name, measure(lambda r: parse_json_stream(r, backend=backend), raw, args.count)))
+
+    print(f"{'backend':>8} {'bytes/node':>11}")
+    for name, per_node in rows:
+        print(f"{name:>8} {per_node:>11,.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,79 @@
+"""Benchmark the jsonlines storm parser.
+
+Generates synthetic Storm responses of increasing size and reports the time
+spent per message. Per-message cost should stay flat as the stream grows,
+showing that parsing scales linearly with the number of messages.
+
+Usage::
+
+    python benchmarks/bench_parse.py [--sizes 10000 100000 1000000]
+
+Set ``GOSYNAPSE_JSON_BACKEND`` to ``json``, ``orjson`` or ``msgspec`` to
+compare decoding backends.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import sys
+import time
+from pathlib import Path
+from typing import Iterator, List
+
+PROJECT_ROOT = Path(__file__).resolve().parents[1]
+SRC_PATH = PROJECT_ROOT / "src"
+if SRC_PATH.exists() and str(SRC_PATH) not in sys.path:
+    sys.path.insert(0, str(SRC_PATH))
+
+from gosynapse.parse import JsonLinesDecoder  # noqa: E402
+
+INIT = b'["init", {"tick": 1, "text": "", "abstick": 1, "hash": "h", "task": "t"}]\n'
+NODE = (
+    b'["node", [[["inet:fqdn", "host%d.example.com"]], {"iden": "%s", "tags": {"rep.bad": [null, null]}, '
+    b'"props": {".created": 1700000000000, "domain": "example.com"}, "tagprops": {}, "nodedata": {}, "path": {}}]]\n'
+)
+FINI = b'["fini", {"tock": 2, "abstock": 2, "took": 1, "count": %d}]\n'
+
+
+def make_stream(count: int) -> bytes:
+    lines = [INIT]
+    lines.extend(NODE % (i, hashlib.sha256(b"%d" % i).hexdigest().encode()) for i in range(count))
+    lines.append(FINI % count)
+    return b"".join(lines)
+
+
+def chunked(raw: bytes, size: int) -> Iterator[bytes]:
+    view = memoryview(raw)
+    for start in range(0, len(raw), size):
+        yield bytes(view[start:start + size])
+
+
+def run(count: int, chunk_size: int) -> float:
+    raw = make_stream(count)
+    decoder = JsonLinesDecoder()
+    seen = 0
+    start = time.perf_counter()
+    for chunk in chunked(raw, chunk_size):
+        seen += len(decoder.feed(chunk))
+    seen += len(decoder.close())
+    elapsed = time.perf_counter() - start
+    assert seen == count + 2, seen
+    return elapsed
+
+
+def main(argv: List[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    parser.add_argument("--chunk-size", type=int, default=64 * 1024)
+    args = parser.parse_args(argv)
+
+    print(f"{'messages':>10} {'seconds':>9} {'msgs/sec':>12} {'us/msg':>8}")
+    for count in args.sizes:
+        elapsed = run(count, args.chunk_size)
+        print(f"{count:>10} {elapsed:>9.3f} {count / elapsed:>12,.0f} {elapsed / count * 1e6:>8.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
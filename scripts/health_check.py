@@ -1,4 +1,6 @@
+import sys
+
 from gosynapse.healthcheck import main
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    raise SystemExit(main(sys.argv[1:]))
@@ -1,9 +1,27 @@
+"""Interactive Storm shell.
+
+Nodes are printed as they stream in and written by a background thread to
+the output file, one JSON record per line. Press Ctrl-C to cancel the
+running query, Ctrl-D or type ``exit`` to leave.
+
+End a query with ``&`` to run it in the background; its results only go to
+the output file. Shell commands:
+
+    jobs        list background jobs
+    kill N      cancel background job N
+    wait [N]    wait for job N, or for all jobs
+"""
+
+import argparse
 import json
 import os
 import logging
+import queue
+import threading
+import time
 from pathlib import Path
-from dataclasses import asdict
 import sys
+from typing import Any, Dict, List, Optional
 
 # Ensure the local gosynapse package is importable when running the script
 PROJECT_ROOT = Path(__file__).resolve().parents[1]
@@ -11,14 +29,283 @@ SRC_PATH = PROJECT_ROOT / "src"
 if SRC_PATH.exists() and str(SRC_PATH) not in sys.path:
     sys.path.insert(0, str(SRC_PATH))
 
-from dotenv import load_dotenv, find_dotenv
+try:
+    from dotenv import load_dotenv, find_dotenv
+except Exception:  # pragma: no cover - optional dependency
+    def load_dotenv(*_args, **_kwargs):
+        """Fallback no-op if python-dotenv is not installed."""
+        return False
+
+    def find_dotenv(*_args, **_kwargs) -> str:
+        return ""
 
 from gosynapse.client import SynapseClient
+from gosynapse.debug import BodyCapture
+from gosynapse.parse import FireData, FiniData, InitData, Node, NodeEditsData, PrintData
+
+logger = logging.getLogger("storm_cli")
+
+_STOP = object()
+
+
+class ResultWriter:
+    """Append result records to a jsonlines file from a background thread.
+
+    The queue is bounded, so a query producing results faster than they can
+    be written is slowed down instead of buffering them in memory.
+    """
+
+    def __init__(self, path: Path, max_pending: int = 10000) -> None:
+        self.path = path
+        self._queue: "queue.Queue[Any]" = queue.Queue(max_pending)
+        self._file = path.open("a", encoding="utf-8")
+        self._thread = threading.Thread(target=self._run, name="storm-cli-writer", daemon=True)
+        self._thread.start()
+
+    def put(self, record: Dict[str, Any]) -> None:
+        self._queue.put(record)
+
+    def close(self) -> None:
+        self._queue.put(_STOP)
+        self._thread.join()
+        self._file.close()
+
+    def _run(self) -> None:
+        write = self._file.write
+        while True:
+            record = self._queue.get()
+            if record is _STOP:
+                break
+            try:
+                write(json.dumps(record, default=str))
+                write("\n")
+            except (TypeError, ValueError) as exc:
+                logger.error("Could not write result record: %s", exc)
+            if self._queue.empty():
+                self._file.flush()
+        self._file.flush()
+
+
+class Job:
+    """One Storm query, run in the foreground or on a background thread."""
+
+    def __init__(self, number: int, query: str, opts: Optional[Dict[str, Any]]) -> None:
+        self.number = number
+        self.query = query
+        self.opts = opts
+        self.nodes = 0
+        self.state = "running"
+        self.error: Optional[BaseException] = None
+        self.started = time.monotonic()
+        self.finished: Optional[float] = None
+        self.cancelled = threading.Event()
+        self.thread: Optional[threading.Thread] = None
+        self.stream: Any = None
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished or time.monotonic()) - self.started
+
+    def cancel(self) -> None:
+        """Stop the job, even while it is waiting for the Cortex.
+
+        Aborting the stream drops the connection, which cancels the query on
+        the Cortex and makes a blocked read in :meth:`run` fail at once.
+        """
+        self.cancelled.set()
+        stream = self.stream
+        if stream is not None:
+            stream.abort()
+
+    def run(self, client: SynapseClient, writer: ResultWriter, echo: bool) -> None:
+        """Stream the query, writing every message and printing it if ``echo``.
+
+        Stops early when :meth:`cancel` is called.
+        """
+        messages = self.stream = client.storm_iter(self.query, opts=self.opts)
+        if self.cancelled.is_set():
+            messages.abort()
+        try:
+            for message in messages:
+                writer.put(self._record(message))
+                if isinstance(message, Node):
+                    self.nodes += 1
+                    if echo:
+                        print(_format_node(message))
+                elif isinstance(message, PrintData) and echo:
+                    print(message.mesg)
+                if self.cancelled.is_set():
+                    self.state = "cancelled"
+                    break
+            else:
+                # An aborted stream may also just end.
+                self.state = "cancelled" if self.cancelled.is_set() else "done"
+        except KeyboardInterrupt:
+            self.state = "cancelled"
+        except Exception as exc:  # requests.HTTPError, StormError or connection errors
+            if self.cancelled.is_set():
+                # The read failed because cancel() dropped the connection.
+                self.state = "cancelled"
+            else:
+                self.state = "failed"
+                self.error = exc
+        finally:
+            messages.close()
+            self.finished = time.monotonic()
 
+    def _record(self, message: Any) -> Dict[str, Any]:
+        record: Dict[str, Any] = {"job": self.number, "query": self.query}
+        if isinstance(message, Node):
+            record["type"] = "node"
+            record["node"] = message.to_dict()
+        elif isinstance(message, PrintData):
+            record["type"] = "print"
+            record["mesg"] = message.mesg
+        elif isinstance(message, InitData):
+            record["type"] = "init"
+            record["tick"] = message.tick
+        elif isinstance(message, FiniData):
+            record["type"] = "fini"
+            record["took"] = message.took
+            record["count"] = message.count
+        elif isinstance(message, NodeEditsData):
+            record["type"] = "edits"
+            record["edits"] = message.edits
+        elif isinstance(message, FireData):
+            record["type"] = "fire"
+            record["fire"] = {"type": message.type, "data": message.data}
+        return record
 
-def main() -> None:
-    logging.basicConfig(level=logging.DEBUG)
-    logging.getLogger("urllib3").setLevel(logging.DEBUG)
+    def summary(self) -> str:
+        text = f"[{self.number}] {self.state:<9} {self.nodes} nodes {self.elapsed:.1f}s  {self.query}"
+        if self.error is not None:
+            text += f"  ({self.error})"
+        return text
+
+
+def _format_node(node: Node) -> str:
+    ndef = node.ndef
+    if ndef is None:
+        return json.dumps(node.data)
+    form, valu = ndef
+    tags = " ".join(f"#{tag}" for tag in sorted(node.info.tags or {}))
+    return f"{form}={valu}" + (f"  {tags}" if tags else "")
+
+
+class Shell:
+    """Read queries and shell commands until EOF or ``exit``."""
+
+    def __init__(self, client: SynapseClient, writer: ResultWriter, view: Optional[str]) -> None:
+        self.client = client
+        self.writer = writer
+        self.view = view
+        self.jobs: List[Job] = []
+        self._reported: set = set()
+
+    def loop(self) -> None:
+        while True:
+            self._report_finished()
+            try:
+                line = input("storm> ").strip()
+            except KeyboardInterrupt:
+                print()
+                continue
+            except EOFError:
+                print()
+                break
+            if line.lower() in {"quit", "exit"}:
+                break
+            if line:
+                self.handle(line)
+
+    def handle(self, line: str) -> None:
+        command, _, arg = line.partition(" ")
+        if command == "jobs":
+            for job in self.jobs:
+                print(job.summary())
+        elif command == "kill":
+            job = self._job(arg)
+            if job is not None:
+                job.cancel()
+        elif command == "wait":
+            self.wait(self._job(arg) if arg else None)
+        elif line.endswith("&"):
+            self.start(line[:-1].strip())
+        else:
+            self.run(line)
+
+    def run(self, query: str) -> None:
+        job = self._new_job(query)
+        try:
+            job.run(self.client, self.writer, echo=True)
+        except KeyboardInterrupt:
+            # Interrupted while closing the stream; the query is gone either way.
+            job.state = "cancelled"
+        self._reported.add(job.number)
+        if job.state == "failed":
+            logger.error("Storm query failed: %s", job.error)
+        else:
+            print(f"{job.state}: {job.nodes} nodes in {job.elapsed:.2f}s")
+
+    def start(self, query: str) -> None:
+        if not query:
+            return
+        job = self._new_job(query)
+        job.thread = threading.Thread(
+            target=job.run, args=(self.client, self.writer, False), name=f"storm-job-{job.number}", daemon=True
+        )
+        job.thread.start()
+        print(f"[{job.number}] started")
+
+    def wait(self, job: Optional[Job] = None) -> None:
+        jobs = [job] if job is not None else self.jobs
+        try:
+            for waiting in jobs:
+                if waiting.thread is not None:
+                    waiting.thread.join()
+        except KeyboardInterrupt:
+            print()
+
+    def shutdown(self) -> None:
+        """Cancel the background jobs and wait for them to stop."""
+        for job in self.jobs:
+            job.cancel()
+        self.wait()
+
+    def _new_job(self, query: str) -> Job:
+        job = Job(len(self.jobs) + 1, query, {"view": self.view} if self.view else None)
+        self.jobs.append(job)
+        return job
+
+    def _job(self, arg: str) -> Optional[Job]:
+        try:
+            return self.jobs[int(arg) - 1]
+        except (ValueError, IndexError):
+            print(f"no such job: {arg}")
+            return None
+
+    def _report_finished(self) -> None:
+        for job in self.jobs:
+            if job.finished is not None and job.number not in self._reported:
+                self._reported.add(job.number)
+                print(job.summary())
+
+
+def parse_args(argv=None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Interactive Storm shell")
+    parser.add_argument("-v", "--verbose", action="store_true", help="log requests at DEBUG level")
+    parser.add_argument("-o", "--output", default="storm_results.jsonl", help="file results are appended to")
+    parser.add_argument("--capture", metavar="PATH", help="append sampled response bodies to PATH")
+    parser.add_argument("--capture-rate", type=float, default=1.0, help="fraction of responses to capture")
+    parser.add_argument("--capture-bytes", type=int, default=64 * 1024, help="bytes kept per captured body")
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> None:
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO)
+    if not args.verbose:
+        logging.getLogger("urllib3").setLevel(logging.WARNING)
     load_dotenv(find_dotenv(usecwd=True))
     host = os.environ.get("SYNAPSE_HOST", "").strip()
     port = os.environ.get("SYNAPSE_PORT", "").strip()
@@ -28,30 +315,16 @@ def main() -> None:
     if not host or not port:
         raise SystemExit("SYNAPSE_HOST and SYNAPSE_PORT must be defined in .env")
 
-    client = SynapseClient(host=host, port=port, api_key=api_key)
-    output_file = Path("storm_results.json")
-
-    while True:
-        query = input("storm> ").strip()
-        if not query or query.lower() in {"quit", "exit"}:
-            break
-        opts = {"view": view} if view else None
-        try:
-            init, nodes, fini, prints = client.storm(query, opts=opts)
-        except Exception as exc:  # requests.HTTPError or connection errors
-            logging.error("Storm query failed: %s", exc)
-            continue
-        logging.debug("Storm prints: %s", prints)
-        logging.debug("Storm nodes count: %s", len(nodes))
-        result = {
-            "init": [asdict(i) for i in init],
-            "nodes": [asdict(n) for n in nodes],
-            "fini": [asdict(f) for f in fini],
-            "print": [asdict(p) for p in prints],
-        }
-        with output_file.open("a", encoding="utf-8") as f:
-            json.dump(result, f)
-            f.write("\n")
+    capture = BodyCapture(args.capture, max_bytes=args.capture_bytes, sample_rate=args.capture_rate) if args.capture else None
+    client = SynapseClient(host=host, port=port, api_key=api_key, body_capture=capture)
+    writer = ResultWriter(Path(args.output))
+    shell = Shell(client, writer, view)
+    try:
+        shell.loop()
+    finally:
+        shell.shutdown()
+        writer.close()
+        client.close()
 
 
 if __name__ == "__main__":
@@ -9,7 +9,28 @@ try:
 except ModuleNotFoundError:  # requests may be missing in some environments
     SynapseClient = object()
 
-from .parse import parse_json_stream, InitData, Node, FiniData, PrintData  # noqa: E402
+AsyncSynapseClient: Any
+try:
+    from .aio import AsyncSynapseClient as _AsyncSynapseClient
+    AsyncSynapseClient = _AsyncSynapseClient
+except ModuleNotFoundError:  # aiohttp is an optional dependency
+    AsyncSynapseClient = object()
+
+from .parse import (  # noqa: E402
+    parse_json_stream,
+    iter_json_stream,
+    JsonLinesDecoder,
+    InitData,
+    Node,
+    NodeSet,
+    FiniData,
+    PrintData,
+    NodeEditsData,
+    FireData,
+    ErrData,
+    StormError,
+    StreamTruncated,
+)
 from .types import (  # noqa: E402
     Users,
     Roles,
@@ -17,19 +38,30 @@ from .types import (  # noqa: E402
     GenericMessage,
     CortexModel,
     AxonDelete,
+    StormResult,
 )
 
 __all__ = [
     "SynapseClient",
+    "AsyncSynapseClient",
     "parse_json_stream",
+    "iter_json_stream",
+    "JsonLinesDecoder",
     "InitData",
     "Node",
+    "NodeSet",
     "FiniData",
     "PrintData",
+    "NodeEditsData",
+    "FireData",
+    "ErrData",
+    "StormError",
+    "StreamTruncated",
     "Users",
     "Roles",
     "Active",
     "GenericMessage",
     "CortexModel",
     "AxonDelete",
+    "StormResult",
 ]
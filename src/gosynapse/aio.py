@@ -0,0 +1,203 @@
+"""Asyncio counterpart of :class:`~gosynapse.client.SynapseClient`.
+
+Requires the optional ``aiohttp`` dependency (``pip install gosynapse[async]``).
+"""
+
+from __future__ import annotations
+
+import logging
+from dataclasses import dataclass, field
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+import aiohttp
+
+from .parse import parse_json_stream, raise_errors, JsonLinesDecoder, InitData, Node, FiniData, PrintData, Message
+from .retry import DEFAULT_TIMEOUT
+from .types import (
+    Users,
+    Roles,
+    Active,
+    GenericMessage,
+    CortexModel,
+    AxonDelete,
+)
+
+logger = logging.getLogger(__name__)
+
+API_KEY_HEADER = "X-Api-Key"
+
+
+@dataclass
+class AsyncSynapseClient:
+    """Asyncio Synapse client with the same methods as ``SynapseClient``.
+
+    The underlying ``aiohttp.ClientSession`` is created on first use unless
+    one is passed in. Use the client as an async context manager, or call
+    :meth:`close`, to release its connections.
+
+    ``timeout`` applies to the session the client creates. Like the sync
+    client's default, it bounds connecting and each read but not the whole
+    request, so long Storm streams and downloads are not cut off.
+    """
+
+    host: str
+    port: str
+    api_key: str = ""
+    scheme: str = "https"
+    session: Optional[aiohttp.ClientSession] = None
+    timeout: aiohttp.ClientTimeout = field(
+        default_factory=lambda: aiohttp.ClientTimeout(
+            total=None, connect=DEFAULT_TIMEOUT[0], sock_read=DEFAULT_TIMEOUT[1]
+        )
+    )
+    _cookie: str = field(default="", init=False, repr=False)
+
+    async def __aenter__(self) -> "AsyncSynapseClient":
+        return self
+
+    async def __aexit__(self, *exc: Any) -> None:
+        await self.close()
+
+    async def close(self) -> None:
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    def _session(self) -> aiohttp.ClientSession:
+        if self.session is None:
+            self.session = aiohttp.ClientSession(timeout=self.timeout)
+        return self.session
+
+    def _url(self, path: str) -> str:
+        return f"{self.scheme}://{self.host}:{self.port}{path}"
+
+    def _headers(self) -> Dict[str, str]:
+        headers = {}
+        if self.api_key:
+            headers[API_KEY_HEADER] = self.api_key
+        if self._cookie:
+            headers["Cookie"] = self._cookie
+        return headers
+
+    async def _json(self, method: str, path: str, **kwargs: Any) -> Any:
+        async with self._session().request(method, self._url(path), headers=self._headers(), **kwargs) as resp:
+            resp.raise_for_status()
+            return await resp.json(content_type=None)
+
+    async def login(self, username: str, password: str) -> None:
+        url = self._url("/api/v1/login")
+        async with self._session().post(
+            url, json={"user": username, "passwd": password}, headers=self._headers(), ssl=False
+        ) as resp:
+            resp.raise_for_status()
+            self._cookie = resp.headers.get("Set-Cookie", "")
+
+    async def logout(self) -> None:
+        await self._json("GET", "/api/v1/logout")
+
+    async def get_active(self) -> Active:
+        return Active(**await self._json("GET", "/api/v1/active"))
+
+    async def get_users(self) -> Users:
+        return Users(**await self._json("GET", "/api/v1/auth/users"))
+
+    async def get_roles(self) -> Roles:
+        return Roles(**await self._json("GET", "/api/v1/auth/roles"))
+
+    async def add_user(self, username: str) -> GenericMessage:
+        return GenericMessage(**await self._json("POST", "/api/v1/auth/adduser", json={"name": username}))
+
+    async def add_role(self, role_name: str) -> GenericMessage:
+        return GenericMessage(**await self._json("POST", "/api/v1/auth/addrole", json={"name": role_name}))
+
+    async def delete_role(self, role_name: str) -> GenericMessage:
+        return GenericMessage(**await self._json("POST", "/api/v1/auth/delrole", json={"name": role_name}))
+
+    async def modify_user(self, iden: str, user: Dict[str, Any]) -> GenericMessage:
+        return GenericMessage(**await self._json("POST", f"/api/v1/auth/user/{iden}", json=user))
+
+    async def change_password(self, iden: str, password: str) -> GenericMessage:
+        return GenericMessage(**await self._json("POST", f"/api/v1/auth/password/{iden}", json={"passwd": password}))
+
+    async def feed(self, nodes: Dict[str, str]) -> GenericMessage:
+        return GenericMessage(**await self._json("POST", "/api/v1/feed", json=nodes))
+
+    async def _storm_request(self, storm_query: str, opts: Optional[Dict[str, str]] = None) -> aiohttp.ClientResponse:
+        url = self._url("/api/v1/storm")
+        payload = {
+            "query": storm_query,
+            "opts": opts or {},
+            "stream": "jsonlines",
+        }
+        session = self._session()
+        resp = await session.post(url, json=payload, headers=self._headers(), ssl=False)
+        if resp.status == 404:
+            logger.debug("POST /storm returned 404, falling back to GET")
+            resp.release()
+            resp = await session.get(url, json=payload, headers=self._headers(), ssl=False)
+        try:
+            resp.raise_for_status()
+        except aiohttp.ClientResponseError:
+            resp.release()
+            raise
+        return resp
+
+    async def storm(
+        self, storm_query: str, opts: Optional[Dict[str, str]] = None
+    ) -> tuple[List[InitData], List[Node], List[FiniData], List[PrintData]]:
+        resp = await self._storm_request(storm_query, opts)
+        async with resp:
+            body = await resp.read()
+        return parse_json_stream(body)
+
+    async def storm_iter(self, storm_query: str, opts: Optional[Dict[str, str]] = None) -> AsyncIterator[Message]:
+        """Run a Storm query and yield messages as they arrive on the wire.
+
+        An ``err`` message from the Cortex raises
+        :class:`~gosynapse.parse.StormError`.
+        """
+        resp = await self._storm_request(storm_query, opts)
+        async with resp:
+            decoder = JsonLinesDecoder()
+            async for chunk in resp.content.iter_any():
+                for message in raise_errors(decoder.feed(chunk)):
+                    yield message
+            for message in raise_errors(decoder.close()):
+                yield message
+
+    async def storm_call(self, storm_query: str, opts: List[str]) -> GenericMessage:
+        return GenericMessage(**await self._json("POST", "/api/v1/storm/call", json={"query": storm_query, "opts": opts}))
+
+    async def storm_export(self, storm_query: str, opts: List[str]) -> GenericMessage:
+        return GenericMessage(**await self._json("POST", "/api/v1/storm/export", json={"query": storm_query, "opts": opts}))
+
+    async def model(self) -> CortexModel:
+        return CortexModel.from_dict(await self._json("GET", "/api/v1/model"))
+
+    async def vars_get(self) -> GenericMessage:
+        return GenericMessage(**await self._json("GET", "/api/v1/vars/get"))
+
+    async def vars_set(self, vars_map: Dict[str, Any]) -> GenericMessage:
+        return GenericMessage(**await self._json("POST", "/api/v1/vars/set", json=vars_map))
+
+    async def vars_pop(self, key: str) -> GenericMessage:
+        return GenericMessage(**await self._json("POST", "/api/v1/vars/pop", json={"name": key}))
+
+    async def core_info(self) -> GenericMessage:
+        return GenericMessage(**await self._json("GET", "/api/v1/core/info"))
+
+    # Axon methods
+    async def axon_delete(self, sha256s: List[str]) -> AxonDelete:
+        return AxonDelete(**await self._json("POST", "/api/v1/axon/files/del", json={"sha256": sha256s}))
+
+    async def axon_put(self, file_bytes: bytes) -> GenericMessage:
+        return GenericMessage(**await self._json("POST", "/api/v1/axon/files/put", data=file_bytes))
+
+    async def axon_has(self, sha256: str) -> GenericMessage:
+        return GenericMessage(**await self._json("GET", f"/api/v1/axon/files/has/sha256/{sha256}"))
+
+    async def axon_get(self, sha256: str) -> bytes:
+        url = self._url(f"/api/v1/axon/files/by/sha256/{sha256}")
+        async with self._session().get(url, headers=self._headers()) as resp:
+            resp.raise_for_status()
+            return await resp.read()
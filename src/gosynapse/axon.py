@@ -0,0 +1,185 @@
+"""Streaming helpers for Axon uploads and downloads.
+
+Blobs are moved in fixed size chunks and hashed with SHA256 as they pass
+through, so peak memory is bounded by the chunk size rather than the blob.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import tempfile
+from pathlib import Path
+from typing import IO, Any, BinaryIO, Iterable, Iterator, Optional, Union
+
+CHUNK_SIZE = 1024 * 1024
+
+AxonSource = Union[bytes, bytearray, memoryview, str, "os.PathLike[str]", BinaryIO, Iterable[bytes]]
+
+
+class HashingReader:
+    """File-like wrapper that hashes everything read through it.
+
+    When the size of the underlying data is known the wrapper reports it via
+    ``len()`` so that HTTP libraries send a ``Content-Length`` instead of
+    falling back to chunked transfer encoding.
+    """
+
+    def __init__(self, fileobj: IO[bytes], size: Optional[int] = None) -> None:
+        self._fileobj = fileobj
+        self._remaining = size
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def read(self, n: int = -1) -> bytes:
+        data = self._fileobj.read(n)
+        self.sha256.update(data)
+        self.size += len(data)
+        if self._remaining is not None:
+            self._remaining = max(self._remaining - len(data), 0)
+        return data
+
+    def __len__(self) -> int:
+        return self._remaining or 0
+
+
+class HashingIterator:
+    """Iterator over byte chunks that hashes every chunk it yields."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = chunks
+        self.sha256 = hashlib.sha256()
+        self.size = 0
+
+    def __iter__(self) -> Iterator[bytes]:
+        for chunk in self._chunks:
+            self.sha256.update(chunk)
+            self.size += len(chunk)
+            yield chunk
+
+
+def _stream_size(fileobj: Any) -> Optional[int]:
+    try:
+        size = os.fstat(fileobj.fileno()).st_size
+        return size - fileobj.tell()
+    except (AttributeError, OSError, ValueError):
+        return None
+
+
+def open_source(source: AxonSource) -> tuple[Any, Any, Optional[IO[bytes]]]:
+    """Prepare ``source`` for upload.
+
+    Returns:
+        ``(body, hasher, opened)`` where ``body`` is suitable as a request
+        body, ``hasher`` exposes ``sha256`` and ``size`` once the body has
+        been consumed, and ``opened`` is a file this function opened and the
+        caller must close.
+    """
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        reader = HashingReader(_BytesReader(source), len(source))
+        return reader, reader, None
+    if isinstance(source, (str, os.PathLike)):
+        fileobj = open(source, "rb")
+        reader = HashingReader(fileobj, os.fstat(fileobj.fileno()).st_size)
+        return reader, reader, fileobj
+    if hasattr(source, "read"):
+        size = _stream_size(source)
+        if size is not None:
+            reader = HashingReader(source, size)  # type: ignore[arg-type]
+            return reader, reader, None
+        hashing = HashingIterator(iter_chunks(source))  # type: ignore[arg-type]
+        return iter(hashing), hashing, None
+    hashing = HashingIterator(source)  # type: ignore[arg-type]
+    return iter(hashing), hashing, None
+
+
+class _BytesReader:
+    """Read-only file view over a bytes-like object that never copies it whole."""
+
+    def __init__(self, data: Union[bytes, bytearray, memoryview]) -> None:
+        self._view = memoryview(data).cast("B")
+        self._pos = 0
+
+    def read(self, n: int = -1) -> bytes:
+        end = len(self._view) if n is None or n < 0 else min(self._pos + n, len(self._view))
+        data = bytes(self._view[self._pos:end])
+        self._pos = end
+        return data
+
+
+def iter_chunks(fileobj: IO[bytes], chunk_size: int = CHUNK_SIZE) -> Iterator[bytes]:
+    while True:
+        chunk = fileobj.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def sha256_file(path: Union[str, "os.PathLike[str]"], chunk_size: int = CHUNK_SIZE) -> str:
+    """Return the hex SHA256 of the file at ``path``."""
+    sha256 = hashlib.sha256()
+    with open(path, "rb") as fileobj:
+        for chunk in iter_chunks(fileobj, chunk_size):
+            sha256.update(chunk)
+    return sha256.hexdigest()
+
+
+def unique(items: Iterable[str]) -> Iterator[str]:
+    """Yield each distinct item once, in first-seen order."""
+    seen = set()
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            yield item
+
+
+def write_chunks(
+    chunks: Iterable[bytes],
+    dest: Union[str, "os.PathLike[str]", IO[bytes]],
+    expected_sha256: Optional[str] = None,
+) -> int:
+    """Write ``chunks`` to a path or writable file object.
+
+    Paths are written to a temporary file in the same directory and renamed
+    into place once complete, so readers never observe a partial file. When
+    ``expected_sha256`` is given the data is hashed while it is written and
+    ``ValueError`` is raised (leaving no file behind) on a mismatch.
+
+    Returns:
+        The number of bytes written.
+    """
+    sha256 = hashlib.sha256() if expected_sha256 else None
+    if not isinstance(dest, (str, os.PathLike)):
+        size = _copy(chunks, dest, sha256)
+        _check_digest(sha256, expected_sha256)
+        return size
+
+    path = Path(dest)
+    fd, tmp = tempfile.mkstemp(dir=path.parent, prefix=f".{path.name}.", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as fileobj:
+            size = _copy(chunks, fileobj, sha256)
+        _check_digest(sha256, expected_sha256)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+    return size
+
+
+def _copy(chunks: Iterable[bytes], fileobj: IO[bytes], sha256: Any) -> int:
+    size = 0
+    for chunk in chunks:
+        if sha256 is not None:
+            sha256.update(chunk)
+        fileobj.write(chunk)
+        size += len(chunk)
+    return size
+
+
+def _check_digest(sha256: Any, expected: Optional[str]) -> None:
+    if sha256 is not None and sha256.hexdigest() != expected:
+        raise ValueError(f"SHA256 mismatch: expected {expected}, got {sha256.hexdigest()}")
@@ -0,0 +1,86 @@
+"""Helpers for batching work and running it over a bounded thread pool."""
+
+from __future__ import annotations
+
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+
+def iter_batches(
+    items: Iterable[T],
+    max_items: int,
+    max_bytes: Optional[int] = None,
+    size: Callable[[T], int] = len,  # type: ignore[assignment]
+) -> Iterator[List[T]]:
+    """Group ``items`` into lists of at most ``max_items`` entries.
+
+    When ``max_bytes`` is given a batch is also closed before the sum of
+    ``size(item)`` would exceed it; a single item larger than ``max_bytes``
+    is still emitted, on its own. ``items`` is consumed lazily, so only one
+    batch is held in memory at a time.
+    """
+    if max_items < 1:
+        raise ValueError("max_items must be at least 1")
+    batch: List[T] = []
+    batch_bytes = 0
+    for item in items:
+        item_bytes = size(item) if max_bytes is not None else 0
+        if batch and (len(batch) >= max_items or (max_bytes is not None and batch_bytes + item_bytes > max_bytes)):
+            yield batch
+            batch = []
+            batch_bytes = 0
+        batch.append(item)
+        batch_bytes += item_bytes
+    if batch:
+        yield batch
+
+
+def imap_bounded(
+    func: Callable[[T], R],
+    items: Iterable[T],
+    workers: int,
+    ordered: bool = False,
+    max_in_flight: Optional[int] = None,
+) -> Iterator[Tuple[int, T, "Future[R]"]]:
+    """Run ``func`` over ``items`` on ``workers`` threads.
+
+    Yields ``(index, item, future)`` for every item, with the future already
+    finished, either as soon as each call completes or, with ``ordered``, in
+    input order. At most ``max_in_flight`` items (default ``2 * workers``)
+    are submitted but not yet yielded at any time, so ``items`` may be an
+    unbounded generator. Exceptions raised by ``func`` are left on the
+    future for the caller to inspect.
+    """
+    if workers < 1:
+        raise ValueError("workers must be at least 1")
+    limit = max(max_in_flight or 2 * workers, 1)
+    source = enumerate(items)
+    pending: Dict["Future[R]", Tuple[int, T]] = {}
+    finished: Dict[int, Tuple[int, T, "Future[R]"]] = {}
+    next_index = 0
+    exhausted = False
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while True:
+            while not exhausted and len(pending) + len(finished) < limit:
+                try:
+                    index, item = next(source)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending[pool.submit(func, item)] = (index, item)
+            if ordered and next_index in finished:
+                yield finished.pop(next_index)
+                next_index += 1
+                continue
+            if not pending:
+                break
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                index, item = pending.pop(future)
+                if ordered:
+                    finished[index] = (index, item, future)
+                else:
+                    yield index, item, future
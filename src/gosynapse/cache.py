@@ -0,0 +1,391 @@
+"""Client-side caches."""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import mmap
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Tuple, Union
+
+from .axon import sha256_file, write_chunks
+from .types import CortexModel
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .client import SynapseClient
+    from .parse import FiniData, InitData, Node, PrintData
+
+    StormTuple = Tuple[List[InitData], List[Node], List[FiniData], List[PrintData]]
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class CacheStats:
+    """Counters kept by the client-side caches."""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    corrupt: int = 0
+    bypassed: int = 0
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+
+class AxonCache:
+    """On-disk, content-addressed cache of Axon blobs.
+
+    Blobs are stored as ``root/<sha256[:2]>/<sha256>``. Because the key is
+    the content hash an entry never needs invalidating, only evicting: once
+    the cache grows past ``max_bytes`` the least recently used files are
+    removed. Recency is tracked in memory, seeded at startup from the files'
+    modification times, which every hit refreshes so the order carries over
+    to the next process. Files are written to a temporary name and renamed
+    into place, so several processes can share one cache directory; each
+    only evicts the entries it knows about. With ``verify`` every hit is
+    re-hashed and a corrupt file is discarded and fetched again.
+    """
+
+    def __init__(self, root: Union[str, "os.PathLike[str]"], max_bytes: int = 10 * 1024 ** 3, verify: bool = True) -> None:
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.verify = verify
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        # sha256 -> size, least recently used first.
+        self._index: "OrderedDict[str, int]" = OrderedDict(
+            (path.name, size) for path, size, _ in sorted(self._entries(), key=lambda entry: entry[2])
+        )
+        self._size = sum(self._index.values())
+
+    def path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256
+
+    def __contains__(self, sha256: str) -> bool:
+        return self.path(sha256).exists()
+
+    def lookup(self, sha256: str) -> Optional[Path]:
+        """Return the path of a valid cached blob, or ``None`` on a miss."""
+        path = self.path(sha256)
+        try:
+            if self.verify and sha256_file(path) != sha256:
+                logger.warning("Discarding corrupt cache entry %s", path)
+                with self._lock:
+                    self.stats.corrupt += 1
+                self._discard(path)
+                raise FileNotFoundError(path)
+            os.utime(path)
+        except FileNotFoundError:
+            with self._lock:
+                self.stats.misses += 1
+                self._forget(sha256)
+            return None
+        with self._lock:
+            self.stats.hits += 1
+            if sha256 in self._index:
+                self._index.move_to_end(sha256)
+        return path
+
+    def ensure(self, sha256: str, download: Callable[[Path], Any]) -> Path:
+        """Return the cached blob, calling ``download(path)`` to fill a miss.
+
+        ``download`` must write the blob to ``path`` atomically, for
+        example with :meth:`SynapseClient.axon_get`.
+        """
+        path = self.lookup(sha256)
+        if path is not None:
+            return path
+        path = self.path(sha256)
+        path.parent.mkdir(exist_ok=True)
+        download(path)
+        size = path.stat().st_size
+        with self._lock:
+            # Threads that missed on the same blob all download it, but only
+            # the first one to get here adds an entry.
+            if sha256 in self._index:
+                self._index.move_to_end(sha256)
+            else:
+                self._index[sha256] = size
+                self._size += size
+            over = self._size > self.max_bytes
+        if over:
+            self.evict(keep=path)
+        return path
+
+    def open(self, sha256: str, download: Callable[[Path], Any]) -> Union[mmap.mmap, bytes]:
+        """Return the blob as a read-only ``mmap`` (``b""`` for empty blobs)."""
+        path = self.ensure(sha256, download)
+        with open(path, "rb") as fileobj:
+            if os.fstat(fileobj.fileno()).st_size == 0:
+                return b""
+            return mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def evict(self, keep: Optional[Path] = None) -> None:
+        """Remove least recently used blobs until the cache fits ``max_bytes``."""
+        with self._lock:
+            victims = []
+            total = self._size
+            for sha256, size in self._index.items():
+                if total <= self.max_bytes:
+                    break
+                if keep is not None and sha256 == keep.name:
+                    continue
+                victims.append(sha256)
+                total -= size
+            for sha256 in victims:
+                self._forget(sha256)
+        for sha256 in victims:
+            if self._discard(self.path(sha256)):
+                with self._lock:
+                    self.stats.evictions += 1
+
+    def _forget(self, sha256: str) -> None:
+        size = self._index.pop(sha256, None)
+        if size is not None:
+            self._size -= size
+
+    def _discard(self, path: Path) -> bool:
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            return False
+        return True
+
+    def _entries(self) -> List[Tuple[Path, int, float]]:
+        entries = []
+        for subdir in self.root.iterdir():
+            if not subdir.is_dir():
+                continue
+            for entry in os.scandir(subdir):
+                if entry.name.startswith("."):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((Path(entry.path), stat.st_size, stat.st_mtime))
+        return entries
+
+
+class ModelCache:
+    """TTL cache for the Cortex data model with an optional disk snapshot.
+
+    A model younger than ``ttl`` seconds is returned without touching the
+    network. When ``path`` is given the model is also written there, so a
+    fresh worker process can start from the snapshot. Once the TTL expires
+    the model is revalidated by comparing a fingerprint of ``core_info``
+    with the one recorded alongside the model; only if it changed is the
+    full model downloaded again.
+    """
+
+    def __init__(self, path: Optional[Union[str, "os.PathLike[str]"]] = None, ttl: float = 3600.0) -> None:
+        self.path = Path(path) if path is not None else None
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._model: Optional[CortexModel] = None
+        self._fingerprint: Optional[str] = None
+        self._loaded_at = 0.0
+        if self.path is not None:
+            self._load()
+
+    def get(self, client: SynapseClient) -> CortexModel:
+        """Return the cached model, revalidating or fetching it as needed.
+
+        The network is never used while holding the lock, so one slow
+        request does not hold up callers that could be served from memory.
+        """
+        with self._lock:
+            if self._model is not None and time.time() - self._loaded_at < self.ttl:
+                self.stats.hits += 1
+                return self._model
+        stamp = _core_fingerprint(client)
+        with self._lock:
+            if self._model is not None and self._fingerprint == stamp:
+                self.stats.hits += 1
+                self._store(self._model, stamp)
+                return self._model
+            self.stats.misses += 1
+        model = client._fetch_model()
+        with self._lock:
+            # Another caller may have fetched the same model meanwhile.
+            if self._model is not None and self._fingerprint == stamp:
+                return self._model
+            self._store(model, stamp)
+            return model
+
+    def is_fresh(self, client: SynapseClient) -> bool:
+        """Return whether the cached model still matches the Cortex."""
+        stamp = _core_fingerprint(client)
+        with self._lock:
+            return self._model is not None and self._fingerprint == stamp
+
+    def invalidate(self) -> None:
+        """Drop the in-memory model and its disk snapshot."""
+        with self._lock:
+            self._model = None
+            self._fingerprint = None
+            if self.path is not None:
+                try:
+                    self.path.unlink()
+                except FileNotFoundError:
+                    pass
+
+    def _store(self, model: CortexModel, stamp: Optional[str]) -> None:
+        self._model = model
+        self._fingerprint = stamp
+        self._loaded_at = time.time()
+        if self.path is None:
+            return
+        snapshot = {"saved_at": self._loaded_at, "fingerprint": stamp, "model": model.to_dict()}
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        write_chunks([json.dumps(snapshot).encode()], self.path)
+
+    def _load(self) -> None:
+        assert self.path is not None
+        try:
+            snapshot = json.loads(self.path.read_bytes())
+            model = CortexModel.from_dict(snapshot["model"])
+            fingerprint = snapshot.get("fingerprint")
+            loaded_at = float(snapshot.get("saved_at", 0.0))
+        except FileNotFoundError:
+            return
+        except (ValueError, TypeError, KeyError, AttributeError):
+            # A malformed snapshot is a cache miss, not an error.
+            logger.warning("Ignoring unreadable model snapshot %s", self.path)
+            return
+        self._model = model
+        self._fingerprint = fingerprint
+        self._loaded_at = loaded_at
+
+
+def _core_fingerprint(client: SynapseClient) -> str:
+    """Return a stable digest of the Cortex ``core_info`` response."""
+    encoded = json.dumps(client.core_info().result, sort_keys=True, default=str).encode()
+    return hashlib.sha256(encoded).hexdigest()
+
+
+# Storm syntax that may change data: node edit brackets, editing commands and
+# mutating method calls, including camelCase ones such as ``$node.addEdge()``
+# or ``$lib.model.ext.addForm()``. Commands are also matched in their
+# parenthesis-free form at the start of a query, a pipeline stage or a
+# subquery: the explicitly listed ones (``copyto``, ``scrape``, ``wget``,
+# ``gen.*``, ``pkg.*``, ``auth.*``) and any dotted command ending in a
+# mutating verb, such as ``cron.add``, ``macro.set`` or ``model.deprecated.lock``.
+# ``exec``/``eval`` run code that cannot be inspected, so they count as edits
+# too. This is a conservative deny-list, not a parser: matching is
+# deliberately broad, since a false positive only means a query is not cached
+# or retried, while a miss replays or repeats an edit.
+_EDIT_RE = re.compile(
+    r"\[|\b(delnode|movetag|movenodes|merge|sudo|edges\.del|tag\.prune|feed\.ingest|nodes\.import)\b"
+    r"|\.\s*(add|del|set|put|pop|wget|wput|urlfile|fork|merge|append|remove|clear|exec|eval)\w*\s*\("
+    r"|\$node\.(props|data)\.[\w:.]+\s*="
+    r"|(?:^|[|{])\s*(?:copyto|scrape|wget|runas|gen\.[\w.]+|pkg\.[\w.]+|auth\.[\w.]+"
+    r"|[\w.]+\.(?:add|del|set|load|mod|enable|disable|move|rename|grant|revoke|apply|push|put|pop|merge|fork"
+    r"|import|save|sync|lock|unlock|kill|reset|clear|prune|cleanup|undo|exec|run))\b",
+    re.IGNORECASE,
+)
+
+
+def is_read_only(query: str) -> bool:
+    """Return whether ``query`` looks free of edits and safe to cache.
+
+    See ``_EDIT_RE``: a query is only considered read-only when none of the
+    known edit syntax appears in it. When in doubt it is not read-only.
+    """
+    return _EDIT_RE.search(query) is None
+
+
+class StormCache:
+    """In-memory cache of :meth:`SynapseClient.storm` results.
+
+    Results are keyed on the query and its opts (which include the view)
+    and kept for ``ttl`` seconds. At most ``max_entries`` results holding
+    ``max_nodes`` nodes in total are kept; the least recently used ones are
+    dropped first. Queries that contain edit syntax are never cached, and
+    running one through the client invalidates the cached results for its
+    view.
+
+    Hits return new lists holding the cached message objects, so the
+    messages themselves should be treated as read-only.
+    """
+
+    def __init__(self, max_entries: int = 256, ttl: float = 60.0, max_nodes: int = 100000) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_nodes = max_nodes
+        self.stats = CacheStats()
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[str, Tuple[float, Optional[str], StormTuple]]" = OrderedDict()
+        self._nodes = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, query: str, opts: Optional[Dict[str, Any]], run: Callable[[], StormTuple]) -> StormTuple:
+        """Return the cached result of ``query`` or call ``run`` to produce it."""
+        if not is_read_only(query):
+            with self._lock:
+                self.stats.bypassed += 1
+            return run()
+        key = json.dumps([query, opts or {}], sort_keys=True, default=str)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.stats.hits += 1
+                return _copy(entry[2])
+            if entry is not None:
+                self._drop(key)
+            self.stats.misses += 1
+        result = run()
+        size = len(result[1])
+        if size > self.max_nodes:
+            return result
+        with self._lock:
+            if key in self._entries:
+                self._drop(key)
+            self._entries[key] = (now + self.ttl, (opts or {}).get("view"), _copy(result))
+            self._nodes += size
+            while len(self._entries) > self.max_entries or self._nodes > self.max_nodes:
+                self._drop(next(iter(self._entries)))
+                self.stats.evictions += 1
+        return result
+
+    def invalidate(self, view: Optional[str] = None) -> int:
+        """Drop the results cached for ``view`` (``None`` is the default view).
+
+        Returns the number of entries removed.
+        """
+        with self._lock:
+            keys = [key for key, entry in self._entries.items() if entry[1] == view]
+            for key in keys:
+                self._drop(key)
+        return len(keys)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._nodes = 0
+
+    def _drop(self, key: str) -> None:
+        entry = self._entries.pop(key)
+        self._nodes -= len(entry[2][1])
+
+
+def _copy(result: StormTuple) -> StormTuple:
+    init, nodes, fini, prints = result
+    return list(init), list(nodes), list(fini), list(prints)
@@ -1,10 +1,19 @@
 from __future__ import annotations
 
+import json
 import logging
+import mmap
+import os
+import socket
+import tempfile
+import threading
+import time
 from dataclasses import dataclass, field
-from typing import Optional, Dict, Any, List
+from pathlib import Path
+from typing import IO, Optional, Dict, Any, Callable, Iterable, Iterator, List, Tuple, Union
 
 import requests  # type: ignore
+from requests.adapters import HTTPAdapter  # type: ignore
 
 from .types import (
     Users,
@@ -13,23 +22,197 @@ from .types import (
     GenericMessage,
     CortexModel,
     AxonDelete,
+    PoolStats,
+    StormResult,
 )
-from .parse import parse_json_stream, InitData, Node, FiniData, PrintData
+from .axon import CHUNK_SIZE, AxonSource, iter_chunks, open_source, sha256_file, unique, write_chunks
+from .batch import imap_bounded, iter_batches
+from .cache import AxonCache, ModelCache, StormCache, is_read_only
+from .debug import BodyCapture
+from .feed import FeedReport, feed_bulk
+from .metrics import NULL_METRICS, CountingChunks, Metrics, RequestSample, response_sample
+from .metrics import ttfb as metrics_ttfb
+from .parse import (
+    parse_json_stream,
+    iter_json_stream,
+    raise_errors,
+    ErrData,
+    InitData,
+    Node,
+    FiniData,
+    PrintData,
+    Message,
+    StormError,
+)
+from .retry import DEFAULT_TIMEOUT, CircuitBreaker, DeadlineExceeded, RetryPolicy, cap_timeout, deadline, expiry
 
 logger = logging.getLogger(__name__)
 
 API_KEY_HEADER = "X-Api-Key"
+DEFAULT_POOL_SIZE = 10
+
+
+class StormStream:
+    """Messages of a query run by :meth:`SynapseClient.storm_iter`.
+
+    Iterate over it for the messages; :meth:`close` ends the query from the
+    thread reading it. :meth:`abort` may be called from any thread: it drops
+    the connection, so a read blocked waiting for the Cortex fails at once
+    instead of when the read timeout expires.
+    """
+
+    def __init__(self) -> None:
+        self._messages: Iterator[Message] = iter(())
+        self._response: Optional[requests.Response] = None
+        self._aborted = False
+        self._lock = threading.Lock()
+
+    def __iter__(self) -> Iterator[Message]:
+        # The messages themselves, so a for loop pays no per-message overhead.
+        return self._messages
+
+    def __next__(self) -> Message:
+        return next(self._messages)
+
+    def close(self) -> None:
+        self._messages.close()  # type: ignore[attr-defined]
+
+    @property
+    def aborted(self) -> bool:
+        return self._aborted
+
+    def abort(self) -> None:
+        """Drop the connection of the query, interrupting a blocked read."""
+        with self._lock:
+            self._aborted = True
+            resp = self._response
+        if resp is not None:
+            _shutdown_response(resp)
+
+    def _attach(self, resp: requests.Response) -> None:
+        with self._lock:
+            self._response = resp
+            aborted = self._aborted
+        if aborted:
+            _shutdown_response(resp)
+
+
+def _shutdown_response(resp: Any) -> None:
+    """Shut down the socket under a streamed ``requests`` response.
+
+    Closing the response from another thread would wait for the blocked
+    read; shutting the socket down makes that read return instead.
+    """
+    raw = getattr(resp, "raw", None)
+    connection = getattr(raw, "_connection", None)
+    sock = getattr(connection, "sock", None)
+    if sock is None:
+        # http.client's response reads from a socket file object.
+        fp = getattr(getattr(raw, "_fp", None), "fp", None)
+        sock = getattr(getattr(fp, "raw", None), "_sock", None)
+    if sock is None:
+        return
+    try:
+        sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
 
 
 @dataclass
 class SynapseClient:
+    """Blocking client for the Synapse HTTP API.
+
+    Connections are pooled per host by the ``requests`` session. The pool can
+    be tuned with ``pool_connections`` (number of hosts to keep pools for,
+    default 10) and ``pool_maxsize`` (connections kept open per host, default
+    10), which should be at least the number of threads sharing the client.
+    A ``session`` passed in keeps its own adapters unless pool settings are
+    given as well. ``keep_alive=False``
+    closes each connection after its response. ``timeout`` is passed to every
+    request, either as seconds or as a ``(connect, read)`` tuple; it defaults
+    to 10 seconds to connect and 300 seconds between bytes read.
+
+    Failed idempotent requests are retried according to ``retry``, a
+    :class:`~gosynapse.retry.RetryPolicy`. Storm queries are only retried
+    when the caller marks them ``idempotent=True``, since a query that timed
+    out may already have made its edits. ``circuit_breaker`` makes
+    calls fail fast while the Cortex is down. ``deadline`` bounds the total
+    time of each call, retries included, in seconds; see
+    :mod:`gosynapse.retry` for deadlines spanning several calls.
+
+    ``axon_cache`` puts a local :class:`~gosynapse.cache.AxonCache` in front
+    of :meth:`axon_get`, ``model_cache`` a
+    :class:`~gosynapse.cache.ModelCache` in front of :meth:`model` and
+    ``storm_cache`` a :class:`~gosynapse.cache.StormCache` in front of
+    :meth:`storm`. Every call is reported to ``metrics``, see
+    :mod:`gosynapse.metrics`. Response bodies are never logged; set
+    ``body_capture`` to a :class:`~gosynapse.debug.BodyCapture` to record
+    samples of Storm responses to a file.
+    """
+
     host: str
     port: str
     api_key: str = ""
-    session: requests.Session = field(default_factory=requests.Session)
+    session: requests.Session = None  # type: ignore[assignment]
+    scheme: str = "https"
+    pool_connections: Optional[int] = None
+    pool_maxsize: Optional[int] = None
+    keep_alive: bool = True
+    timeout: Optional[Union[float, Tuple[float, float]]] = DEFAULT_TIMEOUT
+    axon_cache: Optional[AxonCache] = None
+    model_cache: Optional[ModelCache] = None
+    storm_cache: Optional[StormCache] = None
+    metrics: Metrics = NULL_METRICS
+    body_capture: Optional[BodyCapture] = None
+    retry: RetryPolicy = field(default_factory=RetryPolicy)
+    circuit_breaker: Optional[CircuitBreaker] = field(default_factory=CircuitBreaker)
+    deadline: Optional[float] = None
+
+    def __post_init__(self) -> None:
+        pooled = self.pool_connections is not None or self.pool_maxsize is not None
+        if self.session is None:
+            self.session = requests.Session()
+            pooled = True
+        if pooled:
+            adapter = HTTPAdapter(
+                pool_connections=self.pool_connections or DEFAULT_POOL_SIZE,
+                pool_maxsize=self.pool_maxsize or DEFAULT_POOL_SIZE,
+            )
+            self.session.mount("https://", adapter)
+            self.session.mount("http://", adapter)
+        if not self.keep_alive:
+            self.session.headers["Connection"] = "close"
+
+    def __enter__(self) -> "SynapseClient":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self.session.close()
+
+    def pool_stats(self) -> PoolStats:
+        """Return connection reuse counters for the hosts currently pooled."""
+        stats = PoolStats()
+        for adapter in set(self.session.adapters.values()):
+            manager = getattr(adapter, "poolmanager", None)
+            if manager is None:
+                continue
+            for key in list(manager.pools.keys()):
+                pool = manager.pools.get(key)
+                if pool is None:
+                    continue
+                # Counters of urllib3's HTTPConnectionPool; absent from other
+                # adapters' pools.
+                stats.pools += 1
+                stats.opened += getattr(pool, "num_connections", 0)
+                stats.requests += getattr(pool, "num_requests", 0)
+        stats.reused = max(stats.requests - stats.opened, 0)
+        return stats
 
     def _url(self, path: str) -> str:
-        return f"https://{self.host}:{self.port}{path}"
+        return f"{self.scheme}://{self.host}:{self.port}{path}"
 
     def _headers(self) -> Dict[str, str]:
         headers = {}
@@ -37,180 +220,762 @@ class SynapseClient:
             headers[API_KEY_HEADER] = self.api_key
         return headers
 
+    def _request(
+        self, method: str, path: str, op: str = "", idempotent: Optional[bool] = None, **kwargs: Any
+    ) -> requests.Response:
+        """Send a request; ``op`` names the client method for :attr:`metrics`.
+
+        The request is retried per :attr:`retry` if ``idempotent`` (by
+        default: if ``method`` is), and is subject to :attr:`deadline` and
+        :attr:`circuit_breaker`. Only the request up to its response headers
+        is retried; a response body that fails part way is not. Streamed
+        responses (``stream=True``) are not recorded here; the caller records
+        them once the body has been consumed.
+        """
+        headers = self._headers()
+        headers.update(kwargs.pop("headers", None) or {})
+        timeout = kwargs.pop("timeout", self.timeout)
+        policy = self.retry
+        retries = policy.retries if (policy.is_idempotent(method) if idempotent is None else idempotent) else 0
+        breaker = self.circuit_breaker
+        expires = expiry(self.deadline)
+        attempt = 0
+        while True:
+            attempt += 1
+            if breaker is not None:
+                breaker.before()
+            attempt_timeout = cap_timeout(timeout, expires)
+            try:
+                resp = self._send(method, path, op, headers, timeout=attempt_timeout, **kwargs)
+            except Exception as exc:
+                transient = policy.is_transient(exc)
+                if breaker is not None:
+                    if transient:
+                        breaker.record(exc=exc)
+                    else:
+                        # Not evidence either way of the Cortex being healthy.
+                        breaker.release()
+                if expires is not None and time.monotonic() >= expires:
+                    raise DeadlineExceeded(f"{method} {path} did not complete before its deadline") from exc
+                if not transient or attempt > retries:
+                    raise
+                delay = policy.delay(attempt)
+                if expires is not None and time.monotonic() + delay >= expires:
+                    raise DeadlineExceeded(f"{method} {path} did not complete before its deadline") from exc
+                logger.debug("%s %s failed (%s), retrying in %.2fs", method, path, exc, delay)
+            else:
+                if breaker is not None:
+                    breaker.record(resp)
+                if resp.status_code not in policy.statuses or attempt > retries:
+                    return resp
+                delay = policy.delay(attempt, resp)
+                if expires is not None and time.monotonic() + delay >= expires:
+                    return resp
+                resp.close()
+                logger.debug("%s %s returned %s, retrying in %.2fs", method, path, resp.status_code, delay)
+            time.sleep(delay)
+
+    def _send(self, method: str, path: str, op: str, headers: Dict[str, str], **kwargs: Any) -> requests.Response:
+        send = getattr(self.session, method.lower())
+        if not self.metrics.enabled:
+            return send(self._url(path), headers=headers, **kwargs)
+        start = time.perf_counter()
+        try:
+            resp = send(self._url(path), headers=headers, **kwargs)
+        except Exception as exc:
+            self.metrics.record(
+                RequestSample(op=op or path, method=method, path=path, total=time.perf_counter() - start, error=repr(exc))
+            )
+            raise
+        if not kwargs.get("stream"):
+            self.metrics.record(response_sample(op or path, method, path, resp, start))
+        return resp
+
     def login(self, username: str, password: str) -> None:
-        url = self._url("/api/v1/login")
-        resp = self.session.post(url, json={"user": username, "passwd": password}, headers=self._headers(), verify=False)
+        resp = self._request("POST", "/api/v1/login", op="login", json={"user": username, "passwd": password}, verify=False)
         resp.raise_for_status()
         self.session.headers.update({"Cookie": resp.headers.get("Set-Cookie", "")})
 
     def logout(self) -> None:
-        url = self._url("/api/v1/logout")
-        resp = self.session.get(url, headers=self._headers())
+        resp = self._request("GET", "/api/v1/logout", op="logout")
         resp.raise_for_status()
 
     def get_active(self) -> Active:
-        url = self._url("/api/v1/active")
-        resp = self.session.get(url, headers=self._headers())
+        resp = self._request("GET", "/api/v1/active", op="get_active")
         resp.raise_for_status()
         return Active(**resp.json())
 
     def get_users(self) -> Users:
-        url = self._url("/api/v1/auth/users")
-        resp = self.session.get(url, headers=self._headers())
+        resp = self._request("GET", "/api/v1/auth/users", op="get_users")
         resp.raise_for_status()
         return Users(**resp.json())
 
     def get_roles(self) -> Roles:
-        url = self._url("/api/v1/auth/roles")
-        resp = self.session.get(url, headers=self._headers())
+        resp = self._request("GET", "/api/v1/auth/roles", op="get_roles")
         resp.raise_for_status()
         return Roles(**resp.json())
 
     def add_user(self, username: str) -> GenericMessage:
-        url = self._url("/api/v1/auth/adduser")
-        resp = self.session.post(url, json={"name": username}, headers=self._headers())
+        resp = self._request("POST", "/api/v1/auth/adduser", op="add_user", json={"name": username})
         resp.raise_for_status()
         return GenericMessage(**resp.json())
 
     def add_role(self, role_name: str) -> GenericMessage:
-        url = self._url("/api/v1/auth/addrole")
-        resp = self.session.post(url, json={"name": role_name}, headers=self._headers())
+        resp = self._request("POST", "/api/v1/auth/addrole", op="add_role", json={"name": role_name})
         resp.raise_for_status()
         return GenericMessage(**resp.json())
 
     def delete_role(self, role_name: str) -> GenericMessage:
-        url = self._url("/api/v1/auth/delrole")
-        resp = self.session.post(url, json={"name": role_name}, headers=self._headers())
+        resp = self._request("POST", "/api/v1/auth/delrole", op="delete_role", json={"name": role_name})
         resp.raise_for_status()
         return GenericMessage(**resp.json())
 
     def modify_user(self, iden: str, user: Dict[str, Any]) -> GenericMessage:
-        url = self._url(f"/api/v1/auth/user/{iden}")
-        resp = self.session.post(url, json=user, headers=self._headers())
+        resp = self._request("POST", f"/api/v1/auth/user/{iden}", op="modify_user", json=user)
         resp.raise_for_status()
         return GenericMessage(**resp.json())
 
     def change_password(self, iden: str, password: str) -> GenericMessage:
-        url = self._url(f"/api/v1/auth/password/{iden}")
-        resp = self.session.post(url, json={"passwd": password}, headers=self._headers())
+        resp = self._request("POST", f"/api/v1/auth/password/{iden}", op="change_password", json={"passwd": password})
         resp.raise_for_status()
         return GenericMessage(**resp.json())
 
     def feed(self, nodes: Dict[str, str]) -> GenericMessage:
-        url = self._url("/api/v1/feed")
-        resp = self.session.post(url, json=nodes, headers=self._headers())
+        resp = self._request("POST", "/api/v1/feed", op="feed", json=nodes)
         resp.raise_for_status()
         return GenericMessage(**resp.json())
 
-    def storm(
-        self, storm_query: str, opts: Optional[Dict[str, str]] = None
-    ) -> tuple[List[InitData], List[Node], List[FiniData], List[PrintData]]:
-        url = self._url("/api/v1/storm")
+    def feed_bulk(self, records: Iterable[Any], **kwargs: Any) -> FeedReport:
+        """Ingest many feed records in parallel batches.
+
+        See :func:`gosynapse.feed.feed_bulk` for the available options.
+        """
+        return feed_bulk(self, records, **kwargs)
+
+    def _storm_request(
+        self,
+        storm_query: str,
+        opts: Optional[Dict[str, str]] = None,
+        op: str = "storm",
+        idempotent: bool = False,
+        **kwargs: Any,
+    ) -> requests.Response:
         payload = {
             "query": storm_query,
             "opts": opts or {},
             "stream": "jsonlines",
         }
-        logger.debug("Storm request URL: %s", url)
-        logger.debug("Storm request payload: %s", payload)
+        if self.storm_cache is not None and not is_read_only(storm_query):
+            self.storm_cache.invalidate((opts or {}).get("view"))
+        # Whether a query is safe to send twice is the caller's call, whichever
+        # method is used; is_read_only() is only good enough for the cache.
+        kwargs["idempotent"] = idempotent
+        # Only the query is logged; opts may carry large variable payloads.
+        logger.debug("Storm %s request: %s", op, storm_query)
         # Use POST for Storm queries when possible. Some Cortex deployments only
         # support the legacy GET endpoint. In that case fall back to GET with the
         # same JSON payload.
-        resp = self.session.post(
-            url,
-            json=payload,
-            headers=self._headers(),
-            verify=False,
-            stream=True,
-        )
+        resp = self._request("POST", "/api/v1/storm", op=op, json=payload, verify=False, stream=True, **kwargs)
         logger.debug("Storm response status code: %s", resp.status_code)
         if resp.status_code == 404:
             logger.debug("POST /storm returned 404, falling back to GET")
-            resp = self.session.get(
-                url,
-                json=payload,
-                headers=self._headers(),
-                verify=False,
-                stream=True,
-            )
+            resp.close()
+            resp = self._request("GET", "/api/v1/storm", op=op, json=payload, verify=False, stream=True, **kwargs)
             logger.debug("Storm GET fallback status: %s", resp.status_code)
-        resp.raise_for_status()
+        try:
+            resp.raise_for_status()
+        except Exception:
+            # The body is streamed; release its connection before raising.
+            resp.close()
+            raise
+        return resp
+
+    def storm(
+        self, storm_query: str, opts: Optional[Dict[str, str]] = None, idempotent: bool = False
+    ) -> tuple[List[InitData], List[Node], List[FiniData], List[PrintData]]:
+        """Run a Storm query and return its parsed messages.
+
+        With :attr:`storm_cache` set, read-only queries may be answered from
+        the cache. Pass ``idempotent=True`` to have a query that is safe to
+        run twice retried per :attr:`retry`.
+        """
+        if self.storm_cache is not None:
+            return self.storm_cache.get(storm_query, opts, lambda: self._storm(storm_query, opts, idempotent))
+        return self._storm(storm_query, opts, idempotent)
+
+    def _storm(
+        self, storm_query: str, opts: Optional[Dict[str, str]] = None, idempotent: bool = False
+    ) -> tuple[List[InitData], List[Node], List[FiniData], List[PrintData]]:
+        if self.metrics.enabled:
+            return self._storm_measured(storm_query, opts, idempotent)
+        resp = self._storm_request(storm_query, opts, idempotent=idempotent)
         body = resp.content
-        logger.debug("Storm response body: %s", body.decode(errors="ignore"))
+        self._capture("storm", storm_query, body)
         return parse_json_stream(body)
 
-    def storm_call(self, storm_query: str, opts: List[str]) -> GenericMessage:
-        url = self._url("/api/v1/storm/call")
+    def _capture(self, op: str, storm_query: str, body: bytes) -> None:
+        capture = self.body_capture
+        if capture is not None and capture.sampled():
+            capture.write(op, storm_query, body[:capture.max_bytes], len(body))
+
+    def _body_chunks(self, resp: requests.Response, chunk_size: Optional[int], op: str, storm_query: str) -> Iterable[bytes]:
+        chunks = resp.iter_content(chunk_size=chunk_size)
+        capture = self.body_capture
+        if capture is not None and capture.sampled():
+            return capture.tee(chunks, op, storm_query)
+        return chunks
+
+    def _storm_measured(
+        self, storm_query: str, opts: Optional[Dict[str, str]] = None, idempotent: bool = False
+    ) -> tuple[List[InitData], List[Node], List[FiniData], List[PrintData]]:
+        sample = RequestSample(op="storm", method="POST", path="/api/v1/storm")
+        start = time.perf_counter()
+        try:
+            resp = self._storm_request(storm_query, opts, idempotent=idempotent)
+            sample.status = resp.status_code
+            sample.ttfb = metrics_ttfb(resp, start)
+            body = resp.content
+            sample.bytes = len(body)
+            self._capture("storm", storm_query, body)
+            mark = time.perf_counter()
+            result = parse_json_stream(body)
+            sample.parse = time.perf_counter() - mark
+            sample.nodes = len(result[1])
+            if result[2]:
+                sample.took = result[2][-1].took / 1000
+            return result
+        except Exception as exc:
+            sample.error = repr(exc)
+            raise
+        finally:
+            sample.total = time.perf_counter() - start
+            self.metrics.record(sample)
+
+    def storm_iter(
+        self,
+        storm_query: str,
+        opts: Optional[Dict[str, str]] = None,
+        chunk_size: Optional[int] = None,
+        timeout: Optional[Union[float, Tuple[float, float]]] = None,
+        idempotent: bool = False,
+    ) -> StormStream:
+        """Run a Storm query and yield messages as they arrive on the wire.
+
+        Unlike :meth:`storm` the response body is never buffered; memory use
+        stays constant regardless of the number of nodes returned. With the
+        default ``chunk_size`` of ``None`` each chunk of the chunked HTTP
+        response is parsed as soon as it is received. ``timeout`` overrides
+        the client :attr:`timeout` for this query. An ``err`` message from
+        the Cortex raises :class:`~gosynapse.parse.StormError`. With
+        ``idempotent=True`` the request is retried like :meth:`storm`'s; a
+        response that fails part way through is not.
+
+        The returned :class:`StormStream` can be closed to stop reading, or
+        aborted from another thread to interrupt a read that is waiting for
+        the Cortex.
+        """
+        kwargs: Dict[str, Any] = {"idempotent": True} if idempotent else {}
+        stream = StormStream()
+        stream._messages = self._storm_stream(storm_query, opts, chunk_size, timeout, "storm_iter", stream, **kwargs)
+        return stream
+
+    def _storm_stream(
+        self,
+        storm_query: str,
+        opts: Optional[Dict[str, Any]],
+        chunk_size: Optional[int],
+        timeout: Optional[Union[float, Tuple[float, float]]],
+        op: str,
+        handle: Optional[StormStream] = None,
+        **kwargs: Any,
+    ) -> Iterator[Message]:
+        if timeout is not None:
+            kwargs["timeout"] = timeout
+        if self.metrics.enabled:
+            yield from self._storm_stream_measured(storm_query, opts, chunk_size, op, handle, kwargs)
+            return
+        resp = self._storm_request(storm_query, opts, op, **kwargs)
+        try:
+            if handle is not None:
+                handle._attach(resp)
+            yield from raise_errors(iter_json_stream(self._body_chunks(resp, chunk_size, op, storm_query)))
+        finally:
+            resp.close()
+
+    def _storm_stream_measured(
+        self,
+        storm_query: str,
+        opts: Optional[Dict[str, Any]],
+        chunk_size: Optional[int],
+        op: str,
+        handle: Optional[StormStream],
+        kwargs: Dict[str, Any],
+    ) -> Iterator[Message]:
+        sample = RequestSample(op=op, method="POST", path="/api/v1/storm")
+        start = time.perf_counter()
+        decoding = 0.0
+        chunks = None
+        try:
+            resp = self._storm_request(storm_query, opts, op, **kwargs)
+            if handle is not None:
+                handle._attach(resp)
+            sample.status = resp.status_code
+            sample.ttfb = metrics_ttfb(resp, start)
+            chunks = CountingChunks(self._body_chunks(resp, chunk_size, op, storm_query))
+            messages = iter_json_stream(chunks)
+            try:
+                while True:
+                    # Time spent in the decoder, less the time it spent
+                    # waiting for chunks, is parse time; time spent by the
+                    # caller between messages is not counted.
+                    mark = time.perf_counter()
+                    message = next(messages, None)
+                    decoding += time.perf_counter() - mark
+                    if message is None:
+                        break
+                    if isinstance(message, Node):
+                        sample.nodes += 1
+                    elif isinstance(message, FiniData):
+                        sample.took = message.took / 1000
+                    elif isinstance(message, ErrData):
+                        raise StormError(message)
+                    yield message
+            finally:
+                resp.close()
+        except Exception as exc:
+            sample.error = repr(exc)
+            raise
+        finally:
+            if chunks is not None:
+                sample.bytes = chunks.bytes
+                sample.parse = max(decoding - chunks.wait, 0.0)
+            sample.total = time.perf_counter() - start
+            self.metrics.record(sample)
+
+    def storm_many(
+        self,
+        items: Iterable[Union[str, Dict[str, Any]]],
+        query: Optional[str] = None,
+        opts: Optional[Dict[str, Any]] = None,
+        concurrency: int = 8,
+        ordered: bool = False,
+        timeout: Optional[float] = None,
+    ) -> Iterator[StormResult]:
+        """Run many Storm queries concurrently over the pooled session.
+
+        ``items`` are either query strings, each run with ``opts``, or, when
+        ``query`` is given, dicts of Storm variables that are merged into
+        ``opts["vars"]`` for one run of that query each::
+
+            client.storm_many(({"fqdn": f} for f in fqdns), query="inet:fqdn=$fqdn -> inet:dns:a")
+
+        ``concurrency`` queries run at once, so the client ``pool_maxsize``
+        should be at least as large. A :class:`~gosynapse.types.StormResult`
+        is yielded per item as it completes, or in input order with
+        ``ordered``. A query that fails, or that takes longer than
+        ``timeout`` seconds in total, produces a result with ``error`` set
+        rather than stopping the others; the time left is also the read
+        timeout of each query, so one that stalls is cut off as well. ``items`` is consumed lazily.
+        """
+        jobs = (self._storm_job(item, query, opts) for item in items)
+
+        def run(job: Tuple[str, Dict[str, Any]]) -> StormResult:
+            return self._storm_collect(job[0], job[1], timeout)
+
+        for index, (job_query, job_opts), future in imap_bounded(run, jobs, concurrency, ordered=ordered):
+            exc = future.exception()
+            if exc is not None:
+                logger.debug("Storm query %d failed: %s", index, exc)
+                yield StormResult(index=index, query=job_query, opts=job_opts, error=exc)
+                continue
+            result = future.result()
+            result.index = index
+            yield result
+
+    def storm_seeds(
+        self,
+        query: str,
+        seeds: Iterable[Any],
+        var: str = "vals",
+        opts: Optional[Dict[str, Any]] = None,
+        max_batch: int = 1000,
+        max_payload_bytes: int = 512 * 1024,
+        key: Optional[Callable[[Node], Any]] = None,
+        timeout: Optional[Union[float, Tuple[float, float]]] = None,
+    ) -> Iterator[Tuple[Optional[Any], Node]]:
+        """Run ``query`` over ``seeds`` in batches passed as a Storm variable.
+
+        Seeds are grouped into lists of at most ``max_batch`` values and
+        roughly ``max_payload_bytes`` of JSON, and each list is passed as
+        ``$<var>`` in ``opts["vars"]``, so one request covers a whole batch::
+
+            client.storm_seeds("for $v in $vals { inet:fqdn=$v }", fqdns)
+
+        Nodes are streamed back as ``(seed, node)``. The seed is found by
+        matching ``key(node)``, by default the node's primary value, against
+        the seeds of the batch; nodes that match no seed, for example after a
+        pivot, are yielded with ``None``. Duplicate seeds within a batch are
+        sent once.
+        """
+        keyfunc = key or _ndef_valu
+
+        def size(seed: Any) -> int:
+            return len(json.dumps(seed, default=str)) + 1
+
+        for batch in iter_batches(seeds, max_batch, max_payload_bytes, size=size):
+            lookup = {}
+            for seed in batch:
+                lookup.setdefault(_seed_key(seed), seed)
+            batch_opts = dict(opts or {})
+            batch_opts["vars"] = {**batch_opts.get("vars", {}), var: list(lookup.values())}
+            for message in self._storm_stream(query, batch_opts, None, timeout, "storm_seeds"):
+                if isinstance(message, Node):
+                    yield lookup.get(_seed_key(keyfunc(message))), message
+
+    @staticmethod
+    def _storm_job(
+        item: Union[str, Dict[str, Any]], query: Optional[str], opts: Optional[Dict[str, Any]]
+    ) -> Tuple[str, Dict[str, Any]]:
+        job_opts = dict(opts or {})
+        if query is None:
+            if not isinstance(item, str):
+                raise TypeError("storm_many items must be query strings unless query is given")
+            return item, job_opts
+        job_opts["vars"] = {**job_opts.get("vars", {}), **item}
+        return query, job_opts
+
+    def _storm_collect(self, storm_query: str, opts: Dict[str, Any], timeout: Optional[float]) -> StormResult:
+        result = StormResult(index=-1, query=storm_query, opts=opts)
+        if timeout is None:
+            return self._storm_collect_into(result, None)
+        # The deadline cuts the read timeout of the request to the time left,
+        # so a query that stalls mid-stream fails within its budget too.
+        with deadline(timeout):
+            return self._storm_collect_into(result, timeout)
+
+    def _storm_collect_into(self, result: StormResult, timeout: Optional[float]) -> StormResult:
+        start = time.monotonic()
+        messages = self._storm_stream(result.query, result.opts, None, None, "storm_many")
+        try:
+            for message in messages:
+                if isinstance(message, Node):
+                    result.nodes.append(message)
+                elif isinstance(message, InitData):
+                    result.init.append(message)
+                elif isinstance(message, PrintData):
+                    result.prints.append(message)
+                elif isinstance(message, FiniData):
+                    result.fini.append(message)
+                # The read timeout only bounds each socket read; enforce the
+                # total time here so a slow trickle of nodes is cut off too.
+                if timeout is not None and time.monotonic() - start > timeout:
+                    raise DeadlineExceeded(f"Storm query exceeded {timeout}s")
+        except Exception as exc:
+            if timeout is not None and not isinstance(exc, TimeoutError) and time.monotonic() - start >= timeout:
+                # A read cut short by the deadline surfaces as a requests error.
+                timed_out = DeadlineExceeded(f"Storm query exceeded {timeout}s")
+                timed_out.__cause__ = exc
+                exc = timed_out
+            result.error = exc
+        finally:
+            messages.close()
+            result.elapsed = time.monotonic() - start
+        return result
+
+    def storm_call(self, storm_query: str, opts: List[str], idempotent: bool = False) -> GenericMessage:
         # Storm function invocations are made via POST requests
-        resp = self.session.post(
-            url,
+        resp = self._request(
+            "POST",
+            "/api/v1/storm/call",
+            op="storm_call",
+            idempotent=idempotent,
             json={"query": storm_query, "opts": opts},
-            headers=self._headers(),
         )
         resp.raise_for_status()
         return GenericMessage(**resp.json())
 
-    def storm_export(self, storm_query: str, opts: List[str]) -> GenericMessage:
-        url = self._url("/api/v1/storm/export")
-        resp = self.session.post(
-            url,
+    def storm_export(self, storm_query: str, opts: List[str], idempotent: bool = False) -> GenericMessage:
+        resp = self._request(
+            "POST",
+            "/api/v1/storm/export",
+            op="storm_export",
+            idempotent=idempotent,
             json={"query": storm_query, "opts": opts},
-            headers=self._headers(),
         )
         resp.raise_for_status()
         return GenericMessage(**resp.json())
 
+    def storm_export_resumable(
+        self, storm_query: str, path: Union[str, "os.PathLike[str]"], opts: Optional[Dict[str, Any]] = None, **kwargs: Any
+    ) -> Any:
+        """Stream the nodes of a query to ``path``, resuming an earlier run.
+
+        Returns the final :class:`~gosynapse.export.ExportCheckpoint`. See
+        :class:`gosynapse.export.ResumableExport` for the other options.
+        """
+        from .export import ResumableExport
+
+        return ResumableExport(self, storm_query, path, opts=opts, **kwargs).run()
+
     def model(self) -> CortexModel:
-        url = self._url("/api/v1/model")
-        resp = self.session.get(url, headers=self._headers())
+        """Return the Cortex data model, via :attr:`model_cache` when set."""
+        if self.model_cache is not None:
+            return self.model_cache.get(self)
+        return self._fetch_model()
+
+    def _fetch_model(self) -> CortexModel:
+        resp = self._request("GET", "/api/v1/model", op="model")
         resp.raise_for_status()
-        return CortexModel(**resp.json())
+        return CortexModel.from_dict(resp.json())
 
     def vars_get(self) -> GenericMessage:
-        url = self._url("/api/v1/vars/get")
-        resp = self.session.get(url, headers=self._headers())
+        resp = self._request("GET", "/api/v1/vars/get", op="vars_get")
         resp.raise_for_status()
         return GenericMessage(**resp.json())
 
     def vars_set(self, vars_map: Dict[str, Any]) -> GenericMessage:
-        url = self._url("/api/v1/vars/set")
-        resp = self.session.post(url, json=vars_map, headers=self._headers())
+        resp = self._request("POST", "/api/v1/vars/set", op="vars_set", json=vars_map)
         resp.raise_for_status()
         return GenericMessage(**resp.json())
 
     def vars_pop(self, key: str) -> GenericMessage:
-        url = self._url("/api/v1/vars/pop")
-        resp = self.session.post(url, json={"name": key}, headers=self._headers())
+        resp = self._request("POST", "/api/v1/vars/pop", op="vars_pop", json={"name": key})
         resp.raise_for_status()
         return GenericMessage(**resp.json())
 
     def core_info(self) -> GenericMessage:
-        url = self._url("/api/v1/core/info")
-        resp = self.session.get(url, headers=self._headers())
+        resp = self._request("GET", "/api/v1/core/info", op="core_info")
         resp.raise_for_status()
         return GenericMessage(**resp.json())
 
     # Axon methods
     def axon_delete(self, sha256s: List[str]) -> AxonDelete:
-        url = self._url("/api/v1/axon/files/del")
-        resp = self.session.post(url, json={"sha256": sha256s}, headers=self._headers())
+        resp = self._request("POST", "/api/v1/axon/files/del", op="axon_delete", json={"sha256": sha256s})
         resp.raise_for_status()
         return AxonDelete(**resp.json())
 
-    def axon_put(self, file_bytes: bytes) -> GenericMessage:
-        url = self._url("/api/v1/axon/files/put")
-        resp = self.session.post(url, data=file_bytes, headers=self._headers())
+    def axon_put(self, data: AxonSource) -> GenericMessage:
+        """Upload a blob to the Axon.
+
+        ``data`` may be bytes, a file path, a binary file object or an
+        iterable of byte chunks. Files and iterables are streamed rather than
+        read into memory, and the SHA256 is computed as the data is sent; if
+        the Axon reports a different hash ``ValueError`` is raised.
+        """
+        body, hasher, opened = open_source(data)
+        try:
+            resp = self._request("POST", "/api/v1/axon/files/put", op="axon_put", data=body)
+        finally:
+            if opened is not None:
+                opened.close()
         resp.raise_for_status()
-        return GenericMessage(**resp.json())
+        message = GenericMessage(**resp.json())
+        result = message.result
+        if isinstance(result, dict) and result.get("sha256") not in (None, hasher.sha256.hexdigest()):
+            raise ValueError(
+                f"Axon stored SHA256 {result['sha256']} but {hasher.sha256.hexdigest()} was uploaded"
+            )
+        return message
 
     def axon_has(self, sha256: str) -> GenericMessage:
-        url = self._url(f"/api/v1/axon/files/has/sha256/{sha256}")
-        resp = self.session.get(url, headers=self._headers())
+        resp = self._request("GET", f"/api/v1/axon/files/has/sha256/{sha256}", op="axon_has")
         resp.raise_for_status()
         return GenericMessage(**resp.json())
 
-    def axon_get(self, sha256: str) -> bytes:
-        url = self._url(f"/api/v1/axon/files/by/sha256/{sha256}")
-        resp = self.session.get(url, headers=self._headers())
-        resp.raise_for_status()
-        return bytes(resp.content)
+    def axon_has_many(
+        self, sha256s: Iterable[str], workers: int = 8, ordered: bool = False
+    ) -> Iterator[Tuple[str, Union[bool, BaseException]]]:
+        """Check many hashes concurrently, yielding ``(sha256, present)``.
+
+        Duplicate hashes are looked up once. Results are yielded as lookups
+        finish, or in input order with ``ordered``; a lookup that failed
+        yields ``(sha256, exception)`` so one bad hash does not stop the
+        rest. ``sha256s`` is consumed lazily, so it may be a generator.
+        """
+        lookups = imap_bounded(self.axon_has, unique(sha256s), workers, ordered=ordered)
+        for _, sha256, future in lookups:
+            exc = future.exception()
+            yield sha256, exc if exc is not None else bool(future.result().result)
+
+    def axon_missing(self, sha256s: Iterable[str], workers: int = 8) -> List[str]:
+        """Return the hashes from ``sha256s`` that the Axon does not have.
+
+        Raises the first failed lookup's exception, once all lookups are done.
+        """
+        missing = []
+        error: Optional[BaseException] = None
+        for sha256, present in self.axon_has_many(sha256s, workers, ordered=True):
+            if isinstance(present, BaseException):
+                error = error or present
+            elif not present:
+                missing.append(sha256)
+        if error is not None:
+            raise error
+        return missing
+
+    def axon_get_many(
+        self,
+        sha256s: Iterable[str],
+        dest_dir: Union[str, "os.PathLike[str]"],
+        workers: int = 8,
+        verify: bool = True,
+    ) -> Iterator[Tuple[str, Union[Path, BaseException]]]:
+        """Download many blobs concurrently into ``dest_dir``.
+
+        Each blob is streamed to ``dest_dir/<sha256>``. Yields
+        ``(sha256, path)`` as downloads finish, or ``(sha256, exception)``
+        for a download that failed so one bad blob does not stop the rest.
+        """
+        directory = Path(dest_dir)
+        directory.mkdir(parents=True, exist_ok=True)
+
+        def fetch(sha256: str) -> Path:
+            return self.axon_get(sha256, directory / sha256, verify=verify)
+
+        for _, sha256, future in imap_bounded(fetch, unique(sha256s), workers):
+            exc = future.exception()
+            yield sha256, exc if exc is not None else future.result()
+
+    def axon_put_missing(
+        self, paths: Iterable[Union[str, "os.PathLike[str]"]], workers: int = 8
+    ) -> Iterator[Tuple[Union[str, "os.PathLike[str]"], Optional[str], Union[bool, BaseException]]]:
+        """Upload only the files the Axon does not already have.
+
+        Each file is hashed locally, checked with :meth:`axon_has` and
+        uploaded only when missing, with ``workers`` files in progress at
+        once. Yields ``(path, sha256, uploaded)`` as files finish; local
+        files with identical content are uploaded at most once. A file that
+        failed yields ``(path, sha256, exception)``, with ``sha256`` ``None``
+        if it could not be hashed, so one bad file does not stop the rest.
+        """
+        lock = threading.Lock()
+        claimed = set()
+        hashes: Dict[int, str] = {}
+
+        def sync(item: Tuple[int, Union[str, "os.PathLike[str]"]]) -> bool:
+            index, path = item
+            sha256 = hashes[index] = sha256_file(path)
+            with lock:
+                if sha256 in claimed:
+                    return False
+                claimed.add(sha256)
+            try:
+                if self.axon_has(sha256).result:
+                    return False
+                self.axon_put(path)
+            except Exception:
+                # Let a later file with the same content try again.
+                with lock:
+                    claimed.discard(sha256)
+                raise
+            return True
+
+        for index, (_, path), future in imap_bounded(sync, enumerate(paths), workers):
+            exc = future.exception()
+            yield path, hashes.pop(index, None), exc if exc is not None else future.result()
+
+    def axon_get(
+        self,
+        sha256: str,
+        dest: Optional[Union[str, "os.PathLike[str]", IO[bytes]]] = None,
+        chunk_size: int = CHUNK_SIZE,
+        verify: bool = True,
+    ) -> Any:
+        """Download a blob from the Axon.
+
+        Without ``dest`` the blob is returned as ``bytes``. With a path it is
+        streamed to that file (atomically, via a temporary file) and the path
+        is returned; with a writable file object it is streamed into it and
+        the object is returned. When streaming, peak memory is bounded by
+        ``chunk_size`` and, with ``verify``, the data is checked against
+        ``sha256`` as it is written.
+
+        When :attr:`axon_cache` is set blobs are served from the cache and
+        only downloaded on a miss.
+        """
+        if self.axon_cache is None:
+            return self._axon_download(sha256, dest, chunk_size, verify)
+        path = self.axon_cache.ensure(sha256, lambda p: self._axon_download(sha256, p, chunk_size, True))
+        if dest is None:
+            return path.read_bytes()
+        with open(path, "rb") as fileobj:
+            write_chunks(iter_chunks(fileobj, chunk_size), dest)
+        return Path(dest) if isinstance(dest, (str, os.PathLike)) else dest
+
+    def _axon_download(
+        self,
+        sha256: str,
+        dest: Optional[Union[str, "os.PathLike[str]", IO[bytes]]],
+        chunk_size: int,
+        verify: bool,
+    ) -> Any:
+        path = f"/api/v1/axon/files/by/sha256/{sha256}"
+        start = time.perf_counter()
+        resp = self._request("GET", path, op="axon_get", stream=dest is not None)
+        if dest is None:
+            resp.raise_for_status()
+            return resp.content
+        chunks: Optional[Iterable[bytes]] = None
+        error = None
+        try:
+            # Inside the try, so a failed download still releases its
+            # connection and records its sample.
+            resp.raise_for_status()
+            chunks = resp.iter_content(chunk_size=chunk_size)
+            if self.metrics.enabled:
+                chunks = CountingChunks(chunks)
+            write_chunks(chunks, dest, sha256 if verify else None)
+        except Exception as exc:
+            error = repr(exc)
+            raise
+        finally:
+            resp.close()
+            if self.metrics.enabled:
+                self.metrics.record(
+                    RequestSample(
+                        op="axon_get",
+                        method="GET",
+                        path=path,
+                        status=resp.status_code,
+                        ttfb=metrics_ttfb(resp, start),
+                        total=time.perf_counter() - start,
+                        bytes=chunks.bytes if isinstance(chunks, CountingChunks) else 0,
+                        error=error,
+                    )
+                )
+        return Path(dest) if isinstance(dest, (str, os.PathLike)) else dest
+
+    def axon_get_mmap(
+        self, sha256: str, path: Optional[Union[str, "os.PathLike[str]"]] = None, chunk_size: int = CHUNK_SIZE
+    ) -> mmap.mmap:
+        """Stream a blob to ``path`` (or an anonymous temporary file) and mmap it.
+
+        The returned read-only map pages the blob in from disk on demand;
+        close it when done. Empty blobs cannot be mapped and raise
+        ``ValueError``. With :attr:`axon_cache` set and no ``path`` the
+        cached file is mapped directly.
+        """
+        if path is None and self.axon_cache is not None:
+            mapped = self.axon_cache.open(sha256, lambda p: self._axon_download(sha256, p, chunk_size, True))
+            if not isinstance(mapped, mmap.mmap):
+                raise ValueError("cannot mmap an empty blob")
+            return mapped
+        if path is not None:
+            self.axon_get(sha256, path, chunk_size=chunk_size)
+            with open(path, "rb") as fileobj:
+                return mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        with tempfile.TemporaryFile() as fileobj:
+            self.axon_get(sha256, fileobj, chunk_size=chunk_size)
+            fileobj.flush()
+            return mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _ndef_valu(node: Node) -> Any:
+    ndef = node.ndef
+    return ndef[1] if ndef is not None else None
+
+
+def _seed_key(valu: Any) -> str:
+    if isinstance(valu, (list, tuple, dict)):
+        return json.dumps(valu, sort_keys=True, default=str)
+    return str(valu)
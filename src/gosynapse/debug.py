@@ -0,0 +1,79 @@
+"""On-demand capture of response bodies for debugging.
+
+Response bodies are never logged. To inspect what the Cortex sent, attach a
+:class:`BodyCapture` to the client; it appends a sample of responses, each
+cut to ``max_bytes``, to a separate jsonlines file::
+
+    client = SynapseClient(host, port, body_capture=BodyCapture("bodies.jsonl", sample_rate=0.1))
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import os
+import random
+import threading
+import time
+from typing import Iterable, Iterator, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+
+class BodyCapture:
+    """Append sampled, size-capped response bodies to a jsonlines file.
+
+    Each record holds the time, client operation, query, full body size,
+    whether the body was truncated and the first ``max_bytes`` of it. Only
+    a ``sample_rate`` fraction of responses is captured, and capturing stops
+    once the file reaches ``max_file_bytes``.
+    """
+
+    def __init__(
+        self,
+        path: Union[str, "os.PathLike[str]"],
+        max_bytes: int = 64 * 1024,
+        sample_rate: float = 1.0,
+        max_file_bytes: Optional[int] = 100 * 1024 * 1024,
+    ) -> None:
+        self.path = path
+        self.max_bytes = max_bytes
+        self.sample_rate = sample_rate
+        self.max_file_bytes = max_file_bytes
+        self._lock = threading.Lock()
+
+    def sampled(self) -> bool:
+        """Decide whether to capture the next response."""
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def write(self, op: str, query: Optional[str], head: bytes, size: int) -> None:
+        """Record the first bytes ``head`` of a ``size`` byte body."""
+        head = head[:self.max_bytes]
+        record = {
+            "time": time.time(),
+            "op": op,
+            "query": query,
+            "size": size,
+            "truncated": size > len(head),
+            "body": head.decode(errors="replace"),
+        }
+        line = json.dumps(record).encode() + b"\n"
+        with self._lock:
+            with open(self.path, "ab") as fileobj:
+                if self.max_file_bytes is not None and fileobj.tell() + len(line) > self.max_file_bytes:
+                    logger.debug("Body capture file %s is full", self.path)
+                    return
+                fileobj.write(line)
+
+    def tee(self, chunks: Iterable[bytes], op: str, query: Optional[str] = None) -> Iterator[bytes]:
+        """Pass ``chunks`` through, recording the body once it has been read."""
+        head = bytearray()
+        size = 0
+        try:
+            for chunk in chunks:
+                size += len(chunk)
+                if len(head) < self.max_bytes:
+                    head += chunk[:self.max_bytes - len(head)]
+                yield chunk
+        finally:
+            self.write(op, query, bytes(head), size)
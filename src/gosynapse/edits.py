@@ -0,0 +1,261 @@
+"""Follow the node edits of a Cortex layer.
+
+Instead of re-running a lift to find out what changed, an
+:class:`EditConsumer` runs one long-lived Storm query that walks the layer's
+edit log from an offset and waits for new edits::
+
+    for ($offs, $edits) in $lib.layer.get($layer).edits(offs=$offs, wait=$lib.true) {
+        $lib.fire(edits, offs=$offs, edits=$edits)
+    }
+
+Each edit arrives as a ``storm:fire`` message on the jsonlines stream and is
+handed to a callback in batches, so the client only ever processes what
+changed. The offset following the last delivered batch is saved to
+``offset_path``, and a restarted consumer resumes from it. Delivery is at
+least once: edits that were being delivered when the process stopped are
+delivered again.
+"""
+
+from __future__ import annotations
+
+import json
+import logging
+import queue
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, Union
+
+from .axon import write_chunks
+from .parse import FiniData, FireData, StreamTruncated, raise_errors
+from .retry import RetryPolicy
+
+if TYPE_CHECKING:  # pragma: no cover
+    import os
+
+    from .client import SynapseClient
+
+logger = logging.getLogger(__name__)
+
+EDITS_QUERY = """
+$layr = $lib.layer.get($layer)
+for ($offs, $edits) in $layr.edits(offs=$offs, wait=$lib.true) {
+    $lib.fire(edits, offs=$offs, edits=$edits)
+}
+"""
+
+
+@dataclass
+class EditEntry:
+    """The node edits stored at one offset of the layer's edit log.
+
+    ``edits`` holds ``[buid, form, [[edit_type, info, subedits], ...]]``
+    entries, as in :class:`~gosynapse.parse.NodeEditsData`.
+    """
+
+    offset: int
+    edits: List[Any]
+
+
+class EditConsumer:
+    """Deliver the node edits of a layer to ``callback`` in batches.
+
+    A background thread streams the edits and reconnects from the last
+    offset it received whenever the stream fails or ends. A stream cut off
+    before its ``fini`` counts as a failed connection; an ``err`` from the
+    Cortex, like any other non-transport error, makes :meth:`run` raise. :meth:`run` calls
+    ``callback`` with up to ``batch_size`` entries at a time, or with what has
+    arrived once ``batch_wait`` seconds have passed since the first entry of
+    the batch. The reader stays at most a few batches ahead of the callback,
+    so a slow callback throttles the stream rather than growing memory.
+
+    Args:
+        client: Client used to run the edits query.
+        callback: Called with a list of :class:`EditEntry`. If it raises,
+            :meth:`run` stops and the batch is delivered again next time.
+        layer: Layer iden; defaults to the top layer of ``view``.
+        view: View to run the query in.
+        offset: Offset to start from when ``offset_path`` holds none.
+        offset_path: File the next offset is saved to after every batch.
+        idle_timeout: Seconds without data after which the stream is
+            reopened, to detect connections that died silently.
+        retry: Backoff between reconnects.
+    """
+
+    def __init__(
+        self,
+        client: SynapseClient,
+        callback: Callable[[List[EditEntry]], Any],
+        layer: Optional[str] = None,
+        view: Optional[str] = None,
+        offset: int = 0,
+        offset_path: Optional[Union[str, "os.PathLike[str]"]] = None,
+        batch_size: int = 1000,
+        batch_wait: float = 1.0,
+        idle_timeout: float = 300.0,
+        retry: Optional[RetryPolicy] = None,
+    ) -> None:
+        self.client = client
+        self.callback = callback
+        self.layer = layer
+        self.view = view
+        self.offset_path = Path(offset_path) if offset_path is not None else None
+        self.offset = offset
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self.idle_timeout = idle_timeout
+        self.retry = retry or RetryPolicy(retries=0, backoff=1.0, max_backoff=60.0)
+        self.delivered = 0
+        self._stream: Any = None
+        self._stop = threading.Event()
+        self._stop.set()
+        if self.offset_path is not None:
+            self._load()
+
+    def stop(self) -> None:
+        """Make :meth:`run` return after delivering the batch in progress.
+
+        The open stream is aborted, so the long-polling query does not stay
+        on the Cortex until the next edit or the idle timeout.
+        """
+        self._stop.set()
+        _abort(self._stream)
+
+    def run(self, max_entries: Optional[int] = None) -> int:
+        """Deliver edits until :meth:`stop` is called.
+
+        With ``max_entries`` it returns once at least that many entries have
+        been delivered. Returns the number of entries delivered.
+        """
+        # Each run gets its own stop event, so a reader left over from an
+        # earlier run can never feed this one.
+        stop = self._stop = threading.Event()
+        pending: "queue.Queue[Any]" = queue.Queue(max(4 * self.batch_size, 1))
+        reader = threading.Thread(target=self._read, args=(pending, stop), name="gosynapse-edits", daemon=True)
+        reader.start()
+        delivered = 0
+        try:
+            while not stop.is_set():
+                batch = self._next_batch(pending)
+                if batch:
+                    self.callback(batch)
+                    self.offset = batch[-1].offset + 1
+                    self._save()
+                    delivered += len(batch)
+                    self.delivered += len(batch)
+                    if max_entries is not None and delivered >= max_entries:
+                        break
+        finally:
+            stop.set()
+            _abort(self._stream)
+        return delivered
+
+    def _next_batch(self, pending: "queue.Queue[Any]") -> List[EditEntry]:
+        batch: List[EditEntry] = []
+        expires: Optional[float] = None
+        while len(batch) < self.batch_size:
+            if expires is None:
+                timeout = self.batch_wait
+            else:
+                timeout = expires - time.monotonic()
+                if timeout <= 0:
+                    break
+            try:
+                item = pending.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            batch.append(item)
+            if expires is None:
+                expires = time.monotonic() + self.batch_wait
+        return batch
+
+    def _read(self, pending: "queue.Queue[Any]", stop: threading.Event) -> None:
+        """Stream edits into ``pending``, reconnecting until ``stop`` is set."""
+        offset = self.offset
+        failures = 0
+        while not stop.is_set():
+            opts: Dict[str, Any] = {"vars": {"layer": self.layer, "offs": offset}}
+            if self.view:
+                opts["view"] = self.view
+            try:
+                messages = self._stream = self.client.storm_iter(
+                    EDITS_QUERY, opts=opts, timeout=(10.0, self.idle_timeout)
+                )
+                if stop.is_set():
+                    # Stopped before the stream was stored; stop() missed it.
+                    _abort(messages)
+                finished = False
+                try:
+                    for message in raise_errors(messages):
+                        if isinstance(message, FiniData):
+                            finished = True
+                            continue
+                        entry = _entry(message)
+                        if entry is None:
+                            continue
+                        failures = 0
+                        if not _put(pending, entry, stop):
+                            return
+                        offset = entry.offset + 1
+                finally:
+                    messages.close()
+                if stop.is_set():
+                    return
+                if not finished:
+                    raise StreamTruncated(f"Edit stream ended at offset {offset} without a fini message")
+                logger.warning("Edit stream ended at offset %d; reconnecting", offset)
+            except Exception as exc:
+                if stop.is_set():
+                    return
+                if not isinstance(exc, StreamTruncated) and not self.retry.is_transient(exc):
+                    _put(pending, exc, stop)
+                    return
+                logger.warning("Edit stream failed at offset %d (%s); reconnecting", offset, exc)
+            failures += 1
+            stop.wait(self.retry.delay(failures))
+
+    def _save(self) -> None:
+        if self.offset_path is None:
+            return
+        state = {"offset": self.offset, "layer": self.layer, "view": self.view}
+        write_chunks([json.dumps(state).encode()], self.offset_path)
+
+    def _load(self) -> None:
+        assert self.offset_path is not None
+        try:
+            state = json.loads(self.offset_path.read_bytes())
+        except FileNotFoundError:
+            return
+        if state.get("layer") != self.layer or state.get("view") != self.view:
+            raise ValueError(f"Offset file {self.offset_path} belongs to another layer or view")
+        self.offset = int(state["offset"])
+
+
+def _put(pending: "queue.Queue[Any]", item: Any, stop: threading.Event) -> bool:
+    """Queue ``item``, giving up (and returning ``False``) once stopped."""
+    while not stop.is_set():
+        try:
+            pending.put(item, timeout=0.5)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _abort(stream: Any) -> None:
+    """Abort ``stream`` if it supports it, as :class:`~gosynapse.client.StormStream` does.
+
+    Streams from other clients are left to time out.
+    """
+    abort = getattr(stream, "abort", None)
+    if abort is not None:
+        abort()
+
+
+def _entry(message: Any) -> Optional[EditEntry]:
+    if isinstance(message, FireData) and message.type == "edits":
+        return EditEntry(offset=int(message.data["offs"]), edits=message.data.get("edits") or [])
+    return None
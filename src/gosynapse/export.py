@@ -0,0 +1,525 @@
+"""Columnar and resumable export of Storm results.
+
+Nodes are grouped by form and written as one table per form with the
+columns ``iden``, ``valu``, ``tags``, one typed column per property and an
+``_extra`` column holding, as JSON, any property that did not fit the table
+schema. Tables are written in batches as nodes stream in, so memory use is
+bounded by ``batch_size`` rather than by the size of the result set.
+
+Parquet and Arrow IPC output need ``pyarrow``; NumPy output needs ``numpy``
+(``pip install gosynapse[export]``).
+
+:class:`ResumableExport` instead streams nodes to a jsonlines file with
+checkpoints, so a long export can continue where it stopped.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import re
+import time
+from dataclasses import asdict, dataclass
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, Iterable, List, Optional, Tuple, Union
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - optional dependency
+    pa = None
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from .axon import CHUNK_SIZE, write_chunks
+from .parse import FiniData, Node, StreamTruncated
+from .types import CortexModel
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .client import SynapseClient
+
+logger = logging.getLogger(__name__)
+
+FORMATS = ("parquet", "arrow", "numpy")
+
+# NumPy has no null values; missing ints are stored as this sentinel, missing
+# bools as -1 (bools are stored as int8), floats as NaN and strings as "".
+INT_NULL = -(2 ** 63)
+
+_INT64_MAX = 2 ** 63 - 1
+_RESERVED = ("iden", "valu", "tags", "_extra")
+_KINDS = {bool: "bool", int: "int", float: "float", str: "str"}
+_MODEL_KINDS = {"int": "int", "time": "int", "float": "float", "bool": "bool", "str": "str"}
+
+Row = Tuple[str, Any, List[str], Dict[str, Any]]
+
+
+def _kind(value: Any) -> str:
+    kind = _KINDS.get(type(value), "json")
+    if kind == "int" and not INT_NULL < value <= _INT64_MAX:
+        return "json"
+    return kind
+
+
+def _fits(kind: str, value: Any) -> bool:
+    actual = _KINDS.get(type(value))
+    if actual == kind:
+        return kind != "int" or INT_NULL < value <= _INT64_MAX
+    return value is None or kind == "json" or (kind == "float" and actual == "int")
+
+
+def _table_name(form: str) -> str:
+    return re.sub(r"[^A-Za-z0-9_.-]", "_", form)
+
+
+class _Table:
+    """Buffered rows and output state for one form."""
+
+    def __init__(self, form: str, path: Path) -> None:
+        self.form = form
+        self.path = path
+        self.rows: List[Row] = []
+        self.kinds: Optional[Dict[str, str]] = None
+        self.writer: Any = None
+        self.count = 0
+        self.batches = 0
+
+
+class ColumnarExporter:
+    """Stream nodes into per-form columnar files under ``directory``.
+
+    ``format`` is ``"parquet"`` (``<form>.parquet``), ``"arrow"`` (Arrow IPC
+    file, ``<form>.arrow``) or ``"numpy"`` (structured arrays saved as
+    ``<form>/<batch>.npy``, see :func:`load_numpy`); ``:`` in form names is
+    replaced with ``_``. The schema of a table is fixed when its first batch
+    is written. Property types come from ``model`` when given and are
+    otherwise inferred from the values in that batch; values that do not fit
+    their column later on are kept in ``_extra``.
+
+    Use the exporter as a context manager, or call :meth:`close`, so that
+    the last batches are written and files are finalized.
+    """
+
+    def __init__(
+        self,
+        directory: Union[str, "os.PathLike[str]"],
+        format: str = "parquet",
+        batch_size: int = 65536,
+        model: Optional[CortexModel] = None,
+    ) -> None:
+        if format not in FORMATS:
+            raise ValueError(f"Unknown export format {format!r}, expected one of {', '.join(FORMATS)}")
+        if format == "numpy":
+            if np is None:
+                raise ImportError("NumPy export requires numpy")
+        elif pa is None:
+            raise ImportError(f"{format} export requires pyarrow")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.format = format
+        self.batch_size = batch_size
+        self.model = model
+        self._tables: Dict[str, _Table] = {}
+
+    def __enter__(self) -> "ColumnarExporter":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    @property
+    def counts(self) -> Dict[str, int]:
+        """Rows written or buffered so far, per form."""
+        return {form: table.count for form, table in self._tables.items()}
+
+    @property
+    def paths(self) -> Dict[str, Path]:
+        return {form: table.path for form, table in self._tables.items()}
+
+    def write(self, message: Any) -> bool:
+        """Add a message to its form's table; non-node messages are ignored."""
+        if not isinstance(message, Node):
+            return False
+        ndef = message.ndef
+        if ndef is None:
+            return False
+        form, valu = ndef
+        table = self._tables.get(form)
+        if table is None:
+            table = self._tables[form] = _Table(form, self._path(form))
+        info = message.info
+        table.rows.append((info.iden, valu, list(info.tags), info.props))
+        table.count += 1
+        if len(table.rows) >= self.batch_size:
+            self._flush(table)
+        return True
+
+    def write_many(self, messages: Iterable[Any]) -> int:
+        """Write every node in ``messages``, returning how many were written."""
+        return sum(self.write(message) for message in messages)
+
+    def flush(self) -> None:
+        for table in self._tables.values():
+            self._flush(table)
+
+    def close(self) -> None:
+        self.flush()
+        for table in self._tables.values():
+            if table.writer is not None:
+                table.writer.close()
+                table.writer = None
+
+    def _path(self, form: str) -> Path:
+        name = _table_name(form)
+        if self.format == "numpy":
+            path = self.directory / name
+            path.mkdir(exist_ok=True)
+            return path
+        return self.directory / f"{name}.{self.format}"
+
+    def _schema_kinds(self, form: str, rows: List[Row]) -> Dict[str, str]:
+        kinds: Dict[str, str] = {}
+        for _, valu, _, props in rows:
+            for name, value in (("valu", valu),) + tuple(props.items()):
+                if value is None or (name in _RESERVED and name != "valu"):
+                    continue
+                kind = kinds.get(name)
+                if kind is None:
+                    kinds[name] = self._model_kind(form, name) or _kind(value)
+                elif not _fits(kind, value):
+                    kinds[name] = "float" if {kind, _kind(value)} == {"int", "float"} else "json"
+        kinds.setdefault("valu", "json")
+        return kinds
+
+    def _model_kind(self, form: str, name: str) -> Optional[str]:
+        if self.model is None:
+            return None
+        if name == "valu":
+            return _MODEL_KINDS.get(self.model.base_type(form))
+        prop = self.model.prop(form, name)
+        if prop is None:
+            return None
+        return _MODEL_KINDS.get(self.model.base_type(prop.get("type", "")))
+
+    def _columns(self, table: _Table) -> Dict[str, List[Any]]:
+        assert table.kinds is not None
+        columns: Dict[str, List[Any]] = {"iden": [], "tags": [], "_extra": []}
+        columns.update((name, []) for name in table.kinds)
+        for iden, valu, tags, props in table.rows:
+            extra = {}
+            columns["iden"].append(iden)
+            columns["tags"].append(tags)
+            values = dict(props)
+            values["valu"] = valu
+            for name, value in values.items():
+                kind = table.kinds.get(name)
+                if kind is None or not _fits(kind, value):
+                    extra[name] = value
+                    value = None
+                elif kind == "json" and value is not None:
+                    value = json.dumps(value)
+                if kind is not None:
+                    columns[name].append(value)
+            for name in table.kinds:
+                if name not in values:
+                    columns[name].append(None)
+            columns["_extra"].append(json.dumps(extra) if extra else None)
+        return columns
+
+    def _flush(self, table: _Table) -> None:
+        if not table.rows:
+            return
+        if table.kinds is None:
+            table.kinds = self._schema_kinds(table.form, table.rows)
+        columns = self._columns(table)
+        if self.format == "numpy":
+            self._write_numpy(table, columns)
+        else:
+            self._write_arrow(table, columns)
+        logger.debug("Exported %d %s rows to %s", len(table.rows), table.form, table.path)
+        table.rows = []
+        table.batches += 1
+
+    def _write_arrow(self, table: _Table, columns: Dict[str, List[Any]]) -> None:
+        assert table.kinds is not None
+        types = {"int": pa.int64(), "float": pa.float64(), "bool": pa.bool_(), "str": pa.string(), "json": pa.string()}
+        fields = [pa.field("iden", pa.string()), pa.field("tags", pa.list_(pa.string()))]
+        fields += [pa.field(name, types[kind]) for name, kind in table.kinds.items()]
+        fields.append(pa.field("_extra", pa.string()))
+        schema = pa.schema(fields)
+        batch = pa.record_batch([columns[field.name] for field in fields], schema=schema)
+        if table.writer is None:
+            if self.format == "parquet":
+                table.writer = pq.ParquetWriter(table.path, schema)
+            else:
+                table.writer = pa.ipc.new_file(table.path, schema)
+        if self.format == "parquet":
+            table.writer.write_batch(batch)
+        else:
+            table.writer.write(batch)
+
+    def _write_numpy(self, table: _Table, columns: Dict[str, List[Any]]) -> None:
+        assert table.kinds is not None
+        columns["tags"] = [",".join(tags) for tags in columns["tags"]]
+        for name, kind in table.kinds.items():
+            column = columns[name]
+            if kind == "int":
+                columns[name] = [INT_NULL if value is None else value for value in column]
+            elif kind == "bool":
+                columns[name] = [-1 if value is None else int(value) for value in column]
+            elif kind == "float":
+                columns[name] = [float("nan") if value is None else value for value in column]
+        columns["_extra"] = [value or "" for value in columns["_extra"]]
+
+        def string(name: str) -> Tuple[str, str]:
+            width = max((len(value or "") for value in columns[name]), default=0)
+            columns[name] = [value or "" for value in columns[name]]
+            return name, f"U{max(width, 1)}"
+
+        numeric = {"int": "i8", "float": "f8", "bool": "i1"}
+        dtype = [string("iden"), string("tags")]
+        for name, kind in table.kinds.items():
+            dtype.append((name, numeric[kind]) if kind in numeric else string(name))
+        dtype.append(string("_extra"))
+        names = [name for name, _ in dtype]
+        array = np.array(list(zip(*(columns[name] for name in names))), dtype=dtype)
+        np.save(table.path / f"{table.batches:06d}.npy", array, allow_pickle=False)
+
+
+def load_numpy(path: Union[str, "os.PathLike[str]"]) -> Any:
+    """Concatenate the ``.npy`` batches of one exported form directory."""
+    if np is None:
+        raise ImportError("load_numpy requires numpy")
+    batches = [np.load(batch, allow_pickle=False) for batch in sorted(Path(path).glob("*.npy"))]
+    if not batches:
+        raise FileNotFoundError(f"No .npy batches in {path}")
+    # String columns are sized per batch; promote them to a common width.
+    dtype = np.result_type(*(batch.dtype for batch in batches))
+    return np.concatenate([batch.astype(dtype) for batch in batches])
+
+
+def export_nodes(
+    messages: Iterable[Any],
+    directory: Union[str, "os.PathLike[str]"],
+    format: str = "parquet",
+    batch_size: int = 65536,
+    model: Optional[CortexModel] = None,
+) -> Dict[str, int]:
+    """Write the nodes in ``messages`` to ``directory`` and return row counts per form.
+
+    ``messages`` is typically ``client.storm_iter(query)``; see
+    :class:`ColumnarExporter` for the output layout.
+    """
+    with ColumnarExporter(directory, format=format, batch_size=batch_size, model=model) as exporter:
+        exporter.write_many(messages)
+    return exporter.counts
+
+
+class ResumeError(RuntimeError):
+    """A resumable export cannot continue from its checkpoint."""
+
+
+@dataclass
+class ExportCheckpoint:
+    """Progress of a :class:`ResumableExport`, saved as JSON next to its output.
+
+    ``offset`` is the length of the output covered by the checkpoint and
+    ``sha256`` the digest of those bytes.
+    """
+
+    query: str
+    count: int = 0
+    last_iden: Optional[str] = None
+    offset: int = 0
+    sha256: str = hashlib.sha256().hexdigest()
+    done: bool = False
+
+    @classmethod
+    def load(cls, path: Union[str, "os.PathLike[str]"]) -> "ExportCheckpoint":
+        with open(path, "rb") as fileobj:
+            return cls(**json.load(fileobj))
+
+    def save(self, path: Union[str, "os.PathLike[str]"]) -> None:
+        write_chunks([json.dumps(asdict(self)).encode()], path)
+
+
+class ResumableExport:
+    """Stream the nodes of a Storm query to a file that survives restarts.
+
+    Nodes are appended to ``path`` as Storm ``node`` messages, one per line,
+    so the output can be read back with :mod:`gosynapse.replay`. Every
+    ``checkpoint_every`` nodes the file is flushed and a checkpoint with the
+    node count, the last iden and the byte offset is written to
+    ``checkpoint_path`` (default ``<path>.ckpt``).
+
+    :meth:`run` picks up from an existing checkpoint: anything after the
+    checkpointed offset is truncated and the query is rewritten to skip the
+    nodes already exported. This relies on the query yielding nodes in a
+    stable order; the first node of a resumed run must be the checkpointed
+    last iden, otherwise :class:`ResumeError` is raised rather than writing
+    a gap or duplicates. Transport errors the client's retry policy
+    considers transient and streams that end before their ``fini`` message
+    are retried ``retries`` times with exponential ``backoff``, resuming from
+    the last checkpoint each time. Anything else, such as a
+    :class:`~gosynapse.parse.StormError` or an HTTP error status, is raised
+    at once.
+    """
+
+    def __init__(
+        self,
+        client: SynapseClient,
+        query: str,
+        path: Union[str, "os.PathLike[str]"],
+        opts: Optional[Dict[str, Any]] = None,
+        checkpoint_path: Optional[Union[str, "os.PathLike[str]"]] = None,
+        checkpoint_every: int = 10000,
+        retries: int = 5,
+        backoff: float = 1.0,
+    ) -> None:
+        self.client = client
+        self.query = query
+        self.path = Path(path)
+        self.opts = opts or {}
+        self.checkpoint_path = Path(checkpoint_path) if checkpoint_path is not None else Path(f"{path}.ckpt")
+        self.checkpoint_every = checkpoint_every
+        self.retries = retries
+        self.backoff = backoff
+
+    def checkpoint(self) -> ExportCheckpoint:
+        """Return the saved checkpoint, or a fresh one if there is none."""
+        if not self.checkpoint_path.exists():
+            return ExportCheckpoint(query=self.query)
+        state = ExportCheckpoint.load(self.checkpoint_path)
+        if state.query != self.query:
+            raise ResumeError(f"Checkpoint {self.checkpoint_path} belongs to a different query")
+        return state
+
+    def run(self) -> ExportCheckpoint:
+        """Export until the query completes and return the final checkpoint."""
+        attempt = 0
+        while True:
+            state = self.checkpoint()
+            if state.done:
+                return state
+            try:
+                return self._resume(state)
+            except Exception as exc:
+                if not isinstance(exc, StreamTruncated) and not self.client.retry.is_transient(exc):
+                    raise
+                attempt += 1
+                if attempt > self.retries:
+                    raise
+                delay = self.backoff * 2 ** (attempt - 1)
+                logger.warning("Export interrupted after %d nodes (%s), resuming in %.1fs", state.count, exc, delay)
+                time.sleep(delay)
+
+    def verify(self) -> bool:
+        """Check the output against the checkpoint: size, digest, count and last iden."""
+        state = self.checkpoint()
+        try:
+            sha256, count, last_iden = _scan_output(self.path, state.offset)
+        except (OSError, ValueError):
+            return False
+        return (sha256, count, last_iden) == (state.sha256, state.count, state.last_iden)
+
+    def _resume(self, state: ExportCheckpoint) -> ExportCheckpoint:
+        with open(self.path, "r+b" if self.path.exists() else "w+b") as fileobj:
+            sha256 = _hash_prefix(fileobj, state.offset)
+            if sha256.hexdigest() != state.sha256:
+                raise ResumeError(f"{self.path} does not match its checkpoint")
+            # Drop whatever was written after the last checkpoint.
+            fileobj.truncate(state.offset)
+            query, opts = self._query(state)
+            expect = state.last_iden if state.count else None
+            written = 0
+            finished = False
+            for message in self.client.storm_iter(query, opts):
+                if isinstance(message, FiniData):
+                    finished = True
+                if not isinstance(message, Node):
+                    continue
+                iden = message.info.iden
+                if expect is not None:
+                    if iden != expect:
+                        raise ResumeError(f"Query results changed: expected node {state.count} to be {expect}, got {iden}")
+                    expect = None
+                    continue
+                ndef = message.ndef
+                line = json.dumps(["node", [list(ndef) if ndef else None, message.info.to_dict()]]).encode() + b"\n"
+                fileobj.write(line)
+                sha256.update(line)
+                state.count += 1
+                state.last_iden = iden
+                written += 1
+                if written % self.checkpoint_every == 0:
+                    self._save(fileobj, state, sha256)
+            if not finished:
+                # Without its fini the stream may have been cut off on a
+                # line boundary; resume rather than record a short export.
+                raise StreamTruncated(f"Export stream ended after {state.count} nodes without a fini message")
+            if expect is not None:
+                raise ResumeError(f"Query returned fewer than the {state.count} nodes already exported")
+            state.done = True
+            self._save(fileobj, state, sha256)
+        return state
+
+    def _query(self, state: ExportCheckpoint) -> Tuple[str, Dict[str, Any]]:
+        if not state.count:
+            return self.query, self.opts
+        # Count the nodes leaving the query and only pass on those after
+        # the last checkpointed one; that node itself is re-sent so its iden
+        # can be checked. A dict is used as the counter so that the update
+        # is visible across node paths.
+        query = (
+            '$__gs_state = ({"n": (0)})\n'
+            f"{self.query}\n"
+            "| $__gs_state.n = ($__gs_state.n + 1) +$($__gs_state.n >= $__gs_skip)"
+        )
+        opts = dict(self.opts)
+        opts["vars"] = {**opts.get("vars", {}), "__gs_skip": state.count}
+        return query, opts
+
+    def _save(self, fileobj: Any, state: ExportCheckpoint, sha256: Any) -> None:
+        fileobj.flush()
+        os.fsync(fileobj.fileno())
+        state.offset = fileobj.tell()
+        state.sha256 = sha256.hexdigest()
+        state.save(self.checkpoint_path)
+        logger.debug("Export checkpoint: %d nodes, %d bytes", state.count, state.offset)
+
+
+def _hash_prefix(fileobj: Any, size: int) -> Any:
+    sha256 = hashlib.sha256()
+    fileobj.seek(0)
+    remaining = size
+    while remaining:
+        chunk = fileobj.read(min(CHUNK_SIZE, remaining))
+        if not chunk:
+            raise ResumeError(f"{fileobj.name} is shorter than its checkpoint")
+        sha256.update(chunk)
+        remaining -= len(chunk)
+    return sha256
+
+
+def _scan_output(path: Path, offset: int) -> Tuple[str, int, Optional[str]]:
+    sha256 = hashlib.sha256()
+    count = 0
+    last_iden = None
+    with open(path, "rb") as fileobj:
+        if os.fstat(fileobj.fileno()).st_size < offset:
+            raise ValueError(f"{path} is shorter than its checkpoint")
+        remaining = offset
+        for line in fileobj:
+            if remaining <= 0:
+                break
+            line = line[:remaining]
+            remaining -= len(line)
+            sha256.update(line)
+            count += 1
+            last_iden = json.loads(line)[1][1]["iden"]
+    return sha256.hexdigest(), count, last_iden
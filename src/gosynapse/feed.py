@@ -0,0 +1,165 @@
+"""Bulk ingestion through the Cortex ``/api/v1/feed`` endpoint."""
+
+from __future__ import annotations
+
+import json
+import logging
+import time
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional
+
+from .batch import imap_bounded, iter_batches
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .client import SynapseClient
+
+logger = logging.getLogger(__name__)
+
+
+class FeedError(RuntimeError):
+    """The Cortex rejected a feed batch."""
+
+
+@dataclass
+class BatchError:
+    """A batch that could not be ingested after all retries."""
+
+    batch: int
+    records: int
+    attempts: int
+    error: BaseException
+
+
+@dataclass
+class FeedReport:
+    """Progress and outcome of :func:`feed_bulk`."""
+
+    records: int = 0
+    batches: int = 0
+    bytes: int = 0
+    failed_records: int = 0
+    errors: List[BatchError] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def records_per_sec(self) -> float:
+        return self.records / self.elapsed if self.elapsed else 0.0
+
+    @property
+    def bytes_per_sec(self) -> float:
+        return self.bytes / self.elapsed if self.elapsed else 0.0
+
+
+@dataclass
+class _Batch:
+    index: int
+    records: int
+    body: bytes
+
+
+def _encode(records: Iterable[Any]) -> Iterator[bytes]:
+    for record in records:
+        yield json.dumps(record).encode()
+
+
+def _batches(
+    records: Iterable[Any], name: str, view: Optional[str], batch_size: int, batch_bytes: int
+) -> Iterator[_Batch]:
+    head = {"name": name}
+    if view:
+        head["view"] = view
+    prefix = json.dumps(head)[:-1].encode() + b', "items": ['
+    for index, items in enumerate(iter_batches(_encode(records), batch_size, batch_bytes)):
+        body = prefix + b",".join(items) + b"]}"
+        yield _Batch(index=index, records=len(items), body=body)
+
+
+def feed_bulk(
+    client: SynapseClient,
+    records: Iterable[Any],
+    name: str = "syn.nodes",
+    view: Optional[str] = None,
+    batch_size: int = 1000,
+    batch_bytes: int = 4 * 1024 * 1024,
+    workers: int = 4,
+    max_in_flight: Optional[int] = None,
+    retries: int = 3,
+    backoff: float = 0.5,
+    progress: Optional[Callable[[FeedReport], None]] = None,
+) -> FeedReport:
+    """Ingest ``records`` through ``/api/v1/feed`` in parallel batches.
+
+    Records are serialized one at a time and grouped into batches of at most
+    ``batch_size`` records and roughly ``batch_bytes`` bytes. ``workers``
+    batches are sent concurrently and no more than ``max_in_flight`` batches
+    (default ``2 * workers``) are built ahead of the network, so ``records``
+    may be a generator far larger than memory. Batches that fail with a
+    connection error, a timeout or one of the client retry policy's transient
+    statuses (429, 502, 503, 504) are retried ``retries`` times with
+    exponential ``backoff``. Other errors, such as a malformed or
+    unauthorized batch, a batch the Cortex rejects, or one refused by the
+    client's circuit breaker or deadline, are not retried. Failures are
+    collected in the returned report rather than raised.
+
+    Args:
+        client: Client used to send the batches. Its ``pool_maxsize`` should
+            be at least ``workers``.
+        records: Feed records, for example ``syn.nodes`` node tuples.
+        name: Feed function name.
+        view: Optional view iden to ingest into.
+        progress: Called with the running report after every batch.
+    """
+    report = FeedReport()
+    start = time.monotonic()
+    policy = client.retry
+    attempts: Dict[int, int] = {}
+
+    def send(batch: _Batch) -> None:
+        attempt = 0
+        while True:
+            attempt += 1
+            attempts[batch.index] = attempt
+            try:
+                resp = client._request(
+                    "POST",
+                    "/api/v1/feed",
+                    op="feed_bulk",
+                    data=batch.body,
+                    headers={"Content-Type": "application/json"},
+                )
+                if resp.status_code in policy.statuses and attempt <= retries:
+                    delay = backoff * 2 ** (attempt - 1)
+                    logger.debug("Feed batch %d returned %s, retrying in %.2fs", batch.index, resp.status_code, delay)
+                    time.sleep(delay)
+                    continue
+                resp.raise_for_status()
+                result = resp.json()
+                if isinstance(result, dict) and result.get("status", "ok") != "ok":
+                    raise FeedError(result.get("mesg") or result.get("code") or str(result))
+                return
+            except Exception as exc:
+                if not policy.is_transient(exc) or attempt > retries:
+                    raise
+                delay = backoff * 2 ** (attempt - 1)
+                logger.debug("Feed batch %d failed (%s), retrying in %.2fs", batch.index, exc, delay)
+                time.sleep(delay)
+
+    batches = _batches(records, name, view, batch_size, batch_bytes)
+    for _, batch, future in imap_bounded(send, batches, workers, max_in_flight=max_in_flight):
+        report.batches += 1
+        exc = future.exception()
+        tries = attempts.pop(batch.index, 1)
+        if exc is None:
+            report.records += batch.records
+            report.bytes += len(batch.body)
+        else:
+            report.failed_records += batch.records
+            report.errors.append(
+                BatchError(batch=batch.index, records=batch.records, attempts=tries, error=exc)
+            )
+            logger.warning("Feed batch %d failed: %s", batch.index, exc)
+        report.elapsed = time.monotonic() - start
+        if progress is not None:
+            progress(report)
+    report.elapsed = time.monotonic() - start
+    return report
@@ -5,17 +5,28 @@ querying the ``/active`` endpoint and executing trivial Storm
 queries. Environment variables are loaded from a ``.env`` file using
 ``python-dotenv`` and must define ``SYNAPSE_HOST``, ``SYNAPSE_PORT``,
 ``SYNAPSE_API_KEY`` and ``SYNAPSE_VIEW_ID``.
+
+The probes run concurrently over one pooled session and each is timed,
+including the time to the first byte of the streaming Storm response.
+Results are printed as text, JSON or Prometheus exposition text, probes
+slower than their ``--threshold`` fail, and ``--watch`` repeats the checks
+and reports percentiles over a rolling window of rounds.
 """
 
 from __future__ import annotations
 
+import argparse
+import json
 import logging
 import os
 import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, dataclass
 from pathlib import Path
-from typing import Any
+from typing import Any, Callable, Deque, Dict, List, Optional, Sequence, Tuple
 
-import requests
 try:
     from dotenv import load_dotenv, find_dotenv
 except Exception:  # pragma: no cover - optional dependency
@@ -39,8 +50,14 @@ except Exception:  # pragma: no cover - optional dependency
 
     urllib3 = Dummy()
 
+from .axon import write_chunks
+from .client import SynapseClient
+from .metrics import ttfb
+
 logger = logging.getLogger(__name__)
 
+TIMEOUT = 5
+
 urllib3.disable_warnings(category=InsecureRequestWarning)
 
 
@@ -67,92 +84,348 @@ def _required_env() -> tuple[str, str, str, str] | None:
     return host, port, api_key, view_id
 
 
-def _check_active(base_url: str, headers: dict[str, str]) -> bool:
+@dataclass
+class ProbeResult:
+    """Outcome of one probe. Times are in seconds."""
+
+    name: str
+    ok: bool
+    latency: float
+    ttfb: Optional[float] = None
+    threshold: Optional[float] = None
+    error: Optional[str] = None
+
+    @property
+    def slow(self) -> bool:
+        return self.threshold is not None and self.latency > self.threshold
+
+    @property
+    def passed(self) -> bool:
+        return self.ok and not self.slow
+
+
+def _check_active(client: SynapseClient, view_id: str, timeout: float = TIMEOUT) -> Tuple[bool, float]:
     """Verify that ``/active`` returns ``active: true``."""
-    url = f"{base_url}/active"
-    resp = requests.get(url, headers=headers, verify=False, timeout=5)
+    start = time.perf_counter()
+    resp = client._request("GET", "/api/v1/active", op="healthcheck_active", verify=False, timeout=timeout)
+    first = ttfb(resp, start)
     resp.raise_for_status()
     data: Any = resp.json()
     if isinstance(data, dict):
         if "active" in data:
-            return bool(data["active"])
+            return bool(data["active"]), first
         if data.get("status") == "ok" and isinstance(data.get("result"), dict):
             if "active" in data["result"]:
-                return bool(data["result"]["active"])
+                return bool(data["result"]["active"]), first
     raise ValueError(f"Unexpected JSON from /active: {data}")
 
 
-def _check_storm_call(base_url: str, headers: dict[str, str], view_id: str) -> bool:
+def _check_storm_call(client: SynapseClient, view_id: str, timeout: float = TIMEOUT) -> Tuple[bool, float]:
     """Verify that a trivial Storm query can be executed."""
-    url = f"{base_url}/storm/call"
-    resp = requests.post(
-        url,
-        headers=headers,
+    start = time.perf_counter()
+    resp = client._request(
+        "POST",
+        "/api/v1/storm/call",
+        op="healthcheck_storm_call",
+        # return(1) has no side effects, so it may be retried.
+        idempotent=True,
         json={"view": view_id, "query": "return(1)"},
         verify=False,
-        timeout=5,
+        timeout=timeout,
     )
+    first = ttfb(resp, start)
     resp.raise_for_status()
     data: Any = resp.json()
     if isinstance(data, dict) and data.get("status") == "ok":
         try:
-            return int(data.get("result")) == 1
+            return int(data.get("result")) == 1, first
         except Exception as exc:  # pragma: no cover - defensive
             raise ValueError(f"Bad result from /storm/call: {data}") from exc
     raise ValueError(f"Unexpected JSON from /storm/call: {data}")
 
 
-def _check_hash_md5(base_url: str, headers: dict[str, str], view_id: str) -> bool:
-    """Lookup a known MD5 via the streaming ``/storm`` endpoint."""
-    url = f"{base_url}/storm"
+def _check_hash_md5(client: SynapseClient, view_id: str, timeout: float = TIMEOUT) -> Tuple[bool, float]:
+    """Lookup a known MD5 via the streaming ``/storm`` endpoint.
+
+    The reported time to first byte is the time until the first chunk of
+    the response body arrived, not just its headers.
+    """
     payload = {
         "query": '[ hash:md5="ac46297df513b5afaceb9109fa986abe" ]',
         "opts": {"view": view_id},
         "stream": "jsonlines",
     }
-    resp = requests.post(
-        url,
-        headers=headers,
+    start = time.perf_counter()
+    resp = client._request(
+        "POST",
+        "/api/v1/storm",
+        op="healthcheck_storm",
         json=payload,
         verify=False,
-        timeout=5,
+        timeout=timeout,
         stream=True,
     )
     resp.raise_for_status()
-    for chunk in resp.iter_content(chunk_size=None, decode_unicode=True):
-        if chunk and chunk.strip():
-            return True
-    return False
+    try:
+        for chunk in resp.iter_content(chunk_size=None, decode_unicode=True):
+            if chunk and chunk.strip():
+                return True, time.perf_counter() - start
+        return False, time.perf_counter() - start
+    finally:
+        resp.close()
+
+
+Check = Callable[[SynapseClient, str, float], Tuple[bool, float]]
+
+PROBES: Dict[str, Check] = {
+    "active": _check_active,
+    "storm_call": _check_storm_call,
+    "storm": _check_hash_md5,
+}
+
+
+def _run_probe(name: str, check: Check, client: SynapseClient, view_id: str, timeout: float) -> ProbeResult:
+    start = time.perf_counter()
+    try:
+        ok, first = check(client, view_id, timeout)
+        error = None if ok else "check returned a negative result"
+    except Exception as exc:
+        ok, first, error = False, None, f"{type(exc).__name__}: {exc}"
+    return ProbeResult(name=name, ok=ok, latency=time.perf_counter() - start, ttfb=first, error=error)
+
+
+def run_probes(
+    client: SynapseClient,
+    view_id: str,
+    thresholds: Optional[Dict[str, float]] = None,
+    timeout: float = TIMEOUT,
+    pool: Optional[ThreadPoolExecutor] = None,
+) -> List[ProbeResult]:
+    """Run all :data:`PROBES` concurrently and return their results in order.
+
+    The probes go through ``client``'s request path, so its retry policy,
+    circuit breaker and deadline apply to them. ``thresholds`` maps probe
+    names (or ``"*"`` for all probes) to the highest acceptable latency in
+    seconds.
+    """
+    thresholds = thresholds or {}
+    own = pool is None
+    pool = pool or ThreadPoolExecutor(len(PROBES), thread_name_prefix="healthcheck")
+    try:
+        futures = [pool.submit(_run_probe, name, check, client, view_id, timeout) for name, check in PROBES.items()]
+        results = [future.result() for future in futures]
+    finally:
+        if own:
+            pool.shutdown()
+    for result in results:
+        result.threshold = thresholds.get(result.name, thresholds.get("*"))
+    return results
+
+
+def _percentile(values: Sequence[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(q * len(ordered) + 0.5) - 1))]
+
+
+class LatencyWindow:
+    """Probe results of the last ``size`` rounds, for ``--watch``."""
+
+    def __init__(self, size: int = 60) -> None:
+        self.size = size
+        self.results: Dict[str, Deque[ProbeResult]] = {}
 
+    def add(self, results: Sequence[ProbeResult]) -> None:
+        for result in results:
+            self.results.setdefault(result.name, deque(maxlen=self.size)).append(result)
 
-def main() -> int:
-    """Run the health check returning ``0`` on success."""
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Return count, failures and p50/p99/max latency per probe.
+
+        The latency figures, including their ``samples`` and ``sum``, cover
+        the probes that succeeded.
+        """
+        summary = {}
+        for name, results in self.results.items():
+            latencies = [r.latency for r in results if r.ok]
+            row: Dict[str, float] = {
+                "count": len(results),
+                "failures": sum(not r.passed for r in results),
+                "samples": len(latencies),
+                "sum": sum(latencies),
+            }
+            if latencies:
+                row.update(p50=_percentile(latencies, 0.5), p99=_percentile(latencies, 0.99), max=max(latencies))
+            summary[name] = row
+        return summary
+
+
+def format_text(results: Sequence[ProbeResult], window: Optional[LatencyWindow] = None) -> str:
+    lines = []
+    for r in results:
+        mark = "✅" if r.passed else "❌"
+        line = f"{mark} {r.name:<10} {r.latency * 1000:8.1f} ms"
+        if r.ttfb is not None:
+            line += f"  ttfb {r.ttfb * 1000:.1f} ms"
+        if r.slow:
+            line += f"  slower than {r.threshold * 1000:.0f} ms"  # type: ignore[operator]
+        if r.error:
+            line += f"  {r.error}"
+        lines.append(line)
+    if window is not None:
+        for name, row in window.summary().items():
+            if "p50" in row:
+                lines.append(
+                    f"   {name:<10} p50 {row['p50'] * 1000:.1f} ms  p99 {row['p99'] * 1000:.1f} ms"
+                    f"  failures {row['failures']:.0f}/{row['count']:.0f}"
+                )
+    ok = all(r.passed for r in results)
+    lines.append("✅ All health checks passed." if ok else "❌ Health check failed.")
+    return "\n".join(lines)
+
+
+def format_json(results: Sequence[ProbeResult], window: Optional[LatencyWindow] = None) -> str:
+    report: Dict[str, Any] = {
+        "ok": all(r.passed for r in results),
+        "time": time.time(),
+        "probes": [dict(asdict(r), slow=r.slow) for r in results],
+    }
+    if window is not None:
+        report["window"] = window.summary()
+    return json.dumps(report)
+
+
+def format_prometheus(results: Sequence[ProbeResult], window: Optional[LatencyWindow] = None) -> str:
+    # (name, help, type, [(suffix, labels, value), ...])
+    metrics = [
+        ("synapse_probe_up", "Whether the probe succeeded within its threshold.", "gauge", [
+            ("", {"probe": r.name}, int(r.passed)) for r in results
+        ]),
+        ("synapse_probe_latency_seconds", "Duration of the probe.", "gauge", [
+            ("", {"probe": r.name}, r.latency) for r in results
+        ]),
+        ("synapse_probe_ttfb_seconds", "Time to the first byte of the probe response.", "gauge", [
+            ("", {"probe": r.name}, r.ttfb) for r in results if r.ttfb is not None
+        ]),
+    ]
+    if window is not None:
+        summary = window.summary()
+        quantiles: List[Tuple[str, Dict[str, str], float]] = []
+        for name, row in summary.items():
+            for q, key in (("0.5", "p50"), ("0.99", "p99")):
+                if key in row:
+                    quantiles.append(("", {"probe": name, "quantile": q}, row[key]))
+            quantiles.append(("_sum", {"probe": name}, row["sum"]))
+            quantiles.append(("_count", {"probe": name}, row["samples"]))
+        metrics.append((
+            "synapse_probe_window_latency_seconds",
+            "Latency of successful probes over the watch window.",
+            "summary",
+            quantiles,
+        ))
+        metrics.append(("synapse_probe_window_failures", "Failed probes in the watch window.", "gauge", [
+            ("", {"probe": name}, row["failures"]) for name, row in summary.items()
+        ]))
+    lines = []
+    for name, help_text, kind, samples in metrics:
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        for suffix, labels, value in samples:
+            label_text = ",".join(f'{key}="{val}"' for key, val in labels.items())
+            lines.append(f"{name}{suffix}{{{label_text}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+FORMATS = {"text": format_text, "json": format_json, "prometheus": format_prometheus}
+
+
+def _parse_threshold(text: str) -> Tuple[str, float]:
+    name, sep, ms = text.rpartition("=")
+    if name and name not in PROBES:
+        raise argparse.ArgumentTypeError(f"unknown probe {name!r}; choose from {', '.join(PROBES)}")
+    try:
+        return name or "*", float(ms) / 1000
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"bad threshold {text!r}, expected [PROBE=]MILLISECONDS") from None
+
+
+def parse_args(argv: Optional[Sequence[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Check the health of a Synapse Cortex")
+    parser.add_argument("--format", choices=sorted(FORMATS), default="text", help="output format")
+    parser.add_argument(
+        "--threshold",
+        metavar="[PROBE=]MS",
+        type=_parse_threshold,
+        action="append",
+        default=[],
+        help="fail probes slower than MS milliseconds; without PROBE= applies to all probes",
+    )
+    parser.add_argument("--timeout", type=float, default=TIMEOUT, help="request timeout in seconds")
+    parser.add_argument("--watch", metavar="SECONDS", type=float, help="repeat the checks every SECONDS")
+    parser.add_argument("--window", type=int, default=60, help="rounds kept for --watch percentiles")
+    parser.add_argument("--rounds", type=int, help="stop --watch after this many rounds")
+    parser.add_argument("--output", metavar="PATH", help="write each report to PATH (atomically) instead of stdout")
+    return parser.parse_args(argv)
+
+
+def _emit(report: str, output: Optional[str]) -> None:
+    if output is None:
+        print(report, flush=True)
+    else:
+        write_chunks([report.encode() + (b"" if report.endswith("\n") else b"\n")], output)
+
+
+def main(argv: Optional[Sequence[str]] = None) -> int:
+    """Run the health check returning ``0`` on success.
+
+    ``argv`` defaults to no arguments; pass ``sys.argv[1:]`` to honour the
+    command line.
+    """
+    args = parse_args([] if argv is None else argv)
     logging.basicConfig(level=logging.INFO)
     _load_env()
     params = _required_env()
     if not params:
         return 1
     host, port, api_key, view_id = params
-    base_url = f"https://{host}:{port}/api/v1"
-    headers = {"X-API-KEY": api_key, "Content-Type": "application/json"}
+    thresholds = dict(args.threshold)
+    render = FORMATS[args.format]
+    window = LatencyWindow(args.window) if args.watch is not None else None
 
+    # All probes share one pooled session, so connections (and TLS
+    # handshakes) are reused across probes and --watch rounds. The deadline
+    # bounds each probe, retries included, by --timeout.
+    client = SynapseClient(
+        host=host, port=port, api_key=api_key, pool_maxsize=len(PROBES), timeout=args.timeout, deadline=args.timeout
+    )
+    pool = ThreadPoolExecutor(len(PROBES), thread_name_prefix="healthcheck")
+    # Exit code for Ctrl-C before the first round completes.
+    status = 130
     try:
-        if not _check_active(base_url, headers):
-            logger.error("/active reported inactive")
-            return 1
-        if not _check_storm_call(base_url, headers, view_id):
-            logger.error("/storm/call failed")
-            return 1
-        if not _check_hash_md5(base_url, headers, view_id):
-            logger.error("/storm MD5 lookup failed")
-            return 1
-    except Exception as exc:  # pragma: no cover - network errors
-        logger.error("Health check failed: %s", exc)
-        return 1
-
-    print("✅ All health checks passed.")
-    return 0
+        rounds = 0
+        while True:
+            started = time.monotonic()
+            results = run_probes(client, view_id, thresholds, args.timeout, pool)
+            for result in results:
+                if result.error:
+                    logger.error("Probe %s failed: %s", result.name, result.error)
+            if window is not None:
+                window.add(results)
+            _emit(render(results, window), args.output)
+            status = 0 if all(r.passed for r in results) else 1
+            rounds += 1
+            if args.watch is None or (args.rounds is not None and rounds >= args.rounds):
+                return status
+            time.sleep(max(args.watch - (time.monotonic() - started), 0.0))
+    except KeyboardInterrupt:
+        # Ctrl-C, while probing or between rounds, ends the run with the
+        # status of the last complete round; probes still in flight are
+        # abandoned rather than waited for.
+        logger.info("Interrupted")
+        return status
+    finally:
+        pool.shutdown(wait=False)
+        client.close()
 
 
 if __name__ == "__main__":
-    raise SystemExit(main())
+    raise SystemExit(main(sys.argv[1:]))
@@ -0,0 +1,236 @@
+"""Pluggable JSON backends for decoding Storm messages.
+
+Decoding Storm jsonlines dominates the CPU cost of large exports. This module
+picks the fastest available decoder: ``msgspec`` (which decodes straight into
+typed structs), then ``orjson``, falling back to the standard library ``json``
+module. Every backend produces identical ``InitData``/``Node``/``PrintData``/
+``FiniData``/``NodeEditsData``/``FireData`` messages.
+
+The default can be forced with the ``GOSYNAPSE_JSON_BACKEND`` environment
+variable or :func:`set_backend`.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional dependency
+    orjson = None
+try:
+    import msgspec
+except ImportError:  # pragma: no cover - optional dependency
+    msgspec = None
+
+from .parse import (
+    _RAW_DECODERS,
+    FireData,
+    FiniData,
+    InitData,
+    Message,
+    Node,
+    NodeData,
+    NodeEditsData,
+    PrintData,
+    _to_message,
+)
+
+ENV_VAR = "GOSYNAPSE_JSON_BACKEND"
+
+
+class JsonBackend:
+    """Decode storm messages with the standard library ``json`` module."""
+
+    name = "json"
+
+    def loads(self, data: bytes) -> Any:
+        return json.loads(data)
+
+    def decode_message(self, line: bytes) -> Optional[Message]:
+        """Decode one jsonlines record into a typed message.
+
+        Raises:
+            ValueError: If ``line`` is not a single complete JSON value.
+        """
+        return _to_message(self.loads(line))
+
+
+class OrjsonBackend(JsonBackend):
+    """Decode storm messages with ``orjson``.
+
+    ``orjson`` decodes integers wider than 64 bits as floats. Synapse ``int``
+    properties are at most 64 bits wide, so this does not affect node data.
+    """
+
+    name = "orjson"
+
+    def __init__(self) -> None:
+        if orjson is None:
+            raise ImportError("orjson is not installed")
+
+    def loads(self, data: bytes) -> Any:
+        return orjson.loads(data)
+
+
+if msgspec is not None:
+
+    class _InitStruct(msgspec.Struct, forbid_unknown_fields=True):
+        tick: int
+        text: str
+        abstick: int
+        hash: str
+        task: str
+
+    class _PrintStruct(msgspec.Struct, forbid_unknown_fields=True):
+        mesg: str
+
+    class _FiniStruct(msgspec.Struct, forbid_unknown_fields=True):
+        tock: int
+        abstock: int
+        took: int
+        count: int
+
+    class _InitMesg(msgspec.Struct, tag="init", array_like=True):
+        payload: _InitStruct
+
+    # Node definitions and info are kept as raw JSON and only decoded when
+    # the Node is first inspected.
+    class _NodeMesg(msgspec.Struct, tag="node", array_like=True):
+        payload: Tuple[msgspec.Raw, msgspec.Raw]
+
+    class _PrintMesg(msgspec.Struct, tag="print", array_like=True):
+        payload: _PrintStruct
+
+    class _FiniMesg(msgspec.Struct, tag="fini", array_like=True):
+        payload: _FiniStruct
+
+    class _NodeEditsStruct(msgspec.Struct):
+        edits: List[Any] = []
+
+    class _FireStruct(msgspec.Struct):
+        type: str = ""
+        data: Dict[str, Any] = {}
+
+    class _NodeEditsMesg(msgspec.Struct, tag="node:edits", array_like=True):
+        payload: _NodeEditsStruct
+
+    class _FireMesg(msgspec.Struct, tag="storm:fire", array_like=True):
+        payload: _FireStruct
+
+    _RAW_DECODERS[msgspec.Raw] = msgspec.json.decode
+
+
+def _from_init(p: Any) -> InitData:
+    return InitData(tick=p.tick, text=p.text, abstick=p.abstick, hash=p.hash, task=p.task)
+
+
+def _from_node(p: Any) -> Node:
+    return Node._from_ndef(p[0], NodeData._from_raw(p[1]))
+
+
+def _from_print(p: Any) -> PrintData:
+    return PrintData(mesg=p.mesg)
+
+
+def _from_fini(p: Any) -> FiniData:
+    return FiniData(tock=p.tock, abstock=p.abstock, took=p.took, count=p.count)
+
+
+def _from_node_edits(p: Any) -> NodeEditsData:
+    return NodeEditsData(edits=p.edits)
+
+
+def _from_fire(p: Any) -> FireData:
+    return FireData(type=p.type, data=p.data)
+
+
+class MsgspecBackend(JsonBackend):
+    """Decode storm messages into typed ``msgspec`` structs.
+
+    Storm messages are ``[kind, payload]`` arrays, which map directly onto
+    array-like structs tagged by their first element. Records that do not
+    match one of the known message shapes raise ``ValueError`` and are
+    handled by the generic fallback path in the decoder.
+    """
+
+    name = "msgspec"
+
+    def __init__(self) -> None:
+        if msgspec is None:
+            raise ImportError("msgspec is not installed")
+        self._builders: Dict[type, Callable[[Any], Message]] = {
+            _InitMesg: _from_init,
+            _NodeMesg: _from_node,
+            _PrintMesg: _from_print,
+            _FiniMesg: _from_fini,
+            _NodeEditsMesg: _from_node_edits,
+            _FireMesg: _from_fire,
+        }
+        self._decoder = msgspec.json.Decoder(
+            Union[_InitMesg, _NodeMesg, _PrintMesg, _FiniMesg, _NodeEditsMesg, _FireMesg]
+        )
+
+    def loads(self, data: bytes) -> Any:
+        return msgspec.json.decode(data)
+
+    def decode_message(self, line: bytes) -> Optional[Message]:
+        mesg = self._decoder.decode(line)
+        return self._builders[type(mesg)](mesg.payload)
+
+
+_BACKENDS: Dict[str, Callable[[], JsonBackend]] = {
+    "msgspec": MsgspecBackend,
+    "orjson": OrjsonBackend,
+    "json": JsonBackend,
+}
+
+_current: Optional[JsonBackend] = None
+
+
+def available_backends() -> List[str]:
+    """Return the names of the backends importable in this environment."""
+    names = ["json"]
+    if orjson is not None:
+        names.insert(0, "orjson")
+    if msgspec is not None:
+        names.insert(0, "msgspec")
+    return names
+
+
+def load_backend(name: str) -> JsonBackend:
+    """Instantiate the backend called ``name``.
+
+    Raises:
+        ValueError: If ``name`` is not a known backend.
+        ImportError: If the backend's library is not installed.
+    """
+    try:
+        factory = _BACKENDS[name]
+    except KeyError:
+        raise ValueError(f"Unknown JSON backend: {name}") from None
+    return factory()
+
+
+def set_backend(name: Optional[str]) -> JsonBackend:
+    """Select the default backend, or restore automatic selection with ``None``."""
+    global _current
+    _current = load_backend(name) if name else _autodetect()
+    return _current
+
+
+def get_backend() -> JsonBackend:
+    """Return the default backend, choosing one on first use."""
+    global _current
+    if _current is None:
+        _current = _autodetect()
+    return _current
+
+
+def _autodetect() -> JsonBackend:
+    name = os.environ.get(ENV_VAR, "").strip()
+    if name:
+        return load_backend(name)
+    return load_backend(available_backends()[0])
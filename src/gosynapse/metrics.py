@@ -0,0 +1,190 @@
+"""Latency and throughput instrumentation for :class:`SynapseClient`.
+
+The client reports a :class:`RequestSample` for every API call to its
+``metrics`` sink. The default :data:`NULL_METRICS` sink is disabled, and the
+client skips all timing when a sink is disabled, so instrumentation costs
+nothing unless it is switched on::
+
+    metrics = HistogramMetrics()
+    client = SynapseClient(host, port, metrics=metrics)
+    ...
+    print(metrics.summary()["storm"]["ttfb_p99"])
+"""
+
+from __future__ import annotations
+
+import bisect
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, Iterator, Optional, Tuple
+
+# Upper bounds, in seconds, of the latency histogram buckets: 50us to ~7 min.
+BUCKETS: Tuple[float, ...] = tuple(0.00005 * 2 ** i for i in range(24))
+
+
+@dataclass
+class RequestSample:
+    """Timings and sizes of one client call.
+
+    ``ttfb`` is the time until the response headers arrived and ``total``
+    the time until the body was consumed, both in seconds. ``parse`` is the
+    part of ``total`` spent decoding Storm messages and ``took`` the
+    server-reported query time from ``FiniData.took``, converted to
+    seconds.
+    """
+
+    op: str
+    method: str
+    path: str
+    status: Optional[int] = None
+    ttfb: float = 0.0
+    total: float = 0.0
+    bytes: int = 0
+    parse: float = 0.0
+    nodes: int = 0
+    took: Optional[float] = None
+    error: Optional[str] = None
+
+
+class Metrics:
+    """Metrics sink that discards samples. Subclass and set ``enabled``."""
+
+    enabled = False
+
+    def record(self, sample: RequestSample) -> None:
+        pass
+
+
+NULL_METRICS = Metrics()
+
+
+class Histogram:
+    """Fixed-bucket latency histogram (see :data:`BUCKETS`)."""
+
+    def __init__(self) -> None:
+        self.counts = [0] * (len(BUCKETS) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, value: float) -> None:
+        self.counts[bisect.bisect_left(BUCKETS, value)] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+    def percentile(self, q: float) -> float:
+        """Return the upper bound of the bucket holding the ``q`` quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank and count:
+                return min(BUCKETS[index], self.max) if index < len(BUCKETS) else self.max
+        return self.max
+
+
+class HistogramMetrics(Metrics):
+    """Aggregate samples in memory into per-operation histograms."""
+
+    enabled = True
+    fields = ("ttfb", "total", "parse", "took")
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self.histograms: Dict[Tuple[str, str], Histogram] = {}
+        self.totals: Dict[str, Dict[str, int]] = {}
+
+    def record(self, sample: RequestSample) -> None:
+        with self._lock:
+            totals = self.totals.setdefault(sample.op, {"requests": 0, "errors": 0, "bytes": 0, "nodes": 0})
+            totals["requests"] += 1
+            totals["errors"] += sample.error is not None
+            totals["bytes"] += sample.bytes
+            totals["nodes"] += sample.nodes
+            for name in self.fields:
+                value = getattr(sample, name)
+                if value is None or (name == "parse" and not sample.nodes and not value):
+                    continue
+                key = (sample.op, name)
+                histogram = self.histograms.get(key)
+                if histogram is None:
+                    histogram = self.histograms[key] = Histogram()
+                histogram.add(value)
+
+    def histogram(self, op: str, name: str) -> Histogram:
+        return self.histograms.get((op, name)) or Histogram()
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        """Return counters, means and p50/p99 latencies per operation."""
+        with self._lock:
+            result: Dict[str, Dict[str, float]] = {}
+            for op, totals in self.totals.items():
+                row: Dict[str, float] = dict(totals)
+                for name in self.fields:
+                    histogram = self.histograms.get((op, name))
+                    if histogram is None:
+                        continue
+                    row[f"{name}_mean"] = histogram.mean
+                    row[f"{name}_p50"] = histogram.percentile(0.5)
+                    row[f"{name}_p99"] = histogram.percentile(0.99)
+                total = self.histograms.get((op, "total"))
+                if total is not None and total.sum:
+                    row["bytes_per_sec"] = totals["bytes"] / total.sum
+                result[op] = row
+            return result
+
+    def reset(self) -> None:
+        with self._lock:
+            self.histograms = {}
+            self.totals = {}
+
+
+class CountingChunks:
+    """Wrap a response body iterator to count bytes and time spent waiting on it."""
+
+    def __init__(self, chunks: Iterable[bytes]) -> None:
+        self._chunks = iter(chunks)
+        self.bytes = 0
+        self.wait = 0.0
+
+    def __iter__(self) -> Iterator[bytes]:
+        return self
+
+    def __next__(self) -> bytes:
+        start = time.perf_counter()
+        try:
+            chunk = next(self._chunks)
+        finally:
+            self.wait += time.perf_counter() - start
+        self.bytes += len(chunk)
+        return chunk
+
+
+def ttfb(resp: Any, start: float) -> float:
+    """Return the time to first byte of ``resp``, as measured by ``requests``."""
+    elapsed = getattr(resp, "elapsed", None)
+    return elapsed.total_seconds() if elapsed is not None else time.perf_counter() - start
+
+
+def response_sample(op: str, method: str, path: str, resp: Any, start: float) -> RequestSample:
+    """Build a sample for a response whose body has been read."""
+    status = getattr(resp, "status_code", None)
+    content = getattr(resp, "content", None)
+    return RequestSample(
+        op=op,
+        method=method,
+        path=path,
+        status=status,
+        ttfb=ttfb(resp, start),
+        total=time.perf_counter() - start,
+        bytes=len(content) if isinstance(content, (bytes, bytearray)) else 0,
+        error=f"HTTP {status}" if isinstance(status, int) and status >= 400 else None,
+    )
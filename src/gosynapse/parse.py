@@ -1,38 +1,185 @@
 from __future__ import annotations
 
 from dataclasses import dataclass
-from typing import List, Tuple, Any
+from typing import TYPE_CHECKING, Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
 import json
-from io import BytesIO
 import logging
+import os
+import re
+import sqlite3
+import tempfile
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .jsonbackend import JsonBackend
 
 logger = logging.getLogger(__name__)
 
+# Decoders for values that a JSON backend left undecoded (for example
+# ``msgspec.Raw``), keyed by type. See :class:`_LazyField`.
+_RAW_DECODERS: Dict[type, Callable[[Any], Any]] = {}
+
+
 @dataclass
 class InitData:
+    __slots__ = ("tick", "text", "abstick", "hash", "task")
     tick: int
     text: str
     abstick: int
     hash: str
     task: str
 
-@dataclass
+
+class _LazyField:
+    """Slot-backed ``NodeData`` attribute that decodes the raw info on access."""
+
+    __slots__ = ("slot",)
+
+    def __init__(self, slot: Any) -> None:
+        self.slot = slot
+
+    def __get__(self, obj: Any, objtype: Any = None) -> Any:
+        if obj is None:
+            return self
+        if obj._raw is not None:
+            obj._materialize()
+        return self.slot.__get__(obj, objtype)
+
+    def __set__(self, obj: Any, value: Any) -> None:
+        if obj._raw is not None:
+            obj._materialize()
+        self.slot.__set__(obj, value)
+
+
 class NodeData:
-    iden: str
-    tags: dict[str, str]
-    props: dict[str, Any]
-    tagprops: dict[str, str]
-    nodedata: dict[str, str]
-    path: dict[str, str]
+    """Node metadata from a Storm ``node`` message.
+
+    Instances use ``__slots__`` rather than a per-instance ``__dict__``. A JSON
+    backend may hand over the info object undecoded, in which case it is only
+    decoded the first time one of its fields is accessed.
+    """
+
+    __slots__ = ("_raw", "_iden", "_tags", "_props", "_tagprops", "_nodedata", "_path")
+
+    _fields = ("iden", "tags", "props", "tagprops", "nodedata", "path")
+
+    def __init__(
+        self,
+        iden: str,
+        tags: Dict[str, Any],
+        props: Dict[str, Any],
+        tagprops: Dict[str, Any],
+        nodedata: Dict[str, Any],
+        path: Dict[str, Any],
+    ) -> None:
+        self._raw = None
+        self._iden = iden
+        self._tags = tags
+        self._props = props
+        self._tagprops = tagprops
+        self._nodedata = nodedata
+        self._path = path
+
+    @classmethod
+    def _from_raw(cls, raw: Any) -> "NodeData":
+        info = cls.__new__(cls)
+        info._raw = raw
+        return info
+
+    def _materialize(self) -> None:
+        raw = self._raw
+        self.__init__(**_RAW_DECODERS[type(raw)](raw))  # type: ignore[misc]
+
+    def __repr__(self) -> str:
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"NodeData({fields})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, NodeData):
+            return NotImplemented
+        return all(getattr(self, name) == getattr(other, name) for name in self._fields)
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {name: getattr(self, name) for name in self._fields}
+
+
+for _name in NodeData._fields:
+    setattr(NodeData, _name, _LazyField(NodeData.__dict__["_" + _name]))
+del _name
+
 
-@dataclass
 class Node:
-    key: str
-    data: List[List[str]]
-    info: NodeData
+    """A node yielded by a Storm query.
+
+    ``data`` is built from the raw node definition on first access instead of
+    for every node as it is parsed. ``ndef`` gives the ``(form, valu)`` pair
+    with the value in its original JSON type.
+    """
+
+    __slots__ = ("key", "_data", "_ndef", "info")
+
+    def __init__(self, key: str, data: List[List[str]], info: NodeData) -> None:
+        self.key = key
+        self._data: Optional[List[List[str]]] = data
+        self._ndef: Any = None
+        self.info = info
+
+    @classmethod
+    def _from_ndef(cls, ndef: Any, info: NodeData) -> "Node":
+        node = cls("node", None, info)  # type: ignore[arg-type]
+        node._ndef = ndef
+        return node
+
+    @property
+    def data(self) -> List[List[str]]:
+        if self._data is None:
+            ndef = self._ndef
+            decode = _RAW_DECODERS.get(type(ndef))
+            if decode is not None:
+                ndef = decode(ndef)
+            self._data = _node_pairs(ndef)
+            self._ndef = ndef
+        return self._data
+
+    @data.setter
+    def data(self, value: List[List[str]]) -> None:
+        self._data = value
+        self._ndef = None
+
+    @property
+    def ndef(self) -> Optional[Tuple[str, Any]]:
+        """Return ``(form, valu)``, or ``None`` if the node has no definition."""
+        ndef = self._ndef
+        decode = _RAW_DECODERS.get(type(ndef))
+        if decode is not None:
+            ndef = self._ndef = decode(ndef)
+        if ndef is None:
+            ndef = self._data
+        if isinstance(ndef, list) and ndef and isinstance(ndef[0], (list, tuple)):
+            # A list of pairs, as held by nodes built directly.
+            ndef = ndef[0]
+        if isinstance(ndef, (list, tuple)) and len(ndef) == 2 and isinstance(ndef[0], str):
+            return ndef[0], ndef[1]
+        return None
+
+    def __repr__(self) -> str:
+        return f"Node(key={self.key!r}, data={self.data!r}, info={self.info!r})"
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Node):
+            return NotImplemented
+        return self.key == other.key and self.data == other.data and self.info == other.info
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"key": self.key, "data": self.data, "info": self.info.to_dict()}
+
 
 @dataclass
 class FiniData:
+    __slots__ = ("tock", "abstock", "took", "count")
     tock: int
     abstock: int
     took: int
@@ -41,56 +188,452 @@ class FiniData:
 
 @dataclass
 class PrintData:
+    __slots__ = ("mesg",)
+    mesg: str
+
+
+@dataclass
+class NodeEditsData:
+    """Node edits made by a query run with ``opts={"editformat": "nodeedits"}``.
+
+    ``edits`` holds ``[buid, form, [[edit_type, info, subedits], ...]]``
+    entries as sent by the Cortex.
+    """
+
+    __slots__ = ("edits",)
+    edits: List[Any]
+
+
+@dataclass
+class FireData:
+    """An event raised with ``$lib.fire(type, **data)``."""
+
+    __slots__ = ("type", "data")
+    type: str
+    data: Dict[str, Any]
+
+
+@dataclass
+class ErrData:
+    """An ``err`` message: the query failed with exception ``code``."""
+
+    __slots__ = ("code", "mesg", "info")
+    code: str
     mesg: str
+    info: Dict[str, Any]
+
+
+Message = Union[InitData, Node, FiniData, PrintData, NodeEditsData, FireData, ErrData]
+
+
+class StormError(RuntimeError):
+    """A Storm query failed on the Cortex; raised for an ``err`` message."""
+
+    def __init__(self, err: ErrData) -> None:
+        super().__init__(f"{err.code}: {err.mesg}" if err.mesg else err.code)
+        self.code = err.code
+        self.mesg = err.mesg
+        self.info = err.info
+
+
+class StreamTruncated(EOFError):
+    """A Storm stream ended before its ``fini`` message."""
 
 
-def parse_json_stream(raw: bytes) -> Tuple[List[InitData], List[Node], List[FiniData], List[PrintData]]:
+def _node_pairs(raw: Any) -> List[List[str]]:
+    if isinstance(raw, list) and len(raw) == 2 and isinstance(raw[0], str):
+        # A Storm ndef, ``[form, valu]``.
+        return [[raw[0], str(raw[1])]]
+    node_pairs = []
+    if isinstance(raw, list):
+        for pair in raw:
+            node_pairs.append([str(x) for x in pair])
+    return node_pairs
+
+
+def _to_message(data: Any) -> Optional[Message]:
+    """Convert a decoded ``[key, payload]`` pair into a typed message."""
+    if not isinstance(data, list) or not data:
+        logger.debug("Unexpected storm message: %s", data)
+        return None
+    key = data[0]
+    payload = data[1]
+    if key == "init":
+        return InitData(**payload)
+    if key == "node":
+        return Node._from_ndef(payload[0], NodeData(**payload[1]))
+    if key == "print":
+        return PrintData(**payload)
+    if key == "fini":
+        return FiniData(**payload)
+    if key == "node:edits":
+        return NodeEditsData(edits=payload.get("edits") or [])
+    if key == "storm:fire":
+        return FireData(type=payload.get("type", ""), data=payload.get("data") or {})
+    if key == "err":
+        code, info = payload if isinstance(payload, list) and len(payload) == 2 else (str(payload), {})
+        info = info if isinstance(info, dict) else {}
+        return ErrData(code=str(code), mesg=str(info.get("mesg", "")), info=info)
+    return None
+
+
+_WHITESPACE = re.compile(r"\s*")
+# Brackets and JSON strings; a string missing its closing quote is matched to
+# the end of the line, with an empty group 1.
+_STRUCTURE = re.compile(r'[\[{\]}]|"(?:[^"\\]|\\.)*("?)')
+
+
+class JsonLinesDecoder:
+    """Incremental decoder for Synapse jsonlines streams.
+
+    Byte chunks are passed to :meth:`feed` as they arrive. Complete lines are
+    decoded directly from the chunk they were received in; only a line that
+    spans several chunks is joined, once, when its terminating newline shows
+    up. Records that are spread over several lines (for example
+    pretty-printed JSON) are collected line by line while tracking their
+    bracket depth, and decoded once the depth says they are closed, so both
+    one-record-per-line streams and large multi-line records are decoded in
+    linear time.
+
+    Single-line records are decoded with ``backend`` (see
+    :mod:`gosynapse.jsonbackend`), defaulting to the fastest installed one.
+    """
+
+    def __init__(self, backend: Optional[JsonBackend] = None) -> None:
+        from .jsonbackend import get_backend
+
+        self._fragments: List[bytes] = []
+        self._record: List[str] = []
+        self._depth = 0
+        self._raw = json.JSONDecoder()
+        self._decode = (backend or get_backend()).decode_message
+
+    def feed(self, chunk: bytes) -> List[Message]:
+        """Decode every complete record contained in ``chunk``."""
+        return self._feed(chunk, 0, len(chunk))
+
+    def _feed(self, buf: Any, start: int, stop: int) -> List[Message]:
+        # ``buf`` may be any buffer with ``find`` and slicing, such as an
+        # ``mmap``; only the lines themselves are copied out of it.
+        messages: List[Message] = []
+        find = buf.find
+        while True:
+            end = find(b"\n", start, stop)
+            if end < 0:
+                break
+            if self._fragments:
+                self._fragments.append(buf[start:end])
+                line = b"".join(self._fragments)
+                self._fragments = []
+            else:
+                line = buf[start:end]
+            self._decode_line(line, messages)
+            start = end + 1
+        if start < stop:
+            self._fragments.append(buf[start:stop])
+        return messages
+
+    def close(self) -> List[Message]:
+        """Flush a trailing record that was not newline terminated."""
+        messages: List[Message] = []
+        if self._fragments:
+            line = b"".join(self._fragments)
+            self._fragments = []
+            self._decode_line(line, messages)
+        if self._record:
+            logger.debug("Discarding incomplete storm message: %s", "\n".join(self._record))
+            self._record = []
+            self._depth = 0
+        return messages
+
+    def _decode_line(self, line: bytes, messages: List[Message]) -> None:
+        if not self._record:
+            if not line.strip():
+                return
+            try:
+                message = self._decode(line)
+            except ValueError:
+                # Fall back to the stdlib decoder, which also handles records
+                # that span several lines or several records on one line.
+                pass
+            else:
+                if message is not None:
+                    messages.append(message)
+                return
+        text = line.decode()
+        self._record.append(text)
+        if self._closes(text):
+            self._decode_record(messages)
+
+    def _closes(self, text: str) -> bool:
+        """Track the bracket depth over ``text``; return whether it is closed.
+
+        Only the new line is scanned, so a record of N lines is scanned once
+        and decoded once rather than N times. A JSON string cannot span lines,
+        so one left open means the record is malformed and is decoded anyway
+        to report it.
+        """
+        depth = self._depth
+        for match in _STRUCTURE.finditer(text):
+            char = match.group()
+            if char in "[{":
+                depth += 1
+            elif char in "]}":
+                depth -= 1
+            elif not match.group(1):
+                self._depth = 0
+                return True
+        self._depth = depth
+        return depth <= 0
+
+    def _decode_record(self, messages: List[Message]) -> None:
+        text = "\n".join(self._record)
+        self._record = []
+        self._depth = 0
+        index = 0
+        while True:
+            index = _WHITESPACE.match(text, index).end()
+            if index >= len(text):
+                return
+            try:
+                data, index = self._raw.raw_decode(text, index)
+            except json.JSONDecodeError as exc:
+                if exc.pos >= len(text.rstrip()):
+                    # The record is truncated; wait for the next line.
+                    self._record = [text[index:]]
+                    self._closes(text[index:])
+                else:
+                    logger.debug("Failed to decode JSON line: %s", text[index:].strip())
+                return
+            message = _to_message(data)
+            if message is not None:
+                messages.append(message)
+
+
+def raise_errors(messages: Iterable[Message]) -> Iterator[Message]:
+    """Pass ``messages`` through, raising :class:`StormError` at an ``err``."""
+    for message in messages:
+        if isinstance(message, ErrData):
+            raise StormError(message)
+        yield message
+
+
+def _iter_chunks(chunks: Iterable[bytes], backend: Optional[JsonBackend]) -> Iterator[Message]:
+    decoder = JsonLinesDecoder(backend)
+    for chunk in chunks:
+        if chunk:
+            yield from decoder.feed(chunk)
+    yield from decoder.close()
+
+
+def iter_json_stream(chunks: Iterable[bytes], backend: Optional[JsonBackend] = None) -> Iterator[Message]:
+    """Incrementally parse a Synapse jsonlines stream.
+
+    Args:
+        chunks: Byte chunks as they arrive from the server. Chunk
+            boundaries do not need to line up with message boundaries.
+        backend: JSON backend to decode with. Defaults to
+            :func:`gosynapse.jsonbackend.get_backend`.
+
+    Yields:
+        ``InitData``, ``Node``, ``PrintData``, ``FiniData``, ``ErrData``,
+        ``NodeEditsData`` and ``FireData`` messages in the order they appear
+        in the stream.
+    """
+    return _iter_chunks(chunks, backend)
+
+
+def parse_json_stream(
+    raw: bytes, backend: Optional[JsonBackend] = None
+) -> Tuple[List[InitData], List[Node], List[FiniData], List[PrintData]]:
     """Parse a stream of JSON messages produced by Synapse.
 
     Args:
         raw: Raw bytes from the server.
+        backend: JSON backend to decode with. Defaults to
+            :func:`gosynapse.jsonbackend.get_backend`.
 
     Returns:
         A tuple of lists: (init messages, nodes, fini messages, print messages).
     """
-    reader = BytesIO(raw)
-    decoder = json.JSONDecoder()
-    buffer = ""
-
     init_items: List[InitData] = []
     nodes: List[Node] = []
     fini_items: List[FiniData] = []
     print_items: List[PrintData] = []
 
-    for line in reader.readlines():
-        decoded = line.decode()
-        buffer += decoded
-        buffer = buffer.strip()
-        if not buffer:
-            continue
-        try:
-            data, index = decoder.raw_decode(buffer)
-            buffer = buffer[index:].lstrip()
-        except json.JSONDecodeError:
-            logger.debug("Failed to decode JSON line: %s", decoded.strip())
-            continue
-
-        if not isinstance(data, list) or not data:
-            logger.debug("Unexpected storm message: %s", data)
-            continue
-        key = data[0]
-        payload = data[1]
-        if key == "init":
-            init_items.append(InitData(**payload))
-        elif key == "node":
-            node_pairs = []
-            if isinstance(payload[0], list):
-                for pair in payload[0]:
-                    node_pairs.append([str(x) for x in pair])
-            info = NodeData(**payload[1])
-            nodes.append(Node(key="node", data=node_pairs, info=info))
-        elif key == "print":
-            print_items.append(PrintData(**payload))
-        elif key == "fini":
-            fini_items.append(FiniData(**payload))
+    decoder = JsonLinesDecoder(backend)
+    for message in decoder.feed(raw) + decoder.close():
+        if isinstance(message, InitData):
+            init_items.append(message)
+        elif isinstance(message, Node):
+            nodes.append(message)
+        elif isinstance(message, PrintData):
+            print_items.append(message)
+        elif isinstance(message, FiniData):
+            fini_items.append(message)
     return init_items, nodes, fini_items, print_items
+
+
+def _merge_info(info: NodeData, other: NodeData) -> None:
+    """Fold the tags and props of a repeated sighting into ``info``."""
+    info.tags.update(other.tags)
+    info.props.update(other.props)
+    for tag, props in other.tagprops.items():
+        info.tagprops.setdefault(tag, {}).update(props)
+
+
+def _tag_prefixes(tags: Iterable[str]) -> Iterator[str]:
+    for tag in tags:
+        parts = tag.split(".")
+        for i in range(1, len(parts) + 1):
+            yield ".".join(parts[:i])
+
+
+class NodeSet:
+    """Nodes from one or more Storm queries, deduplicated by iden.
+
+    Feed messages in with :meth:`add` or :meth:`update` while streaming;
+    anything that is not a :class:`Node` is ignored. When a node is seen
+    again its tags, props and tag props are merged into the stored copy.
+    Nodes can be listed by form with :meth:`by_form` and by tag with
+    :meth:`by_tag`, which also matches child tags (``"rep"`` finds nodes
+    tagged ``#rep.foo``).
+
+    With ``max_nodes`` set, the set moves its nodes to a temporary SQLite
+    database in ``spill_dir`` once it holds more than that many; only the
+    idens in the form and tag indexes stay in memory after that. Nodes
+    returned from a spilled set are fresh copies, so changes to them are not
+    stored. Call :meth:`close`, or use the set as a context manager, to
+    remove the database; a closed set is empty.
+    """
+
+    def __init__(self, max_nodes: Optional[int] = None, spill_dir: Optional[str] = None) -> None:
+        self.max_nodes = max_nodes
+        self.spill_dir = spill_dir
+        self._nodes: Dict[str, Node] = {}
+        self._forms: Dict[str, Dict[str, None]] = {}
+        self._tags: Dict[str, Dict[str, None]] = {}
+        self._db: Optional[sqlite3.Connection] = None
+        self._db_path: Optional[str] = None
+        self._count = 0
+
+    def __enter__(self) -> "NodeSet":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        """Remove the spill database, if any, and empty the set."""
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+            assert self._db_path is not None
+            os.unlink(self._db_path)
+            self._db_path = None
+        self._nodes = {}
+        self._forms = {}
+        self._tags = {}
+        self._count = 0
+
+    @property
+    def spilled(self) -> bool:
+        return self._db is not None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __contains__(self, iden: object) -> bool:
+        if self._db is None:
+            return iden in self._nodes
+        row = self._db.execute("SELECT 1 FROM nodes WHERE iden = ?", (iden,)).fetchone()
+        return row is not None
+
+    def __iter__(self) -> Iterator[Node]:
+        if self._db is None:
+            return iter(list(self._nodes.values()))
+        return (_node_from_row(row) for row in self._db.execute("SELECT body FROM nodes ORDER BY rowid"))
+
+    def get(self, iden: str) -> Optional[Node]:
+        if self._db is None:
+            return self._nodes.get(iden)
+        row = self._db.execute("SELECT body FROM nodes WHERE iden = ?", (iden,)).fetchone()
+        return _node_from_row(row) if row is not None else None
+
+    def forms(self) -> List[str]:
+        return list(self._forms)
+
+    def by_form(self, form: str) -> Iterator[Node]:
+        return self._lookup(self._forms.get(form, {}))
+
+    def by_tag(self, tag: str) -> Iterator[Node]:
+        return self._lookup(self._tags.get(tag, {}))
+
+    def add(self, message: Any) -> bool:
+        """Add a message, returning ``True`` if it is a node not seen before."""
+        if not isinstance(message, Node):
+            return False
+        iden = message.info.iden
+        if self._db is not None:
+            new = self._store(iden, message)
+        else:
+            existing = self._nodes.get(iden)
+            new = existing is None
+            if new:
+                self._nodes[iden] = message
+            else:
+                _merge_info(existing.info, message.info)  # type: ignore[union-attr]
+        if new:
+            self._count += 1
+            ndef = message.ndef
+            self._forms.setdefault(ndef[0] if ndef is not None else "", {})[iden] = None
+        for tag in _tag_prefixes(message.info.tags):
+            self._tags.setdefault(tag, {})[iden] = None
+        if self.max_nodes is not None and self._db is None and self._count > self.max_nodes:
+            self._spill()
+        return new
+
+    def update(self, messages: Iterable[Any]) -> int:
+        """Add every message, returning the number of new nodes."""
+        return sum(self.add(message) for message in messages)
+
+    def _lookup(self, idens: Dict[str, None]) -> Iterator[Node]:
+        for iden in list(idens):
+            node = self.get(iden)
+            if node is not None:
+                yield node
+
+    def _spill(self) -> None:
+        fd, self._db_path = tempfile.mkstemp(dir=self.spill_dir, prefix="gosynapse-nodeset-", suffix=".db")
+        os.close(fd)
+        logger.debug("NodeSet spilling %d nodes to %s", self._count, self._db_path)
+        self._db = sqlite3.connect(self._db_path)
+        self._db.execute("PRAGMA journal_mode = OFF")
+        self._db.execute("PRAGMA synchronous = OFF")
+        self._db.execute("CREATE TABLE nodes (iden TEXT PRIMARY KEY, body TEXT)")
+        self._db.executemany(
+            "INSERT INTO nodes VALUES (?, ?)", ((iden, _node_row(node)) for iden, node in self._nodes.items())
+        )
+        self._nodes = {}
+
+    def _store(self, iden: str, node: Node) -> bool:
+        assert self._db is not None
+        row = self._db.execute("SELECT body FROM nodes WHERE iden = ?", (iden,)).fetchone()
+        if row is None:
+            self._db.execute("INSERT INTO nodes VALUES (?, ?)", (iden, _node_row(node)))
+            return True
+        stored = _node_from_row(row)
+        _merge_info(stored.info, node.info)
+        self._db.execute("UPDATE nodes SET body = ? WHERE iden = ?", (_node_row(stored), iden))
+        return False
+
+
+def _node_row(node: Node) -> str:
+    return json.dumps([node.key, node.ndef, node.data, node.info.to_dict()])
+
+
+def _node_from_row(row: Tuple[str]) -> Node:
+    key, ndef, data, info = json.loads(row[0])
+    node = Node(key, data, NodeData(**info))
+    node._ndef = ndef
+    return node
@@ -0,0 +1,245 @@
+"""Replay recorded Storm jsonlines responses from disk.
+
+A recording is the raw body of an ``/api/v1/storm`` response saved to a
+file. :class:`StormRecording` memory-maps the file and decodes it in place,
+so a capture of any size is parsed without being read into memory. A
+:class:`LineIndex` of record offsets gives random access to the Nth record,
+and :func:`parallel_scan` splits a recording on line boundaries and parses
+the parts in separate processes.
+"""
+
+from __future__ import annotations
+
+import mmap
+import multiprocessing
+import os
+from array import array
+from collections import Counter
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, List, Optional, Tuple, TypeVar, Union
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover - optional dependency
+    np = None
+
+from .parse import JsonLinesDecoder, Message
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .jsonbackend import JsonBackend
+
+R = TypeVar("R")
+
+WINDOW_SIZE = 4 * 1024 * 1024
+
+
+class LineIndex:
+    """Start offsets of the records in a jsonlines file.
+
+    Storm streams hold one record per line; empty lines are not indexed.
+    Offsets are kept in an ``array`` of unsigned 64-bit integers and can be
+    saved next to the recording with :meth:`save`.
+    """
+
+    def __init__(self, offsets: "array[int]", size: int) -> None:
+        self.offsets = offsets
+        self.size = size
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    @classmethod
+    def build(cls, buf: Any, window: int = WINDOW_SIZE) -> "LineIndex":
+        """Index the lines of ``buf`` (``bytes`` or ``mmap``)."""
+        size = len(buf)
+        offsets = array("Q")
+        start = 0
+        for pos in range(0, size, window):
+            start = _index_window(buf[pos:pos + window], pos, start, offsets)
+        if start < size:
+            offsets.append(start)
+        return cls(offsets, size)
+
+    def save(self, path: Union[str, "os.PathLike[str]"]) -> None:
+        header = array("Q", [self.size, len(self.offsets)])
+        with open(path, "wb") as fileobj:
+            header.tofile(fileobj)
+            self.offsets.tofile(fileobj)
+
+    @classmethod
+    def load(cls, path: Union[str, "os.PathLike[str]"], size: Optional[int] = None) -> "LineIndex":
+        """Load a saved index, checking it against the recording ``size``."""
+        with open(path, "rb") as fileobj:
+            header = array("Q")
+            header.fromfile(fileobj, 2)
+            offsets = array("Q")
+            offsets.fromfile(fileobj, header[1])
+        if size is not None and header[0] != size:
+            raise ValueError(f"Index {path} is for a {header[0]} byte file, not {size} bytes")
+        return cls(offsets, header[0])
+
+
+def _index_window(chunk: bytes, pos: int, start: int, offsets: "array[int]") -> int:
+    """Append the starts of the non-empty lines ending in ``chunk``.
+
+    ``start`` is the offset of the line in progress; the offset of the line
+    following the last newline in ``chunk`` is returned.
+    """
+    if np is not None:
+        ends = np.flatnonzero(np.frombuffer(chunk, dtype=np.uint8) == 10).astype(np.uint64) + np.uint64(pos)
+        if not len(ends):
+            return start
+        starts = np.concatenate((np.array([start], dtype=np.uint64), ends[:-1] + np.uint64(1)))
+        offsets.frombytes(starts[ends > starts].tobytes())
+        return int(ends[-1]) + 1
+    find = chunk.find
+    end = find(b"\n")
+    while end >= 0:
+        if pos + end > start:
+            offsets.append(start)
+        start = pos + end + 1
+        end = find(b"\n", end + 1)
+    return start
+
+
+class StormRecording:
+    """A recorded Storm jsonlines response, memory-mapped for reading.
+
+    Iterating over the recording yields the same messages as
+    :func:`~gosynapse.parse.iter_json_stream` over the original response.
+    Indexing (``recording[n]``) decodes only record ``n``; it returns
+    ``None`` for records that are not one of the supported message types.
+    The index is built on first use, or loaded from ``index_path`` when that
+    file exists (see :meth:`save_index`).
+    """
+
+    def __init__(
+        self,
+        path: Union[str, "os.PathLike[str]"],
+        backend: Optional[JsonBackend] = None,
+        index_path: Optional[Union[str, "os.PathLike[str]"]] = None,
+        window: int = WINDOW_SIZE,
+    ) -> None:
+        self.path = Path(path)
+        self.backend = backend
+        self.index_path = Path(index_path) if index_path is not None else None
+        self.window = window
+        self._file = open(self.path, "rb")
+        self.size = os.fstat(self._file.fileno()).st_size
+        self._map: Any = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self._index: Optional[LineIndex] = None
+
+    def __enter__(self) -> "StormRecording":
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.close()
+
+    def close(self) -> None:
+        if isinstance(self._map, mmap.mmap):
+            self._map.close()
+        self._file.close()
+
+    def __iter__(self) -> Iterator[Message]:
+        return self.messages()
+
+    def messages(self, start: int = 0, stop: Optional[int] = None) -> Iterator[Message]:
+        """Yield the messages in the byte range ``start:stop``.
+
+        The range should begin at the start of a line, for example an offset
+        from :attr:`index` or from :meth:`ranges`.
+        """
+        stop = self.size if stop is None else min(stop, self.size)
+        decoder = JsonLinesDecoder(self.backend)
+        pos = start
+        while pos < stop:
+            end = min(pos + self.window, stop)
+            yield from decoder._feed(self._map, pos, end)
+            pos = end
+        yield from decoder.close()
+
+    @property
+    def index(self) -> LineIndex:
+        if self._index is None:
+            if self.index_path is not None and self.index_path.exists():
+                self._index = LineIndex.load(self.index_path, self.size)
+            else:
+                self._index = LineIndex.build(self._map, self.window)
+        return self._index
+
+    def save_index(self, path: Optional[Union[str, "os.PathLike[str]"]] = None) -> Path:
+        """Write the record index to ``path`` (default :attr:`index_path`)."""
+        target = Path(path) if path is not None else self.index_path
+        if target is None:
+            raise ValueError("no index path given")
+        self.index.save(target)
+        return target
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def span(self, n: int) -> Tuple[int, int]:
+        """Return the ``(start, end)`` byte range of record ``n``."""
+        offsets = self.index.offsets
+        start = offsets[n]
+        end = self._map.find(b"\n", start)
+        return start, self.size if end < 0 else end
+
+    def __getitem__(self, n: int) -> Optional[Message]:
+        start, end = self.span(n)
+        decoder = JsonLinesDecoder(self.backend)
+        messages = decoder._feed(self._map, start, end) + decoder.close()
+        return messages[0] if messages else None
+
+    def iter_from(self, n: int) -> Iterator[Message]:
+        """Yield the messages from record ``n`` to the end of the recording."""
+        if n >= len(self.index):
+            return iter(())
+        return self.messages(self.index.offsets[n])
+
+    def ranges(self, parts: int) -> List[Tuple[int, int]]:
+        """Split the recording into up to ``parts`` byte ranges on line boundaries."""
+        bounds = [0]
+        for part in range(1, parts):
+            pos = self._map.find(b"\n", max(self.size * part // parts, bounds[-1]))
+            if pos < 0:
+                break
+            if pos + 1 > bounds[-1]:
+                bounds.append(pos + 1)
+        bounds.append(self.size)
+        return [(start, stop) for start, stop in zip(bounds, bounds[1:]) if stop > start]
+
+
+def count_messages(messages: Iterable[Message]) -> Counter:
+    """Count messages by type name; the default :func:`parallel_scan` job."""
+    return Counter(type(message).__name__ for message in messages)
+
+
+def _scan_range(job: Tuple[str, int, int, Callable[[Iterator[Message]], Any]]) -> Any:
+    path, start, stop, func = job
+    with StormRecording(path) as recording:
+        return func(recording.messages(start, stop))
+
+
+def parallel_scan(
+    path: Union[str, "os.PathLike[str]"],
+    func: Callable[[Iterator[Message]], R] = count_messages,  # type: ignore[assignment]
+    processes: Optional[int] = None,
+    parts: Optional[int] = None,
+) -> List[R]:
+    """Parse a recording in parallel processes.
+
+    The file is split into ``parts`` (default ``processes``) ranges that
+    start and end on line boundaries. ``func`` is called in a worker process
+    with an iterator over the messages of one range, and the results are
+    returned in file order. ``func`` must be picklable, so define it at
+    module level.
+    """
+    processes = processes or os.cpu_count() or 1
+    with StormRecording(path) as recording:
+        ranges = recording.ranges(parts or processes)
+    jobs = [(str(path), start, stop, func) for start, stop in ranges]
+    if processes == 1 or len(jobs) <= 1:
+        return [_scan_range(job) for job in jobs]
+    with multiprocessing.Pool(min(processes, len(jobs))) as pool:
+        return pool.map(_scan_range, jobs)
@@ -0,0 +1,223 @@
+"""Retries, deadlines and circuit breaking for client requests.
+
+Every :class:`~gosynapse.client.SynapseClient` request goes through one
+layer that combines three mechanisms:
+
+* :class:`RetryPolicy` retries idempotent requests that failed with a
+  connection error, a timeout or a transient status (429, 502, 503, 504),
+  sleeping a jittered, exponentially growing delay between attempts.
+* Deadlines bound the total time of a call, retries included. Set one per
+  call with ``SynapseClient(deadline=...)`` or for a whole block of calls
+  with :func:`deadline`; each attempt's timeout is cut to the time left and
+  :class:`DeadlineExceeded` is raised once it runs out.
+* :class:`CircuitBreaker` counts consecutive failures. After
+  ``failure_threshold`` of them requests fail immediately with
+  :class:`CircuitOpenError` for ``reset_timeout`` seconds, after which a
+  single trial request decides whether the circuit closes again. Work queued
+  against a Cortex that is down then drains quickly instead of piling up
+  behind timeouts.
+"""
+
+from __future__ import annotations
+
+import contextlib
+import random
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Any, FrozenSet, Iterator, Optional, Tuple, Union
+
+import requests  # type: ignore
+
+Timeout = Optional[Union[float, Tuple[float, float]]]
+
+DEFAULT_TIMEOUT: Tuple[float, float] = (10.0, 300.0)
+
+_deadline: ContextVar[Optional[float]] = ContextVar("gosynapse_deadline", default=None)
+
+
+class DeadlineExceeded(TimeoutError):
+    """The deadline of a call expired before it completed."""
+
+
+class CircuitOpenError(RuntimeError):
+    """The circuit breaker is open; the request was not sent."""
+
+
+def _transport_errors() -> Tuple[type, ...]:
+    return tuple(
+        exc for exc in (getattr(requests, "ConnectionError", None), getattr(requests, "Timeout", None)) if exc
+    )
+
+
+@dataclass
+class RetryPolicy:
+    """How failed requests are retried.
+
+    A request is retried at most ``retries`` times, and only when it is
+    idempotent: ``GET`` and ``HEAD`` requests are, other methods only when
+    the caller says so (for example ``storm(..., idempotent=True)``). The
+    delay before attempt ``n + 1`` is drawn uniformly from ``[0, backoff *
+    2 ** (n - 1)]``, capped at ``max_backoff`` ("full jitter"), so that many
+    clients retrying at once do not hit the Cortex in lockstep. A
+    ``Retry-After`` header on the response takes precedence.
+    """
+
+    retries: int = 3
+    backoff: float = 0.5
+    max_backoff: float = 30.0
+    statuses: FrozenSet[int] = frozenset({429, 502, 503, 504})
+    methods: FrozenSet[str] = frozenset({"GET", "HEAD"})
+
+    def is_idempotent(self, method: str) -> bool:
+        return method.upper() in self.methods
+
+    def is_transient(self, exc: BaseException) -> bool:
+        """Return whether ``exc`` is a transport error worth retrying."""
+        return isinstance(exc, _transport_errors())
+
+    def delay(self, attempt: int, resp: Any = None) -> float:
+        """Return the seconds to wait after failed attempt number ``attempt``."""
+        retry_after = _retry_after(resp)
+        if retry_after is not None:
+            return min(retry_after, self.max_backoff)
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** (attempt - 1)))
+
+
+NO_RETRY = RetryPolicy(retries=0)
+
+
+def _retry_after(resp: Any) -> Optional[float]:
+    headers = getattr(resp, "headers", None)
+    if not headers:
+        return None
+    try:
+        return max(float(headers.get("Retry-After")), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class CircuitBreaker:
+    """Fail fast while the Cortex is unreachable.
+
+    Transport errors and responses with one of ``statuses`` count as
+    failures; any other response resets the count, while other exceptions
+    are neutral (see :meth:`release`). Once
+    ``failure_threshold`` consecutive failures are seen the circuit opens and
+    :meth:`before` raises :class:`CircuitOpenError`. After ``reset_timeout``
+    seconds one request is let through; its outcome closes the circuit or
+    opens it for another ``reset_timeout``.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        statuses: FrozenSet[int] = frozenset({502, 503, 504}),
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.statuses = statuses
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """``"closed"``, ``"open"`` or ``"half-open"``."""
+        if self.opened_at is None:
+            return "closed"
+        if self._trial or time.monotonic() - self.opened_at >= self.reset_timeout:
+            return "half-open"
+        return "open"
+
+    def before(self) -> None:
+        """Raise :class:`CircuitOpenError` unless a request may be sent."""
+        with self._lock:
+            if self.opened_at is None:
+                return
+            remaining = self.opened_at + self.reset_timeout - time.monotonic()
+            if remaining <= 0 and not self._trial:
+                self._trial = True
+                return
+            raise CircuitOpenError(
+                f"circuit open after {self.failures} consecutive failures; retry in {max(remaining, 0.0):.1f}s"
+            )
+
+    def record(self, resp: Any = None, exc: Optional[BaseException] = None) -> None:
+        """Record the outcome of a request let through by :meth:`before`."""
+        failed = exc is not None or getattr(resp, "status_code", None) in self.statuses
+        with self._lock:
+            self._trial = False
+            if not failed:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """End a request whose outcome says nothing about the Cortex's health.
+
+        Used for requests that failed on the client side, for example on an
+        invalid argument: the failure count is left alone, and a half-open
+        circuit lets its next request through as the trial instead.
+        """
+        with self._lock:
+            self._trial = False
+
+    def reset(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+
+@contextlib.contextmanager
+def deadline(seconds: float) -> Iterator[None]:
+    """Bound the total time of all client calls made in this block.
+
+    Deadlines nest; the earliest one applies. The deadline is held in a
+    context variable, so it covers calls made from the current thread (or
+    asyncio task) but not from worker threads started inside the block.
+    """
+    expires = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(expires if current is None else min(current, expires))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def expiry(seconds: Optional[float] = None) -> Optional[float]:
+    """Return the monotonic time a call started now must finish by.
+
+    Combines a per-call budget of ``seconds`` with the enclosing
+    :func:`deadline`, if any.
+    """
+    expires = _deadline.get()
+    if seconds is not None:
+        own = time.monotonic() + seconds
+        expires = own if expires is None else min(expires, own)
+    return expires
+
+
+def cap_timeout(timeout: Timeout, expires: Optional[float]) -> Timeout:
+    """Cut ``timeout`` to the time left before ``expires``.
+
+    Raises :class:`DeadlineExceeded` if no time is left.
+    """
+    if expires is None:
+        return timeout
+    left = expires - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("deadline expired")
+    if timeout is None:
+        return left
+    if isinstance(timeout, tuple):
+        return (min(timeout[0], left), min(timeout[1], left))
+    return min(timeout, left)
@@ -0,0 +1,305 @@
+"""In-process stand-in for the Cortex HTTP API.
+
+:class:`FakeCortex` serves the ``/api/v1`` endpoints used by
+:class:`~gosynapse.client.SynapseClient` from a background thread using only
+the standard library. It is meant for tests and benchmarks, not as a model of
+Cortex behaviour: Storm queries are not evaluated, instead every query
+streams the messages produced by :attr:`FakeCortex.storm_handler`.
+
+For benchmarks, :func:`synthetic_storm` generates pre-encoded responses of
+any size cheaply enough that the server does not become the bottleneck, and
+:attr:`FakeCortex.latency` and :attr:`FakeCortex.chunk_size` shape how they
+are delivered::
+
+    with FakeCortex() as cortex:
+        cortex.storm_handler = lambda query, opts: synthetic_storm(100000)
+        cortex.latency = 0.005
+        cortex.chunk_size = 16 * 1024
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+API = "/api/v1"
+
+
+def make_node(
+    form: str,
+    valu: Any,
+    iden: Optional[str] = None,
+    props: Optional[Dict[str, Any]] = None,
+    tags: Optional[Dict[str, Any]] = None,
+) -> List[Any]:
+    """Return a Storm ``node`` message payload for ``form=valu``."""
+    if iden is None:
+        iden = hashlib.sha256(json.dumps([form, valu]).encode()).hexdigest()
+    info = {
+        "iden": iden,
+        "tags": tags or {},
+        "props": props or {},
+        "tagprops": {},
+        "nodedata": {},
+        "path": {},
+    }
+    return [[[form, valu]], info]
+
+
+_SYNTHETIC_NODE = (
+    b'["node", [[["inet:fqdn", "host%d.example.com"]], {"iden": "%064x", "tags": {"rep.bad": [null, null]}, '
+    b'"props": {".created": 1700000000000, "domain": "example.com"}, "tagprops": {}, "nodedata": {%s}, '
+    b'"path": {}}]]\n'
+)
+
+
+def synthetic_storm(count: int, query: str = "", pad: int = 0) -> Iterator[bytes]:
+    """Yield the encoded jsonlines response of a query returning ``count`` nodes.
+
+    Nodes are ``inet:fqdn`` nodes of about 250 bytes each; ``pad`` adds a
+    nodedata string of that many bytes to every node. The lines can be
+    returned from :attr:`FakeCortex.storm_handler` as they are.
+    """
+    init = {"tick": 1, "text": query, "abstick": 1, "hash": "", "task": ""}
+    yield json.dumps(["init", init]).encode() + b"\n"
+    nodedata = b'"pad": "%s"' % (b"x" * pad) if pad else b""
+    for i in range(count):
+        yield _SYNTHETIC_NODE % (i, i, nodedata)
+    yield json.dumps(["fini", {"tock": 2, "abstock": 2, "took": 1, "count": count}]).encode() + b"\n"
+
+
+class FakeCortex:
+    """Serve a minimal Cortex API on ``host``/``port`` (``0`` picks a port).
+
+    Attributes:
+        nodes: Node payloads (see :func:`make_node`) streamed by the default
+            :attr:`storm_handler`.
+        files: Axon blobs keyed by sha256.
+        feeds: Bodies posted to ``/api/v1/feed``.
+        storm_vars: Values stored through the ``/api/v1/vars`` endpoints.
+        requests: ``(method, path)`` of every request received.
+        cancelled: Number of Storm responses the client disconnected from
+            before they were complete.
+        storm_handler: Callable taking ``(query, opts)`` and returning the
+            Storm messages to stream back as jsonlines. Messages given as
+            ``bytes`` are sent as already encoded lines.
+        latency: Seconds to wait before answering each request.
+        chunk_size: Size of the HTTP chunks Storm responses are sent in.
+            Lines are split across chunks as needed; ``None`` sends one
+            chunk per message.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, api_key: str = "") -> None:
+        self.host = host
+        self.api_key = api_key
+        self.nodes: List[List[Any]] = []
+        self.files: Dict[str, bytes] = {}
+        self.feeds: List[Any] = []
+        self.storm_vars: Dict[str, Any] = {}
+        self.requests: List[Tuple[str, str]] = []
+        self.cancelled = 0
+        self.storm_handler: Callable[[str, Dict[str, Any]], Iterable[Any]] = self.default_storm
+        self.latency = 0.0
+        self.chunk_size: Optional[int] = None
+        self.lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), _handler_for(self))
+        self._server.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def port(self) -> int:
+        return self._server.server_address[1]
+
+    def start(self) -> "FakeCortex":
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self) -> "FakeCortex":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+    def default_storm(self, query: str, opts: Dict[str, Any]) -> Iterable[Any]:
+        yield ["init", {"tick": 1, "text": query, "abstick": 1, "hash": "", "task": ""}]
+        for node in self.nodes:
+            yield ["node", node]
+        yield ["fini", {"tock": 2, "abstock": 2, "took": 1, "count": len(self.nodes)}]
+
+    def default_call(self, query: str) -> Any:
+        match = re.fullmatch(r"\s*return\((.*)\)\s*", query)
+        if match is None:
+            return None
+        try:
+            return json.loads(match.group(1))
+        except ValueError:
+            return match.group(1)
+
+
+def _ok(result: Any) -> Dict[str, Any]:
+    return {"status": "ok", "result": result}
+
+
+def _handler_for(cortex: FakeCortex) -> type:
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *_args: Any) -> None:
+            pass
+
+        def do_GET(self) -> None:
+            self._dispatch("GET")
+
+        def do_POST(self) -> None:
+            self._dispatch("POST")
+
+        def _body(self) -> bytes:
+            if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+                parts = []
+                while True:
+                    size = int(self.rfile.readline().split(b";")[0], 16)
+                    if size == 0:
+                        self.rfile.readline()
+                        break
+                    parts.append(self.rfile.read(size))
+                    self.rfile.readline()
+                return b"".join(parts)
+            length = int(self.headers.get("Content-Length") or 0)
+            return self.rfile.read(length) if length else b""
+
+        def _send_json(self, data: Any, status: int = 200, headers: Optional[Dict[str, str]] = None) -> None:
+            body = json.dumps(data).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_bytes(self, data: bytes) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def _send_stream(self, messages: Iterable[Any]) -> None:
+            self.send_response(200)
+            self.send_header("Content-Type", "application/x-ndjson")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            try:
+                self._write_stream(messages)
+            except (BrokenPipeError, ConnectionResetError):
+                # The client went away mid-stream, as a cancelled query does.
+                with cortex.lock:
+                    cortex.cancelled += 1
+                self.close_connection = True
+
+        def _write_stream(self, messages: Iterable[Any]) -> None:
+            size = cortex.chunk_size
+            buf = bytearray()
+            for mesg in messages:
+                line = mesg if isinstance(mesg, bytes) else json.dumps(mesg).encode() + b"\n"
+                if not size:
+                    self._send_chunk(line)
+                    continue
+                buf += line
+                if len(buf) >= size:
+                    view = memoryview(buf)
+                    end = len(buf) - len(buf) % size
+                    for start in range(0, end, size):
+                        self._send_chunk(view[start:start + size])
+                    view.release()
+                    del buf[:end]
+            if buf:
+                self._send_chunk(buf)
+            self.wfile.write(b"0\r\n\r\n")
+
+        def _send_chunk(self, data: Any) -> None:
+            self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+        def _dispatch(self, method: str) -> None:
+            path = self.path.split("?", 1)[0]
+            with cortex.lock:
+                cortex.requests.append((method, path))
+            raw = self._body()
+            if cortex.latency:
+                time.sleep(cortex.latency)
+            if cortex.api_key and self.headers.get("X-API-KEY") != cortex.api_key and path != f"{API}/login":
+                self._send_json({"status": "err", "code": "NotAuthenticated"}, status=401)
+                return
+            body: Any = None
+            if raw and not path.startswith(f"{API}/axon/files/put"):
+                body = json.loads(raw)
+            route = path[len(API):] if path.startswith(API) else path
+            try:
+                self._route(method, route, body, raw)
+            except KeyError:
+                self._send_json({"status": "err", "code": "NoSuchPath"}, status=404)
+
+        def _route(self, method: str, route: str, body: Any, raw: bytes) -> None:
+            if route == "/login":
+                self._send_json(_ok({"name": body["user"]}), headers={"Set-Cookie": "sess=fake"})
+            elif route == "/logout":
+                self._send_json(_ok(None))
+            elif route == "/active":
+                self._send_json(_ok({"active": True}))
+            elif route in ("/auth/users", "/auth/roles"):
+                self._send_json(_ok([]))
+            elif route in ("/auth/adduser", "/auth/addrole", "/auth/delrole"):
+                self._send_json(_ok({"name": body["name"]}))
+            elif route.startswith("/auth/user/") or route.startswith("/auth/password/"):
+                self._send_json(_ok({"iden": route.rsplit("/", 1)[1]}))
+            elif route == "/feed":
+                with cortex.lock:
+                    cortex.feeds.append(body)
+                self._send_json(_ok(None))
+            elif route == "/storm":
+                body = body or {}
+                self._send_stream(cortex.storm_handler(body.get("query", ""), body.get("opts") or {}))
+            elif route == "/storm/call":
+                self._send_json(_ok(cortex.default_call(body.get("query", ""))))
+            elif route == "/storm/export":
+                self._send_json(_ok(cortex.nodes))
+            elif route == "/model":
+                self._send_json(_ok({"types": {}, "forms": {}, "tagprops": {}}))
+            elif route == "/core/info":
+                self._send_json(_ok({"version": [2, 0, 0]}))
+            elif route == "/vars/get":
+                self._send_json(_ok(dict(cortex.storm_vars)))
+            elif route == "/vars/set":
+                cortex.storm_vars.update(body)
+                self._send_json(_ok(None))
+            elif route == "/vars/pop":
+                self._send_json(_ok(cortex.storm_vars.pop(body["name"], None)))
+            elif route == "/axon/files/put":
+                sha256 = hashlib.sha256(raw).hexdigest()
+                with cortex.lock:
+                    cortex.files[sha256] = raw
+                self._send_json(_ok({"size": len(raw), "sha256": sha256}))
+            elif route == "/axon/files/del":
+                with cortex.lock:
+                    result = {sha: cortex.files.pop(sha, None) is not None for sha in body["sha256"]}
+                self._send_json(_ok(result))
+            elif route.startswith("/axon/files/has/sha256/"):
+                self._send_json(_ok(route.rsplit("/", 1)[1] in cortex.files))
+            elif route.startswith("/axon/files/by/sha256/"):
+                self._send_bytes(cortex.files[route.rsplit("/", 1)[1]])
+            else:
+                raise KeyError(route)
+
+    return Handler
@@ -1,7 +1,10 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Any, Dict, List
+from typing import TYPE_CHECKING, Any, Dict, FrozenSet, List, Optional
+
+if TYPE_CHECKING:  # pragma: no cover
+    from .parse import FiniData, InitData, Node, PrintData
 
 
 @dataclass
@@ -28,14 +31,128 @@ class GenericMessage:
     result: Any
 
 
+@dataclass
+class _ModelIndex:
+    props: Dict[str, Dict[str, Any]]
+    bases: Dict[str, str]
+    interfaces: Dict[str, FrozenSet[str]]
+    form_interfaces: Dict[str, FrozenSet[str]]
+
+
 @dataclass
 class CortexModel:
     types: Dict[str, Any] = field(default_factory=dict)
     forms: Dict[str, Any] = field(default_factory=dict)
     tagprops: Dict[str, Any] = field(default_factory=dict)
+    interfaces: Dict[str, Any] = field(default_factory=dict)
+    _index: Optional[_ModelIndex] = field(default=None, init=False, repr=False, compare=False)
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CortexModel":
+        """Build a model from ``/api/v1/model`` output, wrapped or not."""
+        if "result" in data and "forms" not in data:
+            data = data["result"]
+        return cls(
+            types=data.get("types") or {},
+            forms=data.get("forms") or {},
+            tagprops=data.get("tagprops") or {},
+            interfaces=data.get("interfaces") or {},
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"types": self.types, "forms": self.forms, "tagprops": self.tagprops, "interfaces": self.interfaces}
+
+    def form_props(self, form: str) -> Dict[str, Any]:
+        """Return the properties of ``form`` keyed by name."""
+        return self._indexes().props.get(form, {})
+
+    def prop(self, form: str, name: str) -> Optional[Dict[str, Any]]:
+        """Return the definition of ``form:name``, or ``None``."""
+        return self.form_props(form).get(name)
+
+    def base_type(self, name: str) -> str:
+        """Return the root type that ``name`` is derived from."""
+        return self._indexes().bases.get(name, name)
+
+    def interface_forms(self, interface: str) -> FrozenSet[str]:
+        """Return the forms implementing ``interface``."""
+        return self._indexes().interfaces.get(interface, frozenset())
+
+    def form_interfaces(self, form: str) -> FrozenSet[str]:
+        """Return the interfaces implemented by ``form``."""
+        return self._indexes().form_interfaces.get(form, frozenset())
+
+    def _indexes(self) -> _ModelIndex:
+        # Built on first lookup so that loading a model stays cheap.
+        if self._index is None:
+            self._index = self._build_index()
+        return self._index
+
+    def _build_index(self) -> _ModelIndex:
+        props: Dict[str, Dict[str, Any]] = {}
+        for name, form in self.forms.items():
+            defs = form.get("props") or {}
+            if isinstance(defs, list):
+                # Model definitions list props as (name, type, info) tuples.
+                defs = {p[0]: {"name": p[0], "type": p[1], "info": p[2] if len(p) > 2 else {}} for p in defs}
+            props[name] = defs
+
+        bases = {}
+        members: Dict[str, set] = {}
+        implements: Dict[str, FrozenSet[str]] = {}
+        for name, typedef in self.types.items():
+            info = typedef.get("info") or {}
+            chain = info.get("bases") or []
+            if chain:
+                bases[name] = chain[0]
+            ifaces = frozenset(info.get("interfaces") or [])
+            if ifaces and name in self.forms:
+                implements[name] = ifaces
+                for iface in ifaces:
+                    members.setdefault(iface, set()).add(name)
+        return _ModelIndex(
+            props=props,
+            bases=bases,
+            interfaces={k: frozenset(v) for k, v in members.items()},
+            form_interfaces=implements,
+        )
 
 
 @dataclass
 class AxonDelete:
     status: str
     result: Dict[str, bool]
+
+
+@dataclass
+class PoolStats:
+    """Connection pool counters reported by ``SynapseClient.pool_stats``."""
+
+    pools: int = 0
+    opened: int = 0
+    requests: int = 0
+    reused: int = 0
+
+
+@dataclass
+class StormResult:
+    """Outcome of one query run by ``SynapseClient.storm_many``.
+
+    ``index`` is the position of the query in the input. When the query
+    failed ``error`` holds the exception and the message lists contain
+    whatever arrived before the failure.
+    """
+
+    index: int
+    query: str
+    opts: Dict[str, Any]
+    init: List[InitData] = field(default_factory=list)
+    nodes: List[Node] = field(default_factory=list)
+    fini: List[FiniData] = field(default_factory=list)
+    prints: List[PrintData] = field(default_factory=list)
+    error: Optional[BaseException] = None
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
@@ -0,0 +1,65 @@
+import sys
+import types
+
+# The unit tests never touch the network. Install a minimal stand-in for
+# ``requests`` so they also run where it is not installed; tests replace the
+# session methods they exercise.
+requests_stub = types.ModuleType("requests")
+adapters_stub = types.ModuleType("requests.adapters")
+
+
+class SessionStub:
+    def __init__(self):
+        self.headers = {}
+        self.adapters = {}
+
+    def mount(self, prefix, adapter):
+        self.adapters[prefix] = adapter
+
+    def close(self):
+        pass
+
+    def post(self, *a, **k):
+        pass
+
+    def get(self, *a, **k):
+        pass
+
+
+class HTTPAdapter:
+    def __init__(self, **kwargs):
+        self.kwargs = kwargs
+
+
+class HTTPError(Exception):
+    pass
+
+
+class RequestException(IOError):
+    pass
+
+
+class ConnectionError(RequestException):
+    pass
+
+
+class Timeout(RequestException):
+    pass
+
+
+def _dummy(*a, **k):
+    raise NotImplementedError
+
+
+requests_stub.Session = SessionStub
+requests_stub.HTTPError = HTTPError
+requests_stub.RequestException = RequestException
+requests_stub.ConnectionError = ConnectionError
+requests_stub.Timeout = Timeout
+requests_stub.get = _dummy
+requests_stub.post = _dummy
+requests_stub.adapters = adapters_stub
+adapters_stub.HTTPAdapter = HTTPAdapter
+
+if sys.modules.setdefault("requests", requests_stub) is requests_stub:
+    sys.modules["requests.adapters"] = adapters_stub
@@ -0,0 +1,91 @@
+import asyncio
+import time
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+
+from gosynapse.aio import AsyncSynapseClient
+from gosynapse.parse import FiniData, InitData, Node
+from gosynapse.testing import FakeCortex, make_node, synthetic_storm
+
+
+@pytest.fixture
+def cortex():
+    with FakeCortex(api_key="key") as cortex:
+        cortex.nodes = [make_node("inet:fqdn", f"host{i}.example.com") for i in range(3)]
+        yield cortex
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def client_for(cortex):
+    return AsyncSynapseClient(host=cortex.host, port=str(cortex.port), api_key="key", scheme="http")
+
+
+def test_storm(cortex):
+    async def go():
+        async with client_for(cortex) as cli:
+            return await cli.storm("inet:fqdn")
+
+    init, nodes, fini, prints = run(go())
+    assert init[0].text == "inet:fqdn"
+    assert [n.data for n in nodes] == [[["inet:fqdn", f"host{i}.example.com"]] for i in range(3)]
+    assert fini[0].count == 3
+    assert prints == []
+
+
+def test_storm_iter_streams_typed_messages(cortex):
+    async def go():
+        async with client_for(cortex) as cli:
+            return [m async for m in cli.storm_iter("inet:fqdn", opts={"view": "v"})]
+
+    messages = run(go())
+    assert isinstance(messages[0], InitData)
+    assert all(isinstance(m, Node) for m in messages[1:-1])
+    assert isinstance(messages[-1], FiniData)
+
+
+def test_concurrent_calls(cortex):
+    async def go():
+        async with client_for(cortex) as cli:
+            put = await cli.axon_put(b"sample")
+            sha256 = put.result["sha256"]
+            results = await asyncio.gather(
+                cli.axon_has(sha256),
+                cli.axon_get(sha256),
+                cli.storm_call("return(1)", []),
+                cli.vars_set({"a": 1}),
+                cli.get_active(),
+            )
+            return results, await cli.vars_get()
+
+    (has, blob, call, _, active), stored = run(go())
+    assert has.result is True
+    assert blob == b"sample"
+    assert call.result == 1
+    assert active.result == {"active": True}
+    assert stored.result == {"a": 1}
+
+
+def test_streams_may_outlive_a_total_timeout(cortex):
+    def slow(query, opts):
+        for line in synthetic_storm(3, query):
+            time.sleep(0.2)
+            yield line
+
+    cortex.storm_handler = slow
+
+    async def go(timeout):
+        async with client_for(cortex) as cli:
+            cli.timeout = timeout
+            return [m async for m in cli.storm_iter("inet:fqdn")]
+
+    assert AsyncSynapseClient(host="h", port="1").timeout.total is None
+    with pytest.raises(asyncio.TimeoutError):
+        run(go(aiohttp.ClientTimeout(total=0.3)))
+    # Only the gaps between reads are bounded, not the whole stream.
+    messages = run(go(aiohttp.ClientTimeout(total=None, sock_read=0.5)))
+    assert len(messages) == 5 and isinstance(messages[-1], FiniData)
@@ -0,0 +1,280 @@
+import hashlib
+import os
+import threading
+
+from gosynapse.cache import AxonCache, ModelCache
+from gosynapse.types import CortexModel, GenericMessage
+
+
+def blob(n):
+    data = bytes([n]) * 100
+    return hashlib.sha256(data).hexdigest(), data
+
+
+def downloader(data, calls):
+    def download(path):
+        calls.append(path)
+        path.write_bytes(data)
+
+    return download
+
+
+def test_axon_cache_hits_and_misses(tmp_path):
+    cache = AxonCache(tmp_path)
+    sha256, data = blob(1)
+    calls = []
+    assert cache.ensure(sha256, downloader(data, calls)).read_bytes() == data
+    mapped = cache.open(sha256, downloader(data, calls))
+    assert mapped[:] == data
+    mapped.close()
+    assert len(calls) == 1
+    assert (cache.stats.hits, cache.stats.misses) == (1, 1)
+
+
+def test_axon_cache_discards_corrupt_entries(tmp_path):
+    cache = AxonCache(tmp_path)
+    sha256, data = blob(2)
+    cache.path(sha256).parent.mkdir()
+    cache.path(sha256).write_bytes(b"garbage")
+    calls = []
+    assert cache.ensure(sha256, downloader(data, calls)).read_bytes() == data
+    assert cache.stats.corrupt == 1 and len(calls) == 1
+
+
+def test_axon_cache_evicts_least_recently_used(tmp_path):
+    cache = AxonCache(tmp_path, max_bytes=350)
+    shas = []
+    for n in range(3):
+        sha256, data = blob(n)
+        cache.ensure(sha256, downloader(data, []))
+        os.utime(cache.path(sha256), (n, n))
+        shas.append(sha256)
+    # Touch the oldest entry so the second one becomes least recently used.
+    assert cache.lookup(shas[0]) is not None
+    sha256, data = blob(3)
+    cache.ensure(sha256, downloader(data, []))
+    assert shas[0] in cache and shas[2] in cache and sha256 in cache
+    assert shas[1] not in cache
+    assert cache.stats.evictions == 1
+
+
+def test_axon_cache_keeps_an_index_across_misses(tmp_path):
+    seeded = AxonCache(tmp_path)
+    shas = []
+    for n in range(3):
+        sha256, data = blob(n)
+        seeded.ensure(sha256, downloader(data, []))
+        os.utime(seeded.path(sha256), (10 - n, 10 - n))
+        shas.append(sha256)
+
+    # A new process orders existing entries by mtime, scanning them once.
+    cache = AxonCache(tmp_path, max_bytes=350)
+
+    def no_scan():
+        raise AssertionError("cache directory rescanned")
+
+    cache._entries = no_scan
+    sha256, data = blob(3)
+    cache.ensure(sha256, downloader(data, []))
+    assert shas[2] not in cache and shas[0] in cache and shas[1] in cache
+    assert cache._size == 300
+
+    # Threads missing on the same blob count it once.
+    barrier = threading.Barrier(2, timeout=5)
+    sha256, data = blob(4)
+
+    def download(path):
+        barrier.wait()
+        path.write_bytes(data)
+
+    threads = [threading.Thread(target=cache.ensure, args=(sha256, download)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache._size == 300 and cache.stats.evictions == 2
+
+
+MODEL = {
+    "types": {
+        "inet:fqdn": {"info": {"bases": ["str"], "interfaces": ["inet:service"]}},
+        "inet:ipv4": {"info": {"bases": ["int"]}},
+    },
+    "forms": {
+        "inet:fqdn": {"props": [["zone", "inet:fqdn", {}]]},
+        "inet:ipv4": {"props": {"asn": {"name": "asn", "type": "inet:asn"}}},
+    },
+}
+
+
+class ModelClient:
+    def __init__(self, version="2.150.0"):
+        self.version = version
+        self.fetches = 0
+        self.infos = 0
+
+    def core_info(self):
+        self.infos += 1
+        return GenericMessage(status="ok", result={"version": self.version})
+
+    def _fetch_model(self):
+        self.fetches += 1
+        return CortexModel.from_dict({"status": "ok", "result": MODEL})
+
+
+def test_model_cache_ttl_and_snapshot(tmp_path):
+    client = ModelClient()
+    cache = ModelCache(tmp_path / "model.json", ttl=60)
+    assert cache.get(client) is cache.get(client)
+    assert client.fetches == 1 and client.infos == 1
+
+    # A new process starts from the snapshot without hitting the network.
+    cold = ModelCache(tmp_path / "model.json", ttl=60)
+    model = cold.get(ModelClient())
+    assert model.forms == MODEL["forms"]
+    assert cold.stats.hits == 1
+
+
+def test_model_cache_revalidates_with_fingerprint(tmp_path):
+    client = ModelClient()
+    cache = ModelCache(tmp_path / "model.json", ttl=0)
+    cache.get(client)
+    cache.get(client)
+    assert client.fetches == 1 and client.infos == 2
+    client.version = "2.151.0"
+    assert not cache.is_fresh(client)
+    cache.get(client)
+    assert client.fetches == 2
+    cache.invalidate()
+    assert not (tmp_path / "model.json").exists()
+
+
+def test_model_cache_ignores_malformed_snapshots(tmp_path):
+    path = tmp_path / "model.json"
+    for text in ('{"saved_at": 1}', "[]", '{"model": 5}', "not json"):
+        path.write_text(text)
+        client = ModelClient()
+        assert ModelCache(path, ttl=60).get(client).forms == MODEL["forms"]
+        assert client.fetches == 1
+
+
+def test_model_cache_fetches_outside_its_lock():
+    barrier = threading.Barrier(2, timeout=5)
+
+    class SlowClient(ModelClient):
+        def _fetch_model(self):
+            # Both callers must be fetching at once to get past here.
+            barrier.wait()
+            return super()._fetch_model()
+
+    client = SlowClient()
+    cache = ModelCache(ttl=60)
+    results = []
+    threads = [threading.Thread(target=lambda: results.append(cache.get(client))) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(results) == 2 and results[0] is results[1]
+    assert cache.get(client) is results[0]
+
+
+def test_model_lazy_indexes():
+    model = CortexModel.from_dict(MODEL)
+    assert model._index is None
+    assert model.prop("inet:fqdn", "zone")["type"] == "inet:fqdn"
+    assert model.prop("inet:ipv4", "asn")["type"] == "inet:asn"
+    assert model.base_type("inet:ipv4") == "int"
+    assert model.interface_forms("inet:service") == {"inet:fqdn"}
+    assert model.form_interfaces("inet:fqdn") == {"inet:service"}
+    assert CortexModel.from_dict(model.to_dict()) == model
+
+
+def test_storm_cache_ttl_lru_and_edits(monkeypatch):
+    from gosynapse.cache import StormCache, is_read_only
+
+    clock = [0.0]
+    monkeypatch.setattr("gosynapse.cache.time.monotonic", lambda: clock[0])
+    cache = StormCache(max_entries=2, ttl=10)
+    calls = []
+
+    def run(name, nodes=1):
+        return lambda: calls.append(name) or ([], [name] * nodes, [], [])
+
+    assert cache.get("inet:fqdn | count", None, run("a")) == ([], ["a"], [], [])
+    cache.get("inet:fqdn | count", None, run("a"))[1].append("mutated")
+    assert cache.get("inet:fqdn | count", None, run("a"))[1] == ["a"]
+    assert calls == ["a"] and cache.stats.hits == 2
+
+    cache.get("inet:ipv4", {"view": "v1"}, run("b"))
+    cache.get("inet:asn", None, run("c"))
+    assert len(cache) == 2 and cache.stats.evictions == 1
+
+    clock[0] = 11
+    cache.get("inet:asn", None, run("c"))
+    assert calls == ["a", "b", "c", "c"]
+
+    assert cache.invalidate("v1") == 1 and len(cache) == 1
+
+    cache.get("[ inet:fqdn=x.com ]", None, run("d"))
+    cache.get("[ inet:fqdn=x.com ]", None, run("d"))
+    assert cache.stats.bypassed == 2 and calls[-2:] == ["d", "d"]
+    assert not is_read_only("inet:fqdn | delnode")
+    assert not is_read_only("$lib.globals.set(x, 1)")
+    assert is_read_only("inet:fqdn#rep.foo -> inet:dns:a | limit 10")
+    for query in (
+        "inet:fqdn=a.com $node.addEdge(refs, $iden)",
+        "inet:fqdn=a.com $node.delEdge(refs, $iden)",
+        "inet:fqdn=a.com $node.setTagProp(rep, score, 10)",
+        "$lib.axon.wget($url)",
+        "$lib.model.ext.addForm(_foo, str, ({}), ({}))",
+        "$lib.view.get().fork()",
+        "$lib.layer.get().SETSOMETHING (1)",
+        "cron.add --hourly 10 { inet:fqdn }",
+        "trigger.add node:add --form inet:fqdn --query { $lib.print(hi) }",
+        "queue.add myqueue",
+        "macro.set enrich { inet:fqdn }",
+        "macro.exec enrich",
+        "inet:fqdn=a.com | note.add hello",
+        "inet:fqdn | copyto $view",
+        "inet:fqdn | scrape --refs",
+        "inet:url | wget",
+        "| wget https://example.com/a.txt",
+        "auth.user.add visi",
+        "auth.user.mod visi --admin $lib.true",
+        "pkg.load https://example.com/pkg.yaml",
+        "gen.ou.org vertex",
+        "inet:fqdn { | model.deprecated.lock * }",
+        "$lib.storm.eval($query)",
+    ):
+        assert not is_read_only(query), query
+    for query in ("cron.list", "inet:fqdn | uniq | limit 10", "$lib.auth.users.list()", "inet:fqdn=gen.example.com"):
+        assert is_read_only(query), query
+
+
+class OkResponse:
+    status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+
+def test_client_storm_cache_invalidates_on_edit(monkeypatch):
+    from gosynapse.cache import StormCache
+    from gosynapse.client import SynapseClient
+
+    cli = SynapseClient(host="h", port="1", storm_cache=StormCache())
+    queries = []
+
+    def storm(query, opts=None, idempotent=False):
+        queries.append(query)
+        return [], [], [], []
+
+    monkeypatch.setattr(cli, "_storm", storm)
+    monkeypatch.setattr(cli, "_request", lambda *a, **k: OkResponse())
+    cli.storm("inet:fqdn | count")
+    cli.storm("inet:fqdn | count")
+    assert queries == ["inet:fqdn | count"]
+    cli._storm_request("[ inet:fqdn=a.com ]")
+    cli.storm("inet:fqdn | count")
+    assert queries == ["inet:fqdn | count"] * 2
@@ -1,30 +1,20 @@
-import types
-import sys
+import hashlib
+import time
+from types import SimpleNamespace
 
-requests_stub = types.ModuleType("requests")
-class SessionStub:
-    def post(self, *a, **k):
-        pass
-
-    def get(self, *a, **k):
-        pass
-class HTTPError(Exception):
-    pass
-requests_stub.Session = SessionStub
-requests_stub.HTTPError = HTTPError
-def _dummy(*a, **k):
-    raise NotImplementedError
-requests_stub.get = _dummy
-requests_stub.post = _dummy
-sys.modules.setdefault("requests", requests_stub)
+import pytest
+import requests
 
 from gosynapse.client import SynapseClient, InitData
 from gosynapse import client as client_module
+from gosynapse.metrics import HistogramMetrics
+from gosynapse.testing import FakeCortex
 
 class FakeResponse:
     def __init__(self, status_code, content=b''):
         self.status_code = status_code
         self.content = content
+        self.closed = False
     class HTTPError(Exception):
         pass
 
@@ -32,6 +22,13 @@ class FakeResponse:
         if self.status_code >= 400:
             raise self.HTTPError(f"{self.status_code} error")
 
+    def iter_content(self, chunk_size=None):
+        for i in range(0, len(self.content), 5):
+            yield self.content[i:i + 5]
+
+    def close(self):
+        self.closed = True
+
 
 def test_storm_post_fallback_to_get(monkeypatch):
     """POST is attempted first and GET is used if POST returns 404."""
@@ -57,3 +54,331 @@ def test_storm_post_fallback_to_get(monkeypatch):
     assert init == result_tuple[0]
     assert prints == result_tuple[3]
     assert captured["data"] == b"data"
+    # The 404 response is released before the GET is sent.
+    assert post_resp.closed
+
+
+def test_storm_closes_failed_streamed_responses(monkeypatch):
+    cli = SynapseClient(host="h", port="1")
+    post_resp = FakeResponse(404)
+    get_resp = FakeResponse(500)
+    monkeypatch.setattr(cli.session, "post", lambda *a, **k: post_resp)
+    monkeypatch.setattr(cli.session, "get", lambda *a, **k: get_resp)
+
+    with pytest.raises(FakeResponse.HTTPError):
+        cli.storm("foo")
+    assert post_resp.closed and get_resp.closed
+
+
+def test_storm_iter_yields_messages_incrementally(monkeypatch):
+    cli = SynapseClient(host="h", port="1")
+    body = (
+        b'["init", {"tick": 1, "text": "", "abstick": 0, "hash": "", "task": ""}]\n'
+        b'["print", {"mesg": "hi"}]\n'
+        b'["fini", {"tock": 1, "abstock": 1, "took": 1, "count": 0}]\n'
+    )
+    resp = FakeResponse(200, body)
+    monkeypatch.setattr(cli.session, "post", lambda *a, **k: resp)
+
+    messages = cli.storm_iter("foo")
+    first = next(messages)
+    assert isinstance(first, InitData)
+    rest = list(messages)
+    assert [type(m).__name__ for m in rest] == ["PrintData", "FiniData"]
+    assert resp.closed
+
+
+def test_storm_many_isolates_failures_and_keeps_order(monkeypatch):
+    cli = SynapseClient(host="h", port="1")
+    node = b'["node", [["inet:fqdn", "%s"], {"iden": "%s", "tags": {}, "props": {}, "tagprops": {}, "nodedata": {}, "path": {}}]]\n'
+    seen = []
+
+    def post(url, json=None, timeout=None, **kwargs):
+        fqdn = json["opts"]["vars"]["fqdn"]
+        seen.append((json["query"], timeout))
+        if fqdn == "bad":
+            return FakeResponse(500)
+        return FakeResponse(200, node % (fqdn.encode(), fqdn.encode()))
+
+    monkeypatch.setattr(cli.session, "post", post)
+    items = [{"fqdn": "a.com"}, {"fqdn": "bad"}, {"fqdn": "b.com"}]
+    results = list(
+        cli.storm_many(items, query="inet:fqdn=$fqdn", opts={"vars": {"x": 1}}, concurrency=2, ordered=True, timeout=5)
+    )
+
+    assert [r.index for r in results] == [0, 1, 2]
+    assert [r.ok for r in results] == [True, False, True]
+    assert results[2].nodes[0].info.iden == "b.com" and results[2].opts["vars"] == {"x": 1, "fqdn": "b.com"}
+    query, timeout = seen[0]
+    assert query == "inet:fqdn=$fqdn" and 0 < timeout[0] <= 5 and 0 < timeout[1] <= 5
+
+
+def test_storm_many_cuts_off_stalled_queries(monkeypatch):
+    cli = SynapseClient(host="h", port="1")
+    timeouts = []
+
+    class Stalled(FakeResponse):
+        def iter_content(self, chunk_size=None):
+            yield b'["print", {"mesg": "first"}]\n'
+            # What a read timeout of the remaining budget does to the stream.
+            time.sleep(timeouts[-1][1])
+            raise requests.ConnectionError("Read timed out.")
+
+    def post(url, timeout=None, **kwargs):
+        timeouts.append(timeout)
+        return Stalled(200)
+
+    monkeypatch.setattr(cli.session, "post", post)
+    start = time.monotonic()
+    result, = cli.storm_many(["inet:fqdn"], timeout=0.2)
+    assert time.monotonic() - start < 0.4
+    assert timeouts[0][1] <= 0.2
+    assert isinstance(result.error, TimeoutError) and len(result.prints) == 1
+
+
+def test_storm_seeds_batches_and_maps_back(monkeypatch):
+    cli = SynapseClient(host="h", port="1")
+    info = b'{"iden": "i", "tags": {}, "props": {}, "tagprops": {}, "nodedata": {}, "path": {}}'
+    batches = []
+
+    def post(url, json=None, **kwargs):
+        vals = json["opts"]["vars"]["vals"]
+        batches.append(vals)
+        lines = [b'["node", [["inet:ipv4", %d], %s]]' % (v, info) for v in vals]
+        lines.append(b'["node", [["inet:asn", 99], %s]]' % info)
+        return FakeResponse(200, b"\n".join(lines) + b"\n")
+
+    monkeypatch.setattr(cli.session, "post", post)
+    pairs = list(cli.storm_seeds("for $v in $vals { inet:ipv4=$v }", [1, 2, 2, 3, 4, 5], max_batch=3))
+
+    assert batches == [[1, 2], [3, 4, 5]]
+    assert [seed for seed, _ in pairs] == [1, 2, None, 3, 4, 5, None]
+    assert pairs[0][1].ndef == ("inet:ipv4", 1)
+
+
+def test_pool_and_timeout_settings(monkeypatch):
+    cli = SynapseClient(host="h", port="1", pool_maxsize=32, keep_alive=False, timeout=(1, 2))
+    adapter = cli.session.adapters["https://"]
+    assert adapter is cli.session.adapters["http://"]
+    assert adapter.kwargs == {"pool_connections": 10, "pool_maxsize": 32}
+    assert cli.session.headers["Connection"] == "close"
+
+    captured = {}
+
+    def fake_get(url, **kwargs):
+        captured.update(kwargs, url=url)
+        return FakeResponse(200)
+
+    monkeypatch.setattr(cli.session, "get", fake_get)
+    cli.logout()
+    assert captured["url"] == "https://h:1/api/v1/logout"
+    assert captured["timeout"] == (1, 2)
+
+
+def test_passed_session_keeps_its_adapters():
+    session = requests.Session()
+    session.mount("https://", "custom")
+    cli = SynapseClient(host="h", port="1", session=session)
+    assert cli.session is session and session.adapters == {"https://": "custom"}
+
+    cli = SynapseClient(host="h", port="1", session=session, pool_maxsize=4)
+    assert session.adapters["https://"].kwargs == {"pool_connections": 10, "pool_maxsize": 4}
+
+
+class PoolAdapter:
+    def __init__(self, poolmanager):
+        self.poolmanager = poolmanager
+
+
+def test_pool_stats_against_urllib3():
+    # requests is stubbed in the tests, but its adapters keep urllib3 pools.
+    urllib3 = pytest.importorskip("urllib3")
+    cli = SynapseClient(host="h", port="1")
+    manager = urllib3.PoolManager()
+    cli.session.adapters = {"http://": PoolAdapter(manager), "mock://": object()}
+    with FakeCortex() as cortex:
+        assert cli.pool_stats().requests == 0
+        for _ in range(3):
+            manager.request("GET", f"http://127.0.0.1:{cortex.port}/api/v1/logout")
+        stats = cli.pool_stats()
+    assert (stats.pools, stats.opened, stats.requests, stats.reused) == (1, 1, 3, 2)
+
+
+def test_pool_stats_skips_pools_without_counters():
+    cli = SynapseClient(host="h", port="1")
+    manager = SimpleNamespace(pools={"key": object()})
+    cli.session.adapters = {"https://": PoolAdapter(manager)}
+    stats = cli.pool_stats()
+    assert (stats.pools, stats.opened, stats.requests) == (1, 0, 0)
+
+
+class JsonResponse(FakeResponse):
+    def __init__(self, data, content=b""):
+        super().__init__(200, content)
+        self._data = data
+
+    def json(self):
+        return self._data
+
+
+def _drain(body):
+    if hasattr(body, "read"):
+        return b"".join(iter(lambda: body.read(3), b""))
+    return b"".join(body)
+
+
+def test_axon_put_streams_and_hashes(monkeypatch, tmp_path):
+    cli = SynapseClient(host="h", port="1")
+    blob = b"0123456789" * 10
+    sha256 = hashlib.sha256(blob).hexdigest()
+    uploads = []
+
+    def fake_post(url, data=None, **kwargs):
+        uploads.append(_drain(data))
+        return JsonResponse({"status": "ok", "result": {"size": len(blob), "sha256": sha256}})
+
+    monkeypatch.setattr(cli.session, "post", fake_post)
+    path = tmp_path / "blob"
+    path.write_bytes(blob)
+    cli.axon_put(path)
+    cli.axon_put(iter([blob[:7], blob[7:]]))
+    cli.axon_put(blob)
+    assert uploads == [blob, blob, blob]
+
+    def bad_post(url, data=None, **kwargs):
+        _drain(data)
+        return JsonResponse({"status": "ok", "result": {"size": 1, "sha256": "00"}})
+
+    monkeypatch.setattr(cli.session, "post", bad_post)
+    with pytest.raises(ValueError):
+        cli.axon_put(blob)
+
+
+def test_axon_get_streams_to_path_and_verifies(monkeypatch, tmp_path):
+    cli = SynapseClient(host="h", port="1")
+    blob = b"sample data" * 7
+    sha256 = hashlib.sha256(blob).hexdigest()
+    monkeypatch.setattr(cli.session, "get", lambda *a, **k: FakeResponse(200, blob))
+
+    dest = tmp_path / "out"
+    assert cli.axon_get(sha256, dest) == dest
+    assert dest.read_bytes() == blob
+    mapped = cli.axon_get_mmap(sha256)
+    assert mapped[:] == blob
+    mapped.close()
+
+    with pytest.raises(ValueError):
+        cli.axon_get("0" * 64, tmp_path / "bad")
+    assert not (tmp_path / "bad").exists()
+    assert list(tmp_path.iterdir()) == [dest]
+
+
+def test_axon_get_releases_failed_downloads(monkeypatch, tmp_path):
+    metrics = HistogramMetrics()
+    cli = SynapseClient(host="h", port="1", metrics=metrics)
+    missing = FakeResponse(404)
+    monkeypatch.setattr(cli.session, "get", lambda *a, **k: missing)
+
+    with pytest.raises(FakeResponse.HTTPError):
+        cli.axon_get("0" * 64, tmp_path / "out")
+    assert missing.closed
+    assert metrics.summary()["axon_get"]["errors"] == 1
+    assert not (tmp_path / "out").exists()
+
+
+def test_axon_many_helpers(monkeypatch, tmp_path):
+    cli = SynapseClient(host="h", port="1")
+    blobs = {hashlib.sha256(d).hexdigest(): d for d in (b"a", b"b", b"c")}
+    stored = {sha: blobs[sha] for sha in list(blobs)[:2]}
+    has_calls = []
+
+    def fake_get(url, **kwargs):
+        sha256 = url.rsplit("/", 1)[1]
+        if "/has/" in url:
+            if sha256 == "bad":
+                raise ValueError("bad sha256")
+            has_calls.append(sha256)
+            return JsonResponse({"status": "ok", "result": sha256 in stored})
+        if sha256 not in stored:
+            return FakeResponse(404)
+        return FakeResponse(200, stored[sha256])
+
+    def fake_post(url, data=None, **kwargs):
+        blob = _drain(data)
+        sha256 = hashlib.sha256(blob).hexdigest()
+        stored[sha256] = blob
+        return JsonResponse({"status": "ok", "result": {"size": len(blob), "sha256": sha256}})
+
+    monkeypatch.setattr(cli.session, "get", fake_get)
+    monkeypatch.setattr(cli.session, "post", fake_post)
+
+    order = list(blobs) * 2
+    assert list(cli.axon_has_many(order, workers=3, ordered=True)) == [(sha, sha in stored) for sha in blobs]
+    assert sorted(has_calls) == sorted(blobs)
+    missing = list(blobs)[2]
+    assert cli.axon_missing(order) == [missing]
+
+    results = dict(cli.axon_has_many(["bad"] + order, workers=2))
+    assert isinstance(results.pop("bad"), Exception)
+    assert results == {sha: sha in stored for sha in blobs}
+    with pytest.raises(ValueError):
+        cli.axon_missing(["bad"] + order)
+
+    results = dict(cli.axon_get_many(order, tmp_path / "out", workers=2))
+    assert results[list(blobs)[0]].read_bytes() == b"a"
+    assert isinstance(results[missing], Exception)
+
+    paths = []
+    for i, blob in enumerate([b"a", b"c", b"c"]):
+        path = tmp_path / f"in{i}"
+        path.write_bytes(blob)
+        paths.append(path)
+    uploaded = {p: up for p, _, up in cli.axon_put_missing(paths, workers=2)}
+    assert uploaded[paths[0]] is False
+    assert sum(uploaded.values()) == 1
+    assert stored[missing] == b"c"
+
+    # A file that cannot be read is reported without stopping the batch.
+    paths.insert(1, tmp_path / "gone")
+    (tmp_path / "in3").write_bytes(b"d")
+    paths.append(tmp_path / "in3")
+    results = {p: (sha, up) for p, sha, up in cli.axon_put_missing(paths, workers=2)}
+    sha, error = results.pop(tmp_path / "gone")
+    assert sha is None and isinstance(error, FileNotFoundError)
+    assert results[tmp_path / "in3"] == (hashlib.sha256(b"d").hexdigest(), True)
+    assert stored[hashlib.sha256(b"d").hexdigest()] == b"d"
+
+
+def test_storm_does_not_log_bodies_and_captures_on_demand(monkeypatch, tmp_path, caplog):
+    import json
+    import logging
+
+    from gosynapse.debug import BodyCapture
+
+    capture = BodyCapture(tmp_path / "bodies.jsonl", max_bytes=10)
+    cli = SynapseClient(host="h", port="1", body_capture=capture)
+    body = b'["print", {"mesg": "secret-body"}]\n'
+    monkeypatch.setattr(cli.session, "post", lambda *a, **k: FakeResponse(200, body))
+
+    with caplog.at_level(logging.DEBUG):
+        cli.storm("foo")
+        list(cli.storm_iter("bar"))
+    assert "secret-body" not in caplog.text
+
+    records = [json.loads(line) for line in (tmp_path / "bodies.jsonl").read_text().splitlines()]
+    assert [(r["op"], r["query"], r["size"], r["truncated"]) for r in records] == [
+        ("storm", "foo", len(body), True),
+        ("storm_iter", "bar", len(body), True),
+    ]
+    assert records[1]["body"] == body[:10].decode()
+
+
+def test_body_capture_sampling_and_file_cap(tmp_path):
+    from gosynapse.debug import BodyCapture
+
+    never = BodyCapture(tmp_path / "a.jsonl", sample_rate=0.0)
+    assert not any(never.sampled() for _ in range(100))
+    capped = BodyCapture(tmp_path / "b.jsonl", max_file_bytes=300)
+    for _ in range(10):
+        capped.write("storm", "q", b"x" * 50, 50)
+    assert 0 < (tmp_path / "b.jsonl").stat().st_size <= 300
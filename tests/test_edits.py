@@ -0,0 +1,196 @@
+import http.client
+import json
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+import requests
+
+from gosynapse import jsonbackend
+from gosynapse.client import StormStream
+from gosynapse.edits import EditConsumer
+from gosynapse.parse import FireData, InitData, StormError, NodeEditsData, iter_json_stream, parse_json_stream
+from gosynapse.retry import RetryPolicy
+from gosynapse.testing import FakeCortex
+
+
+def fire_line(offs):
+    edits = [[f"{offs:064x}", "inet:fqdn", [[0, [f"host{offs}.com", 6], []]]]]
+    return json.dumps(["storm:fire", {"type": "edits", "data": {"offs": offs, "edits": edits}}]).encode() + b"\n"
+
+
+@pytest.mark.parametrize("backend", jsonbackend.available_backends())
+def test_edit_messages_are_parsed(backend):
+    raw = (
+        b'["init", {"tick": 1, "text": "", "abstick": 1, "hash": "", "task": ""}]\n'
+        b'["node:edits", {"edits": [["ab", "inet:fqdn", [[0, ["x.com", 6], []]]]]}]\n'
+        + fire_line(3)
+        + b'["node:edits:count", {"count": 1}]\n'
+    )
+    messages = list(iter_json_stream([raw], backend=jsonbackend.load_backend(backend)))
+    assert isinstance(messages[0], InitData)
+    assert messages[1] == NodeEditsData(edits=[["ab", "inet:fqdn", [[0, ["x.com", 6], []]]]])
+    assert isinstance(messages[2], FireData) and messages[2].type == "edits"
+    assert messages[2].data["offs"] == 3
+    assert len(messages) == 3
+    # The tuple API is unchanged.
+    assert [len(part) for part in parse_json_stream(raw)] == [1, 0, 0, 0]
+
+
+class EditLogClient:
+    """Serves an edit log of ``count`` entries from the requested offset.
+
+    With ``tail``, the stream ends with those raw lines instead of idling
+    until it times out.
+    """
+
+    def __init__(self, count, fail_at=None, error=None, tail=None):
+        self.count = count
+        self.fail_at = fail_at
+        self.error = error or requests.ConnectionError("link dropped")
+        self.tail = tail
+        self.offsets = []
+
+    def storm_iter(self, query, opts=None, timeout=None):
+        offs = opts["vars"]["offs"]
+        self.offsets.append(offs)
+        raw = b"".join(fire_line(i) for i in range(offs, self.count)) + (self.tail or b"")
+        for message in iter_json_stream([raw]):
+            if isinstance(message, FireData) and message.data["offs"] == self.fail_at:
+                self.fail_at = None
+                raise self.error
+            yield message
+        if self.tail is None:
+            raise requests.Timeout("idle")
+
+
+def test_consumer_batches_resumes_and_persists_offset(tmp_path):
+    client = EditLogClient(10, fail_at=6)
+    batches = []
+    path = tmp_path / "offset.json"
+    consumer = EditConsumer(
+        client, batches.append, offset_path=path, batch_size=4, batch_wait=0.2, retry=RetryPolicy(backoff=0)
+    )
+
+    assert consumer.run(max_entries=10) == 10
+    offsets = [entry.offset for batch in batches for entry in batch]
+    assert offsets == list(range(10))
+    assert all(len(batch) <= 4 for batch in batches)
+    assert batches[0][0].edits[0][1] == "inet:fqdn"
+    # The dropped stream was reopened where it left off, not from the start.
+    assert client.offsets[:2] == [0, 6]
+    assert json.loads(path.read_text())["offset"] == 10
+
+    client = EditLogClient(12)
+    batches = []
+    resumed = EditConsumer(client, batches.append, offset_path=path, batch_wait=0.1, retry=RetryPolicy(backoff=0))
+    assert resumed.offset == 10
+    assert resumed.run(max_entries=2) == 2
+    assert [entry.offset for batch in batches for entry in batch] == [10, 11]
+    assert client.offsets[0] == 10
+
+
+def test_consumer_redelivers_after_callback_failure(tmp_path):
+    client = EditLogClient(3)
+    path = tmp_path / "offset.json"
+
+    def fail(batch):
+        raise RuntimeError("sink down")
+
+    consumer = EditConsumer(client, fail, offset_path=path, batch_wait=0.1, retry=RetryPolicy(backoff=0))
+    with pytest.raises(RuntimeError):
+        consumer.run()
+    assert consumer.offset == 0 and not path.exists()
+
+    seen = []
+    consumer.callback = seen.extend
+    consumer.run(max_entries=3)
+    assert [entry.offset for entry in seen] == [0, 1, 2]
+
+
+def test_consumer_raises_non_transient_errors():
+    client = EditLogClient(5, fail_at=0, error=requests.HTTPError("403"))
+    consumer = EditConsumer(client, lambda batch: None, batch_wait=0.1)
+    with pytest.raises(requests.HTTPError):
+        consumer.run()
+
+
+def test_consumer_raises_storm_errors():
+    client = EditLogClient(2, tail=b'["err", ["NoSuchLayer", {"mesg": "No such layer"}]]\n')
+    seen = []
+    consumer = EditConsumer(client, seen.extend, batch_wait=0.1, retry=RetryPolicy(backoff=0))
+    with pytest.raises(StormError) as info:
+        consumer.run()
+    assert info.value.code == "NoSuchLayer"
+    assert client.offsets == [0]
+
+
+def test_consumer_reconnects_after_a_stream_without_fini(caplog):
+    client = EditLogClient(3, tail=b"")
+    seen = []
+    consumer = EditConsumer(client, seen.extend, batch_wait=0.1, retry=RetryPolicy(backoff=0))
+    assert consumer.run(max_entries=3) == 3
+    assert [entry.offset for entry in seen] == [0, 1, 2]
+    assert client.offsets[:2] == [0, 3]
+    assert "without a fini message" in caplog.text
+
+
+def test_offset_file_is_tied_to_its_layer(tmp_path):
+    path = tmp_path / "offset.json"
+    path.write_text(json.dumps({"offset": 5, "layer": "a", "view": None}))
+    assert EditConsumer(EditLogClient(0), print, layer="a", offset_path=path).offset == 5
+    with pytest.raises(ValueError):
+        EditConsumer(EditLogClient(0), print, layer="b", offset_path=path)
+
+
+class HttpClient:
+    """Streams Storm queries from a FakeCortex over a real socket.
+
+    ``requests`` is stubbed in the tests, so the response is read with
+    http.client, whose socket StormStream.abort() shuts down the same way.
+    """
+
+    def __init__(self, port):
+        self.port = port
+        self.streams = []
+
+    def storm_iter(self, query, opts=None, timeout=None):
+        stream = StormStream()
+        stream._messages = self._messages(query, opts, stream)
+        self.streams.append(stream)
+        return stream
+
+    def _messages(self, query, opts, stream):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port)
+        try:
+            conn.request("POST", "/api/v1/storm", body=json.dumps({"query": query, "opts": opts or {}}))
+            resp = conn.getresponse()
+            stream._attach(SimpleNamespace(raw=SimpleNamespace(_fp=resp)))
+            yield from iter_json_stream(iter(lambda: resp.read1(4096), b""))
+        finally:
+            conn.close()
+
+
+def test_run_aborts_the_long_poll_when_it_returns():
+    release = threading.Event()
+
+    def handler(query, opts):
+        yield from (fire_line(i) for i in range(3))
+        # Wait for more edits, as edits(wait=$lib.true) does.
+        release.wait(10)
+
+    try:
+        with FakeCortex() as cortex:
+            cortex.storm_handler = handler
+            client = HttpClient(cortex.port)
+            consumer = EditConsumer(client, lambda batch: None, batch_wait=0.1, retry=RetryPolicy(backoff=0))
+            start = time.monotonic()
+            assert consumer.run(max_entries=3) == 3
+            assert client.streams[-1].aborted
+            while any(t.name == "gosynapse-edits" for t in threading.enumerate()):
+                assert time.monotonic() - start < 3
+                time.sleep(0.01)
+    finally:
+        release.set()
+    assert len(client.streams) == 1
@@ -0,0 +1,176 @@
+import json
+import urllib.request
+
+import pytest
+import requests
+
+from gosynapse.export import INT_NULL, ColumnarExporter, ResumableExport, ResumeError, export_nodes, load_numpy
+from gosynapse.parse import Node, StormError, iter_json_stream, raise_errors
+from gosynapse.replay import StormRecording
+from gosynapse.retry import RetryPolicy
+from gosynapse.testing import FakeCortex
+from gosynapse.types import CortexModel
+
+
+def node_line(form, valu, iden, props, tags=("rep",)):
+    info = {"iden": iden, "tags": {t: [None, None] for t in tags}, "props": props, "tagprops": {}, "nodedata": {}, "path": {}}
+    return json.dumps(["node", [[form, valu], info]]).encode() + b"\n"
+
+
+STREAM = (
+    b'["init", {"tick": 1, "text": "", "abstick": 1, "hash": "", "task": ""}]\n'
+    + node_line("inet:fqdn", "a.com", "1", {"zone": "a.com", ".created": 1700000000000})
+    + node_line("inet:ipv4", 16909060, "2", {"asn": 5})
+    + node_line("inet:fqdn", "b.com", "3", {"zone": "b.com", "issuffix": True})
+    + node_line("inet:fqdn", "c.com", "4", {"zone": 5, "extra": [1, 2]}, tags=())
+)
+
+
+@pytest.mark.parametrize("fmt", ["parquet", "arrow"])
+def test_export_arrow_formats(tmp_path, fmt):
+    pa = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    import pyarrow.parquet as pq
+
+    counts = export_nodes(iter_json_stream([STREAM]), tmp_path, format=fmt, batch_size=2)
+    assert counts == {"inet:fqdn": 3, "inet:ipv4": 1}
+    path = tmp_path / f"inet_fqdn.{fmt}"
+    table = pq.read_table(path) if fmt == "parquet" else pa.ipc.open_file(path).read_all()
+    assert table.schema.field(".created").type == pa.int64()
+    assert table.schema.field("issuffix").type == pa.bool_()
+    rows = table.to_pylist()
+    assert [row["valu"] for row in rows] == ["a.com", "b.com", "c.com"]
+    assert rows[0]["tags"] == ["rep"] and rows[2]["tags"] == []
+    # Props that do not fit the schema fixed by the first batch go to _extra.
+    assert rows[2]["zone"] is None
+    assert json.loads(rows[2]["_extra"]) == {"zone": 5, "extra": [1, 2]}
+
+
+def test_export_numpy_batches(tmp_path):
+    pytest.importorskip("numpy")
+    model = CortexModel.from_dict({"types": {"inet:ipv4": {"info": {"bases": ["int"]}}}, "forms": {}})
+    with ColumnarExporter(tmp_path, format="numpy", batch_size=1, model=model) as exporter:
+        assert exporter.write_many(iter_json_stream([STREAM])) == 4
+    fqdns = load_numpy(tmp_path / "inet_fqdn")
+    assert list(fqdns["valu"]) == ["a.com", "b.com", "c.com"]
+    assert list(fqdns[".created"]) == [1700000000000, INT_NULL, INT_NULL]
+    assert load_numpy(tmp_path / "inet_ipv4")["valu"][0] == 16909060
+
+
+def test_export_rejects_unknown_format(tmp_path):
+    with pytest.raises(ValueError):
+        ColumnarExporter(tmp_path, format="csv")
+
+
+FINI = b'["fini", {"tock": 1, "abstock": 1, "took": 1, "count": 0}]\n'
+
+
+class FlakyClient:
+    """Yields ``count`` nodes, failing once after ``fail_after`` of them."""
+
+    retry = RetryPolicy()
+
+    def __init__(self, count, fail_after=None):
+        self.idens = [f"{i:04d}" for i in range(count)]
+        self.fail_after = fail_after
+        self.queries = []
+
+    def storm_iter(self, query, opts):
+        self.queries.append((query, opts))
+        skip = opts.get("vars", {}).get("__gs_skip", 0)
+        start = max(skip - 1, 0)
+        stream = b"".join(node_line("inet:fqdn", f"{iden}.com", iden, {}) for iden in self.idens[start:]) + FINI
+        for n, message in enumerate(iter_json_stream([stream]), start=start):
+            if n == self.fail_after:
+                self.fail_after = None
+                raise requests.ConnectionError("link dropped")
+            yield message
+
+
+def test_resumable_export_resumes_after_failure(tmp_path):
+    client = FlakyClient(25, fail_after=12)
+    export = ResumableExport(client, "inet:fqdn", tmp_path / "out.jsonl", checkpoint_every=5, backoff=0)
+    state = export.run()
+
+    assert state.done and state.count == 25 and state.last_iden == "0024"
+    assert export.verify()
+    assert "$__gs_skip" in client.queries[1][0] and client.queries[1][1]["vars"] == {"__gs_skip": 10}
+    with StormRecording(tmp_path / "out.jsonl") as rec:
+        assert [node.info.iden for node in rec] == client.idens
+    # A finished export is not run again.
+    assert export.run().count == 25 and len(client.queries) == 2
+
+
+def test_resumable_export_detects_changed_results(tmp_path):
+    client = FlakyClient(20, fail_after=7)
+    export = ResumableExport(client, "inet:fqdn", tmp_path / "out.jsonl", checkpoint_every=5, retries=0)
+    with pytest.raises(requests.ConnectionError):
+        export.run()
+    client.idens[4] = "other"
+    with pytest.raises(ResumeError):
+        export.run()
+    assert export.verify()
+
+
+class UrllibClient:
+    """Runs Storm queries against a FakeCortex the way SynapseClient.storm_iter does."""
+
+    retry = RetryPolicy()
+
+    def __init__(self, port):
+        self.url = f"http://127.0.0.1:{port}/api/v1/storm"
+
+    def storm_iter(self, query, opts):
+        body = json.dumps({"query": query, "opts": opts, "stream": "jsonlines"}).encode()
+        with urllib.request.urlopen(urllib.request.Request(self.url, data=body, method="POST")) as resp:
+            yield from raise_errors(iter_json_stream(iter(lambda: resp.read1(4096), b"")))
+
+
+def test_resumable_export_resumes_after_streams_without_fini(tmp_path):
+    idens = [f"{i:04d}" for i in range(12)]
+    runs = []
+
+    def handler(query, opts):
+        skip = opts.get("vars", {}).get("__gs_skip", 0)
+        runs.append(skip)
+        lines = [node_line("inet:fqdn", f"{iden}.com", iden, {}) for iden in idens[max(skip - 1, 0):]]
+        if len(runs) < 3:
+            # Cut off on a line boundary: no err and no fini.
+            return lines[:7 if len(runs) == 1 else 3]
+        return lines + [FINI]
+
+    with FakeCortex() as cortex:
+        cortex.storm_handler = handler
+        export = ResumableExport(UrllibClient(cortex.port), "inet:fqdn", tmp_path / "out.jsonl", checkpoint_every=3, backoff=0)
+        state = export.run()
+
+    assert runs == [0, 6, 6]
+    assert state.done and state.count == 12 and export.verify()
+    with StormRecording(tmp_path / "out.jsonl") as rec:
+        assert [node.info.iden for node in rec] == idens
+
+
+def test_resumable_export_raises_storm_errors_at_once(tmp_path):
+    runs = []
+
+    def handler(query, opts):
+        runs.append(query)
+        return [node_line("inet:fqdn", "a.com", "0001", {}), ["err", ["BadSyntax", {"mesg": "bad query"}]]]
+
+    with FakeCortex() as cortex:
+        cortex.storm_handler = handler
+        export = ResumableExport(UrllibClient(cortex.port), "inet:fqdn", tmp_path / "out.jsonl", backoff=10)
+        with pytest.raises(StormError) as info:
+            export.run()
+
+    assert info.value.code == "BadSyntax"
+    assert len(runs) == 1
+
+
+def test_storm_errors_raise():
+    stream = node_line("inet:fqdn", "a.com", "1", {}) + b'["err", ["BadSyntax", {"mesg": "bad", "at": 3}]]\n' + FINI
+    messages = raise_errors(iter_json_stream([stream]))
+    assert isinstance(next(messages), Node)
+    with pytest.raises(StormError) as info:
+        next(messages)
+    assert (info.value.code, info.value.mesg, info.value.info["at"]) == ("BadSyntax", "bad", 3)
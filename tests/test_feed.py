@@ -0,0 +1,95 @@
+import json
+import threading
+
+from gosynapse.batch import imap_bounded, iter_batches
+from gosynapse.feed import feed_bulk
+from gosynapse.retry import RetryPolicy
+
+
+class Resp:
+    def __init__(self, data, status=200):
+        self._data = data
+        self.status_code = status
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise RuntimeError(f"{self.status_code} error")
+
+    def json(self):
+        return self._data
+
+
+class FakeClient:
+    retry = RetryPolicy()
+
+    def __init__(self, fail_first=0, reject=False, status=503):
+        self.bodies = []
+        self.fail_first = fail_first
+        self.reject = reject
+        self.status = status
+        self.calls = 0
+        self.lock = threading.Lock()
+
+    def _request(self, method, path, op="", data=None, headers=None):
+        assert (method, path) == ("POST", "/api/v1/feed")
+        with self.lock:
+            self.calls += 1
+            if self.calls <= self.fail_first:
+                return Resp(None, status=self.status)
+            self.bodies.append(json.loads(data))
+        if self.reject:
+            return Resp({"status": "err", "code": "BadTypeValu", "mesg": "bad"})
+        return Resp({"status": "ok", "result": None})
+
+
+def records(count):
+    for i in range(count):
+        yield [["inet:fqdn", f"host{i}.example.com"], {}]
+
+
+def test_iter_batches_by_count_and_bytes():
+    assert list(iter_batches(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(iter_batches(["aa", "bb", "c", "dddd"], 10, max_bytes=4)) == [["aa", "bb"], ["c"], ["dddd"]]
+
+
+def test_imap_bounded_ordered():
+    results = [(i, f.result()) for i, _, f in imap_bounded(lambda x: x * 2, range(20), 4, ordered=True)]
+    assert results == [(i, i * 2) for i in range(20)]
+
+
+def test_feed_bulk_batches_all_records():
+    client = FakeClient()
+    seen = []
+    report = feed_bulk(client, records(25), view="v", batch_size=10, workers=3, progress=lambda r: seen.append(r.batches))
+    assert report.records == 25
+    assert report.batches == 3
+    assert report.errors == []
+    assert seen == [1, 2, 3]
+    assert all(body["name"] == "syn.nodes" and body["view"] == "v" for body in client.bodies)
+    items = sorted(item[0][1] for body in client.bodies for item in body["items"])
+    assert items == sorted(f"host{i}.example.com" for i in range(25))
+
+
+def test_feed_bulk_retries_and_reports_errors():
+    client = FakeClient(fail_first=1)
+    report = feed_bulk(client, records(5), batch_size=5, workers=1, backoff=0)
+    assert report.records == 5 and report.errors == []
+
+    client = FakeClient(reject=True)
+    report = feed_bulk(client, records(5), batch_size=2, workers=2, backoff=0)
+    assert report.records == 0
+    assert report.failed_records == 5
+    assert [e.attempts for e in report.errors] == [1, 1, 1]
+    assert client.calls == 3
+
+
+def test_feed_bulk_does_not_retry_client_errors():
+    client = FakeClient(fail_first=5, status=400)
+    report = feed_bulk(client, records(5), batch_size=5, workers=1, backoff=0)
+    assert client.calls == 1
+    assert report.failed_records == 5 and report.errors[0].attempts == 1
+
+    client = FakeClient(fail_first=5, status=429)
+    report = feed_bulk(client, records(5), batch_size=5, workers=1, retries=2, backoff=0)
+    assert client.calls == 3
+    assert report.errors[0].attempts == 3
@@ -1,3 +1,7 @@
+import json
+import threading
+import time
+
 import requests
 from gosynapse.healthcheck import main
 
@@ -19,6 +23,9 @@ class Resp:
         for ch in self._stream:
             yield ch
 
+    def close(self):
+        pass
+
 
 def test_main_success(monkeypatch, capsys):
     monkeypatch.setenv("SYNAPSE_HOST", "h")
@@ -26,25 +33,30 @@ def test_main_success(monkeypatch, capsys):
     monkeypatch.setenv("SYNAPSE_API_KEY", "k")
     monkeypatch.setenv("SYNAPSE_VIEW_ID", "v")
 
-    monkeypatch.setattr(
-        requests,
-        "get",
-        lambda *a, **k: Resp({"status": "ok", "result": {"active": True}}),
-    )
+    sessions = []
+
+    def fake_get(self, *a, **k):
+        sessions.append(self)
+        return Resp({"status": "ok", "result": {"active": True}})
 
-    def fake_post(url, *a, **k):
+    monkeypatch.setattr(requests.Session, "get", fake_get)
+
+    def fake_post(self, url, *a, **k):
+        sessions.append(self)
         if url.endswith("/storm/call"):
             return Resp({"status": "ok", "result": 1})
         if url.endswith("/storm"):
             return Resp(stream_chunks=["[node]"])
         raise AssertionError(url)
 
-    monkeypatch.setattr(requests, "post", fake_post)
+    monkeypatch.setattr(requests.Session, "post", fake_post)
 
     exit_code = main()
     out = capsys.readouterr().out
     assert exit_code == 0
     assert "All health checks passed" in out
+    # Every check reuses the same pooled session.
+    assert len(sessions) == 3 and len(set(map(id, sessions))) == 1
 
 
 def test_main_failure(monkeypatch):
@@ -56,6 +68,101 @@ def test_main_failure(monkeypatch):
     def boom(*a, **k):
         raise requests.HTTPError("fail")
 
-    monkeypatch.setattr(requests, "get", boom)
+    monkeypatch.setattr(requests.Session, "get", boom)
     exit_code = main()
     assert exit_code == 1
+
+
+def _env(monkeypatch):
+    monkeypatch.setenv("SYNAPSE_HOST", "h")
+    monkeypatch.setenv("SYNAPSE_PORT", "1")
+    monkeypatch.setenv("SYNAPSE_API_KEY", "k")
+    monkeypatch.setenv("SYNAPSE_VIEW_ID", "v")
+
+
+def _fake_cortex(monkeypatch, barrier=None, delay=0.0):
+    def wait():
+        if barrier is not None:
+            barrier.wait()
+        time.sleep(delay)
+
+    def fake_get(self, *a, **k):
+        wait()
+        return Resp({"status": "ok", "result": {"active": True}})
+
+    def fake_post(self, url, *a, **k):
+        wait()
+        if url.endswith("/storm/call"):
+            return Resp({"status": "ok", "result": 1})
+        return Resp(stream_chunks=["[node]"])
+
+    monkeypatch.setattr(requests.Session, "get", fake_get)
+    monkeypatch.setattr(requests.Session, "post", fake_post)
+
+
+def test_probes_run_concurrently_and_report_json(monkeypatch, capsys):
+    _env(monkeypatch)
+    # Each probe blocks until all three are in flight.
+    _fake_cortex(monkeypatch, barrier=threading.Barrier(3, timeout=5))
+
+    assert main(["--format", "json"]) == 0
+    report = json.loads(capsys.readouterr().out)
+    assert report["ok"] is True
+    assert [p["name"] for p in report["probes"]] == ["active", "storm_call", "storm"]
+    assert all(p["ok"] and p["latency"] >= 0 and p["ttfb"] is not None for p in report["probes"])
+
+
+def test_threshold_fails_slow_probes_in_prometheus_output(monkeypatch, capsys):
+    _env(monkeypatch)
+    _fake_cortex(monkeypatch, delay=0.02)
+
+    assert main(["--format", "prometheus", "--threshold", "storm=1", "--threshold", "60000"]) == 1
+    out = capsys.readouterr().out
+    assert 'synapse_probe_up{probe="active"} 1' in out
+    assert 'synapse_probe_up{probe="storm"} 0' in out
+    assert "# TYPE synapse_probe_latency_seconds gauge" in out
+    assert 'synapse_probe_ttfb_seconds{probe="storm"}' in out
+
+
+def test_watch_keeps_a_rolling_window(monkeypatch, tmp_path):
+    _env(monkeypatch)
+    _fake_cortex(monkeypatch)
+    output = tmp_path / "health.json"
+
+    assert main(["--format", "json", "--watch", "0", "--rounds", "3", "--window", "2", "--output", str(output)]) == 0
+    report = json.loads(output.read_text())
+    assert report["window"]["active"]["count"] == 2
+    assert report["window"]["storm"]["failures"] == 0
+    assert report["window"]["storm"]["p99"] >= report["window"]["storm"]["p50"]
+
+
+def test_watch_window_is_a_prometheus_summary(monkeypatch, capsys):
+    _env(monkeypatch)
+    _fake_cortex(monkeypatch)
+
+    assert main(["--format", "prometheus", "--watch", "0", "--rounds", "2"]) == 0
+    out = capsys.readouterr().out.split("# HELP synapse_probe_up")[-1]
+    assert "# TYPE synapse_probe_window_latency_seconds summary" in out
+    assert 'synapse_probe_window_latency_seconds{probe="active",quantile="0.5"}' in out
+    assert 'synapse_probe_window_latency_seconds_count{probe="active"} 2' in out
+    assert 'synapse_probe_window_latency_seconds_sum{probe="storm"}' in out
+
+
+def test_ctrl_c_during_a_watch_round_exits_cleanly(monkeypatch, capsys):
+    _env(monkeypatch)
+    _fake_cortex(monkeypatch)
+    calls = []
+    fake_get = requests.Session.get
+
+    def interrupted_get(self, *a, **k):
+        calls.append(1)
+        if len(calls) > 1:
+            raise KeyboardInterrupt
+        return fake_get(self, *a, **k)
+
+    monkeypatch.setattr(requests.Session, "get", interrupted_get)
+
+    # The second round is interrupted; the first round's status stands.
+    assert main(["--format", "json", "--watch", "0"]) == 0
+    assert len(calls) == 2
+    assert json.loads(capsys.readouterr().out)["ok"] is True
@@ -0,0 +1,39 @@
+import pytest
+
+from gosynapse import jsonbackend
+from gosynapse.parse import parse_json_stream, PrintData
+
+STREAM = (
+    b'["init", {"tick": 1, "text": "inet:fqdn", "abstick": 2, "hash": "h", "task": "tsk"}]\n'
+    b'["node", [[["inet:fqdn", "vertex.link"]], {"iden": "id0", "tags": {"rep.bad": [1, 2]}, '
+    b'"props": {".created": 1700000000000, "zone": "vertex.link", "ratio": 0.5}, '
+    b'"tagprops": {}, "nodedata": {}, "path": {"vars": {"x": null}}}]]\n'
+    b'["node", [["inet:fqdn", "vertex.link"], {"iden": "id1", "tags": {}, "props": {"uni": "\\u00e9\\ud83d\\ude00"}, '
+    b'"tagprops": {}, "nodedata": {}, "path": {}}]]\n'
+    b'["print", {"mesg": "hello"}]\n'
+    b'["warn", {"mesg": "ignored"}]\n'
+    b'["print",\n {"mesg": "split"}]\n'
+    b'["fini", {"tock": 3, "abstock": 4, "took": 1, "count": 2}]\n'
+)
+
+
+@pytest.mark.parametrize("name", jsonbackend.available_backends())
+def test_backend_parity(name):
+    expected = parse_json_stream(STREAM, backend=jsonbackend.JsonBackend())
+    assert parse_json_stream(STREAM, backend=jsonbackend.load_backend(name)) == expected
+    assert expected[3] == [PrintData(mesg="hello"), PrintData(mesg="split")]
+
+
+@pytest.mark.parametrize("name", jsonbackend.available_backends())
+def test_backend_rejects_partial_records(name):
+    backend = jsonbackend.load_backend(name)
+    with pytest.raises(ValueError):
+        backend.decode_message(b'["print", {"mesg":')
+
+
+def test_set_backend(monkeypatch):
+    monkeypatch.setattr(jsonbackend, "_current", None)
+    assert jsonbackend.set_backend("json").name == "json"
+    assert jsonbackend.get_backend().name == "json"
+    with pytest.raises(ValueError):
+        jsonbackend.set_backend("nope")
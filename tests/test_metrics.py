@@ -0,0 +1,74 @@
+import pytest
+
+from gosynapse.client import SynapseClient
+from gosynapse.metrics import NULL_METRICS, Histogram, HistogramMetrics, RequestSample
+
+
+class Resp:
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+        self.closed = False
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return {"status": "ok", "result": {"version": [2, 0, 0]}}
+
+    def iter_content(self, chunk_size=None):
+        for i in range(0, len(self.content), 7):
+            yield self.content[i:i + 7]
+
+    def close(self):
+        self.closed = True
+
+
+STORM = (
+    b'["init", {"tick": 1, "text": "", "abstick": 0, "hash": "", "task": ""}]\n'
+    b'["node", [["inet:fqdn", "a.com"], {"iden": "a", "tags": {}, "props": {}, "tagprops": {}, "nodedata": {}, "path": {}}]]\n'
+    b'["fini", {"tock": 1, "abstock": 1, "took": 250, "count": 1}]\n'
+)
+
+
+def test_client_records_samples_per_operation(monkeypatch):
+    metrics = HistogramMetrics()
+    cli = SynapseClient(host="h", port="1", metrics=metrics)
+    monkeypatch.setattr(cli.session, "get", lambda *a, **k: Resp(b'{"status": "ok"}'))
+    monkeypatch.setattr(cli.session, "post", lambda *a, **k: Resp(STORM))
+
+    cli.core_info()
+    assert len(cli.storm("inet:fqdn")[1]) == 1
+    assert len(list(cli.storm_iter("inet:fqdn"))) == 3
+
+    summary = metrics.summary()
+    assert summary["core_info"]["requests"] == 1 and summary["core_info"]["bytes"] == 16
+    for op in ("storm", "storm_iter"):
+        assert summary[op]["nodes"] == 1
+        assert summary[op]["bytes"] == len(STORM)
+        assert summary[op]["took_p50"] == pytest.approx(0.25, rel=0.5)
+        assert summary[op]["errors"] == 0
+
+
+def test_client_records_failures():
+    metrics = HistogramMetrics()
+    cli = SynapseClient(host="h", port="1", metrics=metrics)
+
+    def fail(*args, **kwargs):
+        raise ConnectionError("refused")
+
+    cli.session.get = fail
+    with pytest.raises(ConnectionError):
+        cli.core_info()
+    assert metrics.summary()["core_info"]["errors"] == 1
+
+
+def test_histogram_percentiles():
+    histogram = Histogram()
+    for value in [0.001] * 98 + [2.0, 2.0]:
+        histogram.add(value)
+    assert histogram.percentile(0.5) <= 0.0016
+    assert histogram.percentile(0.99) == 2.0
+    assert not NULL_METRICS.enabled
+    NULL_METRICS.record(RequestSample(op="x", method="GET", path="/"))
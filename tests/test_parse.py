@@ -1,4 +1,17 @@
-from gosynapse.parse import parse_json_stream, InitData, FiniData, PrintData
+import json
+
+import pytest
+
+from gosynapse.parse import (
+    parse_json_stream,
+    iter_json_stream,
+    JsonLinesDecoder,
+    InitData,
+    FireData,
+    FiniData,
+    NodeSet,
+    PrintData,
+)
 
 
 def test_parse_json_stream_simple():
@@ -19,3 +32,112 @@ def test_parse_json_stream_print():
     )
     init, nodes, fini, prints = parse_json_stream(data)
     assert prints == [PrintData(mesg="hello")]
+
+
+def test_iter_json_stream_split_chunks():
+    data = (
+        b'["init", {"tick": 1, "text": "t", "abstick": 2, "hash": "h", "task": "tsk"}]\n'
+        b'["node", [[["foo", "bar"]], {"iden": "id", "tags": {}, "props": {}, "tagprops": {}, "nodedata": {}, "path": {}}]]\n'
+        b'["fini", {"tock": 1, "abstock": 1, "took": 1, "count": 1}]\n'
+    )
+    chunks = [data[i:i + 7] for i in range(0, len(data), 7)]
+    messages = list(iter_json_stream(chunks))
+    assert messages[0] == InitData(tick=1, text="t", abstick=2, hash="h", task="tsk")
+    assert messages[1].info.iden == "id"
+    assert messages[2] == FiniData(tock=1, abstock=1, took=1, count=1)
+
+
+def test_decoder_reassembles_multiline_records():
+    decoder = JsonLinesDecoder()
+    assert decoder.feed(b'["print",\n{"mesg":\n') == []
+    assert decoder.feed(b'"hello"}]\n["print", {"mesg": "x"}]') == [PrintData(mesg="hello")]
+    assert decoder.close() == [PrintData(mesg="x")]
+
+
+def test_decoder_decodes_large_multiline_record_once():
+    items = [{"n": i, "s": "a]}"} for i in range(2000)]
+    record = ["storm:fire", {"type": "x", "data": {"items": items}}]
+    text = json.dumps(record, indent=2).encode() + b"\n"
+    decoder = JsonLinesDecoder()
+    calls = []
+    raw_decode = decoder._raw.raw_decode
+
+    def counting(text, index=0):
+        calls.append(len(text))
+        return raw_decode(text, index)
+
+    decoder._raw.raw_decode = counting
+    messages = [m for line in text.splitlines(keepends=True) for m in decoder.feed(line)]
+    assert messages == [FireData(type="x", data={"items": items})]
+    assert len(calls) == 1
+
+
+def test_decoder_skips_bad_lines():
+    decoder = JsonLinesDecoder()
+    messages = decoder.feed(
+        b'not json\n'
+        b'["print", {"mesg": "a"}]["print", {"mesg": "b"}]\n'
+    )
+    assert messages == [PrintData(mesg="a"), PrintData(mesg="b")]
+
+
+def test_nodes_are_slotted_and_lazy():
+    from gosynapse import jsonbackend
+
+    data = b'["node", [[["foo", "bar"]], {"iden": "id", "tags": {"t": [null, null]}, "props": {"p": 1}, "tagprops": {}, "nodedata": {}, "path": {}}]]\n'
+    for name in jsonbackend.available_backends():
+        _, nodes, _, _ = parse_json_stream(data, backend=jsonbackend.load_backend(name))
+        node = nodes[0]
+        assert not hasattr(node, "__dict__")
+        assert not hasattr(node.info, "__dict__")
+        assert node.info.props == {"p": 1}
+        assert node.info.tags == {"t": [None, None]}
+        assert node.to_dict() == {
+            "key": "node",
+            "data": [["foo", "bar"]],
+            "info": {"iden": "id", "tags": {"t": [None, None]}, "props": {"p": 1}, "tagprops": {}, "nodedata": {}, "path": {}},
+        }
+
+
+def test_node_ndef_keeps_value_types():
+    from gosynapse import jsonbackend
+
+    info = '{"iden": "id", "tags": {}, "props": {}, "tagprops": {}, "nodedata": {}, "path": {}}'
+    data = ('["node", [["inet:ipv4", 16909060], %s]]\n["node", [[["foo", "bar"]], %s]]\n' % (info, info)).encode()
+    for name in jsonbackend.available_backends():
+        _, nodes, _, _ = parse_json_stream(data, backend=jsonbackend.load_backend(name))
+        assert nodes[0].ndef == ("inet:ipv4", 16909060)
+        assert nodes[1].ndef == ("foo", "bar")
+        assert nodes[0].data and nodes[0].ndef == ("inet:ipv4", 16909060)
+
+
+def _node_line(form, valu, iden, tags=None, props=None):
+    info = {"iden": iden, "tags": tags or {}, "props": props or {}, "tagprops": {}, "nodedata": {}, "path": {}}
+    return json.dumps(["node", [[form, valu], info]]).encode() + b"\n"
+
+
+def _sightings():
+    return (
+        _node_line("inet:fqdn", "a.com", "a", tags={"rep": [None, None], "rep.foo": [None, None]})
+        + _node_line("inet:ipv4", 1, "b", props={"asn": 1})
+        + _node_line("inet:fqdn", "a.com", "a", tags={"cno": [None, None]}, props={"zone": "a.com"})
+        + b'["print", {"mesg": "hi"}]\n'
+    )
+
+
+@pytest.mark.parametrize("max_nodes", [None, 1])
+def test_node_set_dedupes_merges_and_indexes(tmp_path, max_nodes):
+    with NodeSet(max_nodes=max_nodes, spill_dir=str(tmp_path)) as nodes:
+        assert nodes.update(iter_json_stream([_sightings()])) == 2
+        assert nodes.spilled == (max_nodes is not None)
+        assert len(nodes) == 2 and "a" in nodes and "c" not in nodes
+        merged = nodes.get("a")
+        assert set(merged.info.tags) == {"rep", "rep.foo", "cno"}
+        assert merged.info.props == {"zone": "a.com"}
+        assert merged.ndef == ("inet:fqdn", "a.com")
+        assert [n.info.iden for n in nodes.by_form("inet:ipv4")] == ["b"]
+        assert [n.info.iden for n in nodes.by_tag("rep")] == ["a"]
+        assert [n.info.iden for n in nodes] == ["a", "b"]
+    assert list(tmp_path.iterdir()) == []
+    assert len(nodes) == 0 and "a" not in nodes and nodes.get("a") is None
+    assert nodes.forms() == [] and list(nodes.by_tag("rep")) == [] and list(nodes) == []
@@ -0,0 +1,47 @@
+import json
+
+import pytest
+
+from gosynapse.parse import FiniData, InitData, Node, iter_json_stream
+from gosynapse.replay import LineIndex, StormRecording, count_messages, parallel_scan
+
+
+def recording(tmp_path, count=50):
+    lines = [b'["init", {"tick": 1, "text": "", "abstick": 0, "hash": "", "task": ""}]', b""]
+    for i in range(count):
+        info = {"iden": str(i), "tags": {}, "props": {}, "tagprops": {}, "nodedata": {}, "path": {}}
+        lines.append(json.dumps(["node", [["inet:fqdn", f"h{i}.com"], info]]).encode())
+    lines.append(b'["fini", {"tock": 1, "abstock": 1, "took": 1, "count": 0}]')
+    path = tmp_path / "storm.jsonl"
+    path.write_bytes(b"\n".join(lines))
+    return path
+
+
+def test_recording_replays_like_a_stream(tmp_path):
+    path = recording(tmp_path)
+    with StormRecording(path, window=64) as rec:
+        assert list(rec) == list(iter_json_stream([path.read_bytes()]))
+
+
+def test_recording_random_access_and_saved_index(tmp_path):
+    path = recording(tmp_path)
+    with StormRecording(path, index_path=tmp_path / "storm.idx", window=100) as rec:
+        assert len(rec) == 52
+        assert isinstance(rec[0], InitData) and isinstance(rec[-1], FiniData)
+        assert rec[11].info.iden == "10"
+        assert [m.info.iden for m in rec.iter_from(50) if isinstance(m, Node)] == ["49"]
+        rec.save_index()
+    assert list(LineIndex.load(tmp_path / "storm.idx").offsets) == list(LineIndex.build(path.read_bytes()).offsets)
+    with pytest.raises(ValueError):
+        LineIndex.load(tmp_path / "storm.idx", size=1)
+
+
+def test_parallel_scan_splits_on_lines(tmp_path):
+    path = recording(tmp_path, count=500)
+    with StormRecording(path) as rec:
+        ranges = rec.ranges(3)
+        data = path.read_bytes()
+        assert all(start == 0 or data[start - 1:start] == b"\n" for start, _ in ranges)
+    counts = parallel_scan(path, processes=2, parts=3)
+    assert len(counts) == 3
+    assert sum(counts, count_messages([])) == {"InitData": 1, "Node": 500, "FiniData": 1}
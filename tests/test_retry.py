@@ -0,0 +1,188 @@
+import time
+
+import pytest
+import requests
+
+from gosynapse.client import SynapseClient
+from gosynapse.retry import (
+    DEFAULT_TIMEOUT,
+    CircuitBreaker,
+    CircuitOpenError,
+    DeadlineExceeded,
+    RetryPolicy,
+    cap_timeout,
+    deadline,
+    expiry,
+)
+
+
+class Resp:
+    def __init__(self, status_code, content=b"", headers=None):
+        self.status_code = status_code
+        self.content = content
+        self.headers = headers or {}
+        self.closed = False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise requests.HTTPError(f"{self.status_code} error")
+
+    def json(self):
+        return {"status": "ok", "result": None}
+
+    def iter_content(self, chunk_size=None):
+        yield self.content
+
+    def close(self):
+        self.closed = True
+
+
+def scripted(outcomes, calls):
+    def send(url, **kwargs):
+        calls.append(kwargs.get("timeout"))
+        outcome = outcomes.pop(0)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    return send
+
+
+def client(**kwargs):
+    kwargs.setdefault("retry", RetryPolicy(retries=3, backoff=0))
+    return SynapseClient(host="h", port="1", **kwargs)
+
+
+def test_get_retried_on_transport_errors_and_statuses(monkeypatch):
+    cli = client()
+    calls = []
+    busy = Resp(503)
+    outcomes = [requests.ConnectionError("refused"), busy, Resp(200)]
+    monkeypatch.setattr(cli.session, "get", scripted(outcomes, calls))
+
+    cli.logout()
+    assert len(calls) == 3
+    assert calls[0] == DEFAULT_TIMEOUT
+    assert busy.closed
+
+
+def test_retries_give_up_and_return_last_response(monkeypatch):
+    cli = client(retry=RetryPolicy(retries=2, backoff=0))
+    calls = []
+    monkeypatch.setattr(cli.session, "get", scripted([Resp(503), Resp(503), Resp(503)], calls))
+    with pytest.raises(requests.HTTPError):
+        cli.logout()
+    assert len(calls) == 3
+
+
+def test_only_idempotent_requests_are_retried(monkeypatch):
+    cli = client()
+    calls = []
+    monkeypatch.setattr(cli.session, "post", scripted([Resp(503), Resp(503), Resp(200)], calls))
+    with pytest.raises(requests.HTTPError):
+        cli.storm("[inet:fqdn=a.com]")
+    assert len(calls) == 1
+    # Storm queries are only retried when the caller says they may be.
+    with pytest.raises(requests.HTTPError):
+        cli.storm("inet:fqdn=a.com $node.addEdge(refs, $iden)")
+    assert len(calls) == 2
+
+    monkeypatch.setattr(cli.session, "post", scripted([Resp(503), Resp(503), Resp(200)], calls))
+    cli.storm("inet:fqdn=a.com", idempotent=True)
+    assert len(calls) == 5
+
+    calls.clear()
+    monkeypatch.setattr(cli.session, "post", scripted([requests.ConnectionError("reset")], calls))
+    with pytest.raises(requests.ConnectionError):
+        cli.feed({"name": "syn.nodes", "items": []})
+    assert len(calls) == 1
+
+
+def test_retry_after_header_is_honoured():
+    policy = RetryPolicy(backoff=100, max_backoff=5)
+    assert policy.delay(1, Resp(429, headers={"Retry-After": "2"})) == 2
+    assert policy.delay(1, Resp(429, headers={"Retry-After": "60"})) == 5
+    assert 0 <= policy.delay(10) <= 5
+
+
+def test_circuit_breaker_opens_and_recovers(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=0.05)
+    cli = client(retry=RetryPolicy(retries=0), circuit_breaker=breaker)
+    calls = []
+    outcomes = [requests.ConnectionError("down"), Resp(502), Resp(200), Resp(200)]
+    monkeypatch.setattr(cli.session, "get", scripted(outcomes, calls))
+
+    with pytest.raises(requests.ConnectionError):
+        cli.logout()
+    with pytest.raises(requests.HTTPError):
+        cli.logout()
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpenError):
+        cli.logout()
+    assert len(calls) == 2
+
+    time.sleep(0.06)
+    assert breaker.state == "half-open"
+    cli.logout()
+    assert breaker.state == "closed" and breaker.failures == 0
+    cli.logout()
+    assert len(calls) == 4
+
+
+def test_circuit_breaker_non_transient_errors_are_neutral(monkeypatch):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    cli = client(retry=RetryPolicy(retries=0), circuit_breaker=breaker)
+    calls = []
+    outcomes = [requests.ConnectionError("down"), ValueError("bad argument"), Resp(200)]
+    monkeypatch.setattr(cli.session, "get", scripted(outcomes, calls))
+
+    with pytest.raises(requests.ConnectionError):
+        cli.logout()
+    time.sleep(0.06)
+    with pytest.raises(ValueError):
+        cli.logout()
+    # The trial neither closed nor re-opened the circuit; the next request
+    # is let through as the trial.
+    assert breaker.state == "half-open" and breaker.failures == 1
+    cli.logout()
+    assert breaker.state == "closed" and len(calls) == 3
+
+
+def test_circuit_breaker_ignores_client_errors():
+    breaker = CircuitBreaker(failure_threshold=1)
+    breaker.record(Resp(404))
+    breaker.record(Resp(500))
+    assert breaker.state == "closed"
+    breaker.record(exc=requests.Timeout())
+    assert breaker.state == "open"
+
+
+def test_deadline_caps_timeouts_and_stops_retries(monkeypatch):
+    assert cap_timeout((10, 300), None) == (10, 300)
+    connect, read = cap_timeout((10, 300), time.monotonic() + 1)
+    assert 0 < connect <= 1 and 0 < read <= 1
+    with pytest.raises(DeadlineExceeded):
+        cap_timeout(5, time.monotonic() - 1)
+
+    cli = client(retry=RetryPolicy(retries=5, backoff=1, max_backoff=1), deadline=0.2)
+    calls = []
+    monkeypatch.setattr(cli.session, "get", scripted([requests.Timeout("slow")] * 6, calls))
+    monkeypatch.setattr("gosynapse.retry.random.uniform", lambda a, b: b)
+    start = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        cli.logout()
+    assert time.monotonic() - start < 0.2
+    assert len(calls) == 1 and calls[0][1] <= 0.2
+
+
+def test_deadline_scope_applies_to_every_call(monkeypatch):
+    cli = client()
+    calls = []
+    monkeypatch.setattr(cli.session, "get", scripted([Resp(200), Resp(200)], calls))
+    with deadline(30):
+        with deadline(60):
+            assert expiry() - time.monotonic() <= 30
+        cli.logout()
+        cli.logout()
+    assert expiry() is None
+    assert all(timeout[1] <= 30 for timeout in calls)
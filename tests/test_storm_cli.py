@@ -0,0 +1,110 @@
+import http.client
+import importlib.util
+import json
+import threading
+import time
+from pathlib import Path
+from types import SimpleNamespace
+
+from gosynapse.client import StormStream
+from gosynapse.parse import iter_json_stream, raise_errors
+from gosynapse.testing import FakeCortex, synthetic_storm
+
+SCRIPT = Path(__file__).resolve().parents[1] / "scripts" / "storm_cli.py"
+spec = importlib.util.spec_from_file_location("storm_cli", SCRIPT)
+storm_cli = importlib.util.module_from_spec(spec)
+spec.loader.exec_module(storm_cli)
+
+
+class HttpClient:
+    """Streams Storm queries from a FakeCortex over a real socket.
+
+    ``requests`` is stubbed in the tests, so the response is read with
+    http.client, whose socket StormStream.abort() shuts down the same way.
+    """
+
+    def __init__(self, port):
+        self.port = port
+
+    def storm_iter(self, query, opts=None):
+        stream = StormStream()
+        stream._messages = self._messages(query, opts, stream)
+        return stream
+
+    def _messages(self, query, opts, stream):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port)
+        try:
+            conn.request("POST", "/api/v1/storm", body=json.dumps({"query": query, "opts": opts or {}}))
+            resp = conn.getresponse()
+            stream._attach(SimpleNamespace(raw=SimpleNamespace(_fp=resp)))
+            yield from raise_errors(iter_json_stream(iter(lambda: resp.read1(4096), b"")))
+        finally:
+            conn.close()
+
+
+def test_result_writer_keeps_order_and_flushes_on_close(tmp_path):
+    path = tmp_path / "out.jsonl"
+    writer = storm_cli.ResultWriter(path, max_pending=10)
+    for i in range(500):
+        writer.put({"n": i, "when": time})
+    writer.close()
+    records = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [r["n"] for r in records] == list(range(500))
+    assert isinstance(records[0]["when"], str)
+
+
+def test_job_records_every_message_type():
+    stream = b"".join(synthetic_storm(1, "q")) + (
+        b'["print", {"mesg": "hi"}]\n'
+        b'["node:edits", {"edits": [["buid", "inet:fqdn", []]]}]\n'
+        b'["storm:fire", {"type": "edits", "data": {"offs": 3}}]\n'
+    )
+    job = storm_cli.Job(1, "q", None)
+    records = [job._record(message) for message in iter_json_stream([stream])]
+    assert [r["type"] for r in records] == ["init", "node", "fini", "print", "edits", "fire"]
+    assert all(r["job"] == 1 and r["query"] == "q" for r in records)
+    assert records[1]["node"]["info"]["iden"]
+    assert records[2]["count"] == 1
+    assert records[3]["mesg"] == "hi"
+    assert records[4]["edits"] == [["buid", "inet:fqdn", []]]
+    assert records[5]["fire"] == {"type": "edits", "data": {"offs": 3}}
+
+
+def test_kill_interrupts_a_quiet_background_job(tmp_path, capsys):
+    release = threading.Event()
+
+    def handler(query, opts):
+        if query == "slow":
+            yield next(synthetic_storm(0, query))  # init, then nothing
+            release.wait(10)
+        else:
+            yield from synthetic_storm(3, query)
+
+    writer = storm_cli.ResultWriter(tmp_path / "out.jsonl")
+    try:
+        with FakeCortex() as cortex:
+            cortex.storm_handler = handler
+            shell = storm_cli.Shell(HttpClient(cortex.port), writer, None)
+            shell.handle("slow &")
+            shell.handle("inet:fqdn &")
+            slow, fast = shell.jobs
+            deadline = time.monotonic() + 5
+            while slow.stream is None or slow.stream._response is None:
+                assert time.monotonic() < deadline
+                time.sleep(0.01)
+
+            start = time.monotonic()
+            shell.handle("kill 1")
+            shell.wait()
+            assert time.monotonic() - start < 2
+            shell.handle("jobs")
+            release.set()
+    finally:
+        release.set()
+        writer.close()
+
+    assert (slow.state, fast.state, fast.nodes) == ("cancelled", "done", 3)
+    out = capsys.readouterr().out
+    assert "[1] cancelled" in out and "[2] done" in out and "3 nodes" in out
+    types = [json.loads(line)["type"] for line in (tmp_path / "out.jsonl").read_text().splitlines()]
+    assert types.count("node") == 3 and types.count("init") == 2
@@ -0,0 +1,38 @@
+import json
+import time
+import urllib.request
+
+from gosynapse.parse import FiniData, InitData, Node, parse_json_stream
+from gosynapse.testing import FakeCortex, synthetic_storm
+
+
+def test_synthetic_storm_parses():
+    raw = b"".join(synthetic_storm(5, "inet:fqdn", pad=10))
+    init, nodes, fini, prints = parse_json_stream(raw)
+    assert init[0].text == "inet:fqdn"
+    assert [n.ndef for n in nodes] == [("inet:fqdn", f"host{i}.example.com") for i in range(5)]
+    assert len({n.info.iden for n in nodes}) == 5
+    assert nodes[0].info.nodedata == {"pad": "x" * 10}
+    assert fini[0].count == 5
+    assert prints == []
+
+
+def test_fake_cortex_chunking_and_latency():
+    with FakeCortex() as cortex:
+        cortex.storm_handler = lambda query, opts: synthetic_storm(20, query)
+        cortex.chunk_size = 7
+        cortex.latency = 0.05
+        request = urllib.request.Request(
+            f"http://127.0.0.1:{cortex.port}/api/v1/storm",
+            data=json.dumps({"query": "q"}).encode(),
+            method="POST",
+        )
+        start = time.monotonic()
+        with urllib.request.urlopen(request) as resp:
+            body = resp.read()
+        assert time.monotonic() - start >= 0.05
+    assert body == b"".join(synthetic_storm(20, "q"))
+    messages = parse_json_stream(body)
+    assert isinstance(messages[0][0], InitData)
+    assert all(isinstance(n, Node) for n in messages[1])
+    assert isinstance(messages[2][0], FiniData)